@@ -1,17 +1,100 @@
+import atexit
+import base64
+import json
+import math
+import multiprocessing
+import os
+import re
 import sqlite3
-from contextlib import contextmanager
-from datetime import datetime
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 DATA_DIR = PROJECT_ROOT / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-DB_PATH = DATA_DIR / "analytics.sqlite"
+# ANALYTICS_DB_PATH moves the SQLite file elsewhere (benchmarks, throwaway copies)
+DB_PATH = Path(os.environ.get("ANALYTICS_DB_PATH") or DATA_DIR / "analytics.sqlite")
+
+# A postgresql:// URL here moves the database to Postgres (see analytics_pg);
+# otherwise everything lives in DB_PATH
+DB_URL = os.environ.get("ANALYTICS_DB_URL", "").strip()
+USE_POSTGRES = DB_URL.startswith(("postgresql:", "postgresql+", "postgres:"))
+
+# The few SQL fragments that differ between the backends. Everything else is
+# written once in SQL both accept, with qmark placeholders (analytics_pg
+# rewrites those for psycopg).
+if USE_POSTGRES:
+    NOW_SQL = "to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+    REAL_TYPE = "DOUBLE PRECISION"
+    SERIAL_PK = "BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY"
+    WITHOUT_ROWID = ""
+    ROWID_SQL = "row_id"
+    LEAST_SQL, GREATEST_SQL = "LEAST", "GREATEST"
+    NUMERIC_POINTS_SQL = "points IS NOT NULL"
+    DIALECT_STATEMENTS = (
+        # No rowid in Postgres; an identity column gives backfills the same insertion-ordered key
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'clips' AND column_name = 'row_id'
+            ) THEN
+                ALTER TABLE clips ADD COLUMN row_id BIGINT GENERATED ALWAYS AS IDENTITY UNIQUE;
+            END IF;
+        END
+        $$
+        """,
+        # Bumps once per transaction, deferred to commit: the counter row is
+        # only locked while committing, not for the whole write
+        """
+        CREATE OR REPLACE FUNCTION bump_clips_version() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF current_setting('analytics.clips_bumped', true) IS DISTINCT FROM 'on' THEN
+                PERFORM set_config('analytics.clips_bumped', 'on', true);
+                UPDATE data_versions SET version = version + 1 WHERE name = 'clips';
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_clips_version') THEN
+                CREATE CONSTRAINT TRIGGER trg_clips_version AFTER INSERT OR UPDATE OR DELETE ON clips
+                DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION bump_clips_version();
+            END IF;
+        END
+        $$
+        """,
+    )
+else:
+    NOW_SQL = "CURRENT_TIMESTAMP"
+    REAL_TYPE = "REAL"
+    SERIAL_PK = "INTEGER PRIMARY KEY AUTOINCREMENT"
+    WITHOUT_ROWID = "WITHOUT ROWID"
+    ROWID_SQL = "rowid"
+    LEAST_SQL, GREATEST_SQL = "MIN", "MAX"
+    # points may hold text in SQLite; only numbers count as scored points
+    NUMERIC_POINTS_SQL = "typeof(points) IN ('integer', 'real')"
+    DIALECT_STATEMENTS = tuple(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_clips_version_{event.lower()} AFTER {event} ON clips
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE name = 'clips';
+        END
+        """
+        for event in ("INSERT", "UPDATE", "DELETE")
+    )
 
 CREATE_STATEMENTS = [
-    """
+    f"""
     CREATE TABLE IF NOT EXISTS clips (
         id TEXT PRIMARY KEY,
         filename TEXT NOT NULL,
@@ -52,28 +135,88 @@ CREATE_STATEMENTS = [
         notes TEXT,
         start_time TEXT,
         end_time TEXT,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        created_at TEXT DEFAULT {NOW_SQL},
+        updated_at TEXT DEFAULT {NOW_SQL}
     )
     """,
     "CREATE INDEX IF NOT EXISTS idx_clips_game ON clips (game_id)",
     "CREATE INDEX IF NOT EXISTS idx_clips_canonical_game ON clips (canonical_game_id)",
     "CREATE INDEX IF NOT EXISTS idx_clips_canonical_clip ON clips (canonical_clip_id)",
-    """
+    # Keyset pagination (created_at DESC, id DESC), optionally narrowed by a filter column
+    "CREATE INDEX IF NOT EXISTS idx_clips_created ON clips (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_clips_updated ON clips (updated_at)",
+    "CREATE INDEX IF NOT EXISTS idx_clips_game_created ON clips (game_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_clips_canonical_game_created ON clips (canonical_game_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_clips_opponent_created ON clips (opponent, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_clips_coverage_created ON clips (coverage, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_clips_result_created ON clips (result, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_clips_quarter_created ON clips (quarter, created_at, id)",
+    f"""
     CREATE TABLE IF NOT EXISTS comm_segments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id {SERIAL_PK},
         clip_id TEXT NOT NULL REFERENCES clips(id) ON DELETE CASCADE,
-        start REAL NOT NULL,
-        "end" REAL NOT NULL,
-        duration REAL NOT NULL,
-        peak_dbfs REAL,
-        rms REAL,
-        rms_dbfs REAL,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        start {REAL_TYPE} NOT NULL,
+        "end" {REAL_TYPE} NOT NULL,
+        duration {REAL_TYPE} NOT NULL,
+        peak_dbfs {REAL_TYPE},
+        rms {REAL_TYPE},
+        rms_dbfs {REAL_TYPE},
+        created_at TEXT DEFAULT {NOW_SQL}
     )
     """,
     "CREATE INDEX IF NOT EXISTS idx_comm_clip ON comm_segments (clip_id)",
     "CREATE INDEX IF NOT EXISTS idx_comm_start ON comm_segments (clip_id, start)",
+    f"""
+    CREATE TABLE IF NOT EXISTS comm_analysis (
+        clip_id TEXT PRIMARY KEY REFERENCES clips(id) ON DELETE CASCADE,
+        source_mtime_ns BIGINT,
+        source_size BIGINT,
+        audio_duration {REAL_TYPE},
+        segment_count INTEGER NOT NULL DEFAULT 0,
+        analyzed_at TEXT DEFAULT {NOW_SQL}
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS clip_stats (
+        dimension TEXT NOT NULL,
+        value TEXT NOT NULL,
+        possessions INTEGER NOT NULL DEFAULT 0,
+        points_allowed INTEGER NOT NULL DEFAULT 0,
+        stops INTEGER NOT NULL DEFAULT 0,
+        breakdowns INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, value)
+    ) {WITHOUT_ROWID}
+    """,
+    # Bumped by triggers on every clips change, so any process can tell
+    # cheaply whether derived data (embeddings, caches) is stale
+    f"""
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) {WITHOUT_ROWID}
+    """,
+    "INSERT INTO data_versions (name, version) VALUES ('clips', 0) ON CONFLICT DO NOTHING",
+    *DIALECT_STATEMENTS,
+    # Inverted index of tokenized tag values (see TAG_FIELDS) for faceted search
+    f"""
+    CREATE TABLE IF NOT EXISTS clip_tags (
+        field TEXT NOT NULL,
+        value TEXT NOT NULL,
+        clip_id TEXT NOT NULL,
+        label TEXT NOT NULL,
+        PRIMARY KEY (field, value, clip_id)
+    ) {WITHOUT_ROWID}
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_clip_tags_clip ON clip_tags (clip_id, field, value, label)",
+    f"""
+    CREATE TABLE IF NOT EXISTS clip_embeddings (
+        model TEXT NOT NULL,
+        clip_id TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        content_hash TEXT NOT NULL,
+        PRIMARY KEY (model, clip_id)
+    ) {WITHOUT_ROWID}
+    """,
 ]
 
 
@@ -81,99 +224,1224 @@ def _dict_factory(cursor: sqlite3.Cursor, row: sqlite3.Row) -> Dict[str, Any]:
     return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
 
 
+# Applied once to every pooled connection when it is opened. WAL lets readers
+# keep going while a tagging session writes; NORMAL sync is durable in WAL mode
+# apart from the last commit on power loss.
+CONNECTION_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("foreign_keys", "ON"),
+    ("busy_timeout", 5000),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("cache_size", -32000),  # negative = KiB, i.e. ~32 MB page cache
+    ("temp_store", "MEMORY"),
+)
+
+
 def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
+    """Open a new, fully configured connection (callers own and close it)."""
+    conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
     conn.row_factory = _dict_factory
-    conn.execute("PRAGMA foreign_keys = ON")
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
     return conn
 
 
+class ConnectionPool:
+    """
+    One long-lived connection per thread, opened lazily and reused for every
+    db_cursor() on that thread. Safe under gunicorn threaded workers; after a
+    fork the child drops the parent's handles and opens its own.
+    """
+
+    def __init__(self, factory=get_connection):
+        self._factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._connections: Dict[int, Any] = {}
+        self._stats = {"opened": 0, "reused": 0, "closed": 0}
+
+    def _check_fork(self) -> None:
+        if os.getpid() == self._pid:
+            return
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Never close the parent's handles from the child; just forget them.
+                self._pid = os.getpid()
+                self._local = threading.local()
+                self._connections = {}
+                self._stats = {"opened": 0, "reused": 0, "closed": 0}
+
+    def _prune_dead_threads(self) -> None:
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._connections if i not in alive]:
+            _, conn = self._connections.pop(ident)
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            self._stats["closed"] += 1
+
+    def acquire(self) -> sqlite3.Connection:
+        self._check_fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            with self._lock:
+                self._stats["reused"] += 1
+            return conn
+
+        conn = self._factory()
+        self._local.conn = conn
+        self._local.depth = 0
+        with self._lock:
+            self._prune_dead_threads()
+            self._connections[threading.get_ident()] = (threading.current_thread().name, conn)
+            self._stats["opened"] += 1
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yield the thread's connection inside a transaction. Nested calls join
+        the outermost transaction, which alone commits or rolls back.
+        """
+        conn = self.acquire()
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.rollback()
+            raise
+        else:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.commit()
+
+    def close_all(self) -> None:
+        with self._lock:
+            for _, conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                self._stats["closed"] += 1
+            self._connections = {}
+            self._local = threading.local()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "backend": "sqlite",
+                "pid": self._pid,
+                "open": len(self._connections),
+                "threads": sorted(name for name, _ in self._connections.values()),
+            }
+
+
+if USE_POSTGRES:
+    from analytics_pg import PostgresPool  # needs SQLAlchemy and psycopg (requirements.txt)
+
+    _pool = PostgresPool(DB_URL)
+else:
+    _pool = ConnectionPool()
+atexit.register(lambda: _pool.close_all())
+
+
+def pool_stats() -> Dict[str, Any]:
+    return _pool.stats()
+
+
+def close_connections() -> None:
+    _pool.close_all()
+
+
 @contextmanager
-def db_cursor():
-    conn = get_connection()
-    try:
-        yield conn.cursor()
-        conn.commit()
-    finally:
-        conn.close()
+def db_cursor(stream: bool = False):
+    """
+    Cursor inside the thread's transaction. ``stream`` asks Postgres for a
+    server-side cursor so big reads arrive in batches; SQLite cursors step
+    through results lazily anyway.
+    """
+    with _pool.transaction() as conn:
+        cur = conn.cursor(stream=True) if stream and USE_POSTGRES else conn.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
+def _read_clips_version(cur: sqlite3.Cursor) -> int:
+    cur.execute("SELECT version FROM data_versions WHERE name = 'clips'")
+    row = cur.fetchone()
+    return row["version"] if row else 0
+
+
+def clips_version() -> int:
+    """Counter bumped by every insert/update/delete on clips (from any process)."""
+    with db_cursor() as cur:
+        return _read_clips_version(cur)
+
+
+# ---- schema migrations ----
+#
+# CREATE_STATEMENTS holds the base schema. Later changes are numbered
+# migrations, applied once each in version order inside one write-locked
+# transaction (see _write_lock), so concurrent starts can't apply the same one
+# twice. They only do quick DDL (ALTER TABLE ADD COLUMN is O(1) in SQLite and,
+# without a volatile default, in Postgres); filling existing
+# rows is a named backfill that runs later in small batches, with
+# schema_backfills recording how far it got. The write path maintains the new
+# columns itself, so the backfill only has to cover rows written before.
+
+MIGRATION_TABLES = (
+    f"""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT DEFAULT {NOW_SQL}
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS schema_backfills (
+        name TEXT PRIMARY KEY,
+        last_rowid BIGINT NOT NULL DEFAULT 0,
+        rows_done INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT DEFAULT {NOW_SQL}
+    )
+    """,
+)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = []
+
+
+def migration(version: int, name: str):
+    """Register ``func(cur)`` as schema migration ``version``."""
+    def register(func: Callable[[sqlite3.Cursor], None]) -> Callable[[sqlite3.Cursor], None]:
+        MIGRATIONS.append((version, name, func))
+        return func
+    return register
+
+
+def _add_missing_columns(cur: sqlite3.Cursor, table: str, columns: Dict[str, str]) -> List[str]:
+    if USE_POSTGRES:
+        cur.execute(
+            """
+            SELECT column_name AS name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ?
+            """,
+            (table,),
+        )
+    else:
+        cur.execute(f"PRAGMA table_info({table})")
+    existing = {row["name"] for row in cur.fetchall()}
+    added = [name for name in columns if name not in existing]
+    for name in added:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}")
+    return added
+
+
+def _queue_backfill(cur: sqlite3.Cursor, name: str) -> None:
+    cur.execute("INSERT INTO schema_backfills (name) VALUES (?) ON CONFLICT DO NOTHING", (name,))
+
+
+def _write_lock(cur: sqlite3.Cursor, name: str) -> None:
+    """
+    Serialize writers of ``name`` for the rest of the transaction: SQLite
+    takes its database write lock up front (BEGIN IMMEDIATE), Postgres a
+    transaction-scoped advisory lock on the name.
+    """
+    if USE_POSTGRES:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(?))", (name,))
+    elif not cur.connection.in_transaction:
+        cur.execute("BEGIN IMMEDIATE")
+
+
+# Advisory key space for per-clip locks (the two-int form never collides with _write_lock's)
+CLIP_LOCK_SPACE = 7301
+
+
+def _lock_clips(cur: sqlite3.Cursor, clip_ids: Iterable[Any]) -> None:
+    """
+    Serialize writers of the same clips from before their old values are
+    read (clip_stats subtracts those): one advisory lock per clip on
+    Postgres, taken in id order so two writers can't deadlock; the database
+    write lock on SQLite.
+    """
+    if not USE_POSTGRES:
+        _write_lock(cur, "clips")
+        return
+    ids = sorted({str(clip_id) for clip_id in clip_ids if clip_id is not None})
+    if ids:
+        cur.execute(
+            f"SELECT pg_advisory_xact_lock({CLIP_LOCK_SPACE}, hashtext(id)) FROM unnest(CAST(? AS TEXT[])) AS ids (id)",
+            (ids,),
+        )
+
+
+def _begin_clip_write(cur: sqlite3.Cursor, clip_ids: Iterable[Any]) -> Optional[int]:
+    """
+    _lock_clips, then on SQLite the clips version the write starts from (the
+    write lock keeps anyone else from bumping it until commit). Hand the
+    result to _clip_write_versions at the end of the transaction.
+    """
+    _lock_clips(cur, clip_ids)
+    return None if USE_POSTGRES else _read_clips_version(cur)
+
+
+def _clip_write_versions(cur: sqlite3.Cursor, start: Optional[int]) -> Optional[Tuple[int, int]]:
+    """
+    The (before, after) clips versions this transaction's writes produced, or
+    None if it changed no clips, so _GameStatsCache can tell them apart from
+    other processes' writes.
+    """
+    if USE_POSTGRES:
+        # Run the deferred bump now; the counter row stays locked until commit
+        cur.execute("SET CONSTRAINTS trg_clips_version IMMEDIATE")
+        cur.execute(
+            "SELECT version, current_setting('analytics.clips_bumped', true) AS bumped "
+            "FROM data_versions WHERE name = 'clips'"
+        )
+        row = cur.fetchone()
+        return (row["version"] - 1, row["version"]) if row and row["bumped"] == "on" else None
+    end = _read_clips_version(cur)
+    return (start, end) if end != start else None
+
+
+def apply_migrations() -> List[int]:
+    """Apply pending migrations; returns the versions applied."""
+    applied: List[int] = []
+    with db_cursor() as cur:
+        _write_lock(cur, "schema")
+        for stmt in MIGRATION_TABLES:
+            cur.execute(stmt)
+        cur.execute("SELECT version FROM schema_migrations")
+        done = {row["version"] for row in cur.fetchall()}
+        for version, name, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in done:
+                continue
+            func(cur)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+            applied.append(version)
+            print(f"🗄️  Applied migration {version}: {name}")
+    return applied
+
+
+def schema_version() -> int:
+    with db_cursor() as cur:
+        cur.execute("SELECT MAX(version) AS version FROM schema_migrations")
+        row = cur.fetchone()
+    return (row["version"] if row else None) or 0
+
+
+@migration(1, "comm_analysis summary columns")
+def _migrate_comm_summary(cur: sqlite3.Cursor) -> None:
+    added = _add_missing_columns(
+        cur,
+        "comm_analysis",
+        {name: REAL_TYPE for name in ("talk_seconds", "talk_ratio", "longest_silence", "peak_dbfs")},
+    )
+    if added:
+        _refresh_comm_summary(cur)  # one row per analyzed clip, small enough to do inline
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_comm_analysis_silence ON comm_analysis (longest_silence)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_comm_analysis_talk ON comm_analysis (talk_seconds)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_comm_analysis_peak ON comm_analysis (peak_dbfs)")
+
+
+@migration(2, "typed clip columns")
+def _migrate_typed_clip_columns(cur: sqlite3.Cursor) -> None:
+    _add_missing_columns(cur, "clips", TYPED_CLIP_COLUMN_TYPES)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_clips_shot_pos ON clips (has_shot_flag, shot_x_pos, shot_y_pos)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_clips_game_start ON clips (game_id, start_seconds)")
+    _queue_backfill(cur, "typed_clip_columns")
+
+
+@migration(3, "clip_actions child table")
+def _migrate_clip_actions(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS clip_actions (
+            clip_id TEXT NOT NULL REFERENCES clips(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            label TEXT NOT NULL,
+            PRIMARY KEY (clip_id, position)
+        ) {WITHOUT_ROWID}
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_clip_actions_action ON clip_actions (action, clip_id)")
+    _queue_backfill(cur, "clip_actions")
+
+
+@migration(4, "unique clip_embeddings slots")
+def _migrate_unique_embedding_slots(cur: sqlite3.Cursor) -> None:
+    # Two processes could once hand out the same slot. Such a slot holds only
+    # the last vector written, so drop every row on it; sync() re-embeds them.
+    cur.execute(
+        """
+        DELETE FROM clip_embeddings
+        WHERE EXISTS (
+            SELECT 1 FROM clip_embeddings AS other
+            WHERE other.model = clip_embeddings.model AND other.slot = clip_embeddings.slot
+                AND other.clip_id <> clip_embeddings.clip_id
+        )
+        """
+    )
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_clip_embeddings_slot ON clip_embeddings (model, slot)")
+
+
+@migration(5, "has_shot keyset index")
+def _migrate_has_shot_created(cur: sqlite3.Cursor) -> None:
+    # The has_shot filter matches has_shot_flag once typed_clip_columns is
+    # backfilled; until then it goes through LOWER(has_shot) on the created index
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_clips_has_shot_created ON clips (has_shot_flag, created_at, id)")
 
 
 def init_db() -> None:
     with db_cursor() as cur:
+        _write_lock(cur, "schema")
         for stmt in CREATE_STATEMENTS:
             cur.execute(stmt)
+        cur.execute(
+            """
+            SELECT EXISTS (SELECT 1 FROM clip_stats) AS has_stats,
+                EXISTS (SELECT 1 FROM clip_tags) AS has_tags,
+                EXISTS (SELECT 1 FROM clips) AS has_clips
+            """
+        )
+        state = cur.fetchone()
+        if state["has_clips"] and not state["has_stats"]:
+            _rebuild_clip_stats(cur)
+        if state["has_clips"] and not state["has_tags"]:
+            _rebuild_clip_tags(cur)
+    apply_migrations()
 
 
-def upsert_clip(clip: Dict[str, Any]) -> None:
+# Same grouping the dashboard uses: the canonical game, else game number, else the clip itself
+GAME_KEY_SQL = "COALESCE(NULLIF(canonical_game_id, ''), CAST(game_id AS TEXT), id)"
+
+STOP_KEYWORDS = ("turnover", "miss", "steal", "charge", "block", "offensive foul")
+
+# Mirrors detectStop/detectBreakdown in ui/src/components/dashboardUtils.ts.
+# The flags are CAST to 0/1 because Postgres won't SUM() a boolean.
+STOP_SQL = "CAST(CASE WHEN {} THEN points <= 0 ELSE ({}) END AS INTEGER)".format(
+    NUMERIC_POINTS_SQL,
+    " OR ".join(f"LOWER(COALESCE(result, '')) LIKE '%{kw}%'" for kw in STOP_KEYWORDS),
+)
+BREAKDOWN_SQL = "CAST(LOWER(TRIM(COALESCE(breakdown, ''))) LIKE 'y%' AS INTEGER)"
+POINTS_SQL = f"CASE WHEN {NUMERIC_POINTS_SQL} THEN points ELSE 0 END"
+
+GAME_STATS_SQL = f"""
+    SELECT
+        {GAME_KEY_SQL} AS game_key,
+        MAX(game_id) AS game_id,
+        MAX(opponent) AS opponent,
+        COUNT(*) AS clip_count,
+        SUM({STOP_SQL}) AS stop_count,
+        SUM({BREAKDOWN_SQL}) AS breakdown_count,
+        SUM({POINTS_SQL}) AS points_total
+    FROM clips
+    {{where}}
+    GROUP BY game_key
+"""
+
+if USE_POSTGRES:
+    GAME_LATEST_SQL = f"""
+        SELECT DISTINCT ON (game_key) {GAME_KEY_SQL} AS game_key, {{column}} AS value
+        FROM clips
+        WHERE TRIM(COALESCE({{column}}, '')) NOT IN ('', '—') {{and_where}}
+        ORDER BY game_key, created_at DESC NULLS LAST, id DESC
     """
-    Insert or update a clip record. The dict should contain all normalized fields.
+else:
+    # SQLite returns the bare column from the row holding MAX(created_at)
+    GAME_LATEST_SQL = f"""
+        SELECT {GAME_KEY_SQL} AS game_key, {{column}} AS value, MAX(created_at)
+        FROM clips
+        WHERE TRIM(COALESCE({{column}}, '')) NOT IN ('', '—') {{and_where}}
+        GROUP BY game_key
     """
-    normalized = clip.copy()
-    now = datetime.utcnow().isoformat()
-    normalized.setdefault("created_at", now)
-    normalized["updated_at"] = now
-
-    columns = [
-        "id",
-        "filename",
-        "path",
-        "game_id",
-        "canonical_game_id",
-        "canonical_clip_id",
-        "opponent",
-        "opponent_slug",
-        "location",
-        "game_score",
-        "quarter",
-        "possession",
-        "situation",
-        "formation",
-        "play_name",
-        "scout_coverage",
-        "action_trigger",
-        "action_types",
-        "action_sequence",
-        "coverage",
-        "ball_screen",
-        "off_ball_screen",
-        "help_rotation",
-        "disruption",
-        "breakdown",
-        "result",
-        "paint_touch",
-        "shooter",
-        "shot_location",
-        "contest",
-        "rebound",
-        "points",
-        "has_shot",
-        "shot_x",
-        "shot_y",
-        "shot_result",
-        "notes",
-        "start_time",
-        "end_time",
-        "created_at",
-        "updated_at",
+
+_SCORE_RE = re.compile(r"^(.+?)\s+([WLwl])$")
+_SUMMARY_KEY = object()
+
+
+class _GameStatsCache:
+    """
+    Per-game aggregate cache. Every invalidation bumps a generation so a
+    result computed from a snapshot older than the invalidation is dropped
+    instead of being stored.
+
+    This process's clip writes invalidate only the games they touched and
+    record the clips versions they produced; sync() clears everything only
+    when the clips version moved through writes from elsewhere.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._entries: Dict[Any, Any] = {}
+        self._version: Optional[int] = None
+        self._local_writes: Dict[int, int] = {}  # before -> after version of our own commits
+
+    def sync(self, version: int) -> None:
+        with self._lock:
+            seen = self._version
+            while seen != version and seen in self._local_writes:
+                seen = self._local_writes.pop(seen)
+            if seen != version:
+                self._generation += 1
+                self._entries.clear()
+            self._version = version
+            self._local_writes = {
+                before: after for before, after in self._local_writes.items() if before >= version
+            }
+
+    def note_write(self, versions: Optional[Tuple[int, int]]) -> None:
+        if versions is not None:
+            with self._lock:
+                self._local_writes[versions[0]] = versions[1]
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: Any, value: Any, generation: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = value
+
+    def invalidate(self, game_keys: Iterable[str], versions: Optional[Tuple[int, int]] = None) -> None:
+        self.note_write(versions)
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(_SUMMARY_KEY, None)
+            for key in game_keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+_game_stats_cache = _GameStatsCache()
+
+
+def _game_keys_for(cur: sqlite3.Cursor, clip_ids: List[Any]) -> set:
+    ids = [clip_id for clip_id in clip_ids if clip_id is not None]
+    keys = set()
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        cur.execute(
+            f"SELECT DISTINCT {GAME_KEY_SQL} AS game_key FROM clips WHERE id IN ({', '.join('?' for _ in batch)})",
+            batch,
+        )
+        keys.update(row["game_key"] for row in cur.fetchall())
+    return keys
+
+
+def _finish_game_stats(row: Dict[str, Any], score: Optional[str], location: Optional[str]) -> Dict[str, Any]:
+    total = row["clip_count"] or 0
+    stops = row["stop_count"] or 0
+    breakdowns = row["breakdown_count"] or 0
+    points = row["points_total"] or 0
+    result_label = None
+    if score:
+        score = score.strip()
+        match = _SCORE_RE.match(score)
+        if match:
+            score, result_label = match.group(1).strip(), match.group(2).upper()
+    return {
+        "id": row["game_key"],
+        "game_id": row["game_id"],
+        "opponent": row["opponent"],
+        "location": location,
+        "score": score,
+        "result_label": result_label,
+        "clip_count": total,
+        "stop_count": stops,
+        "breakdown_count": breakdowns,
+        "points_total": points,
+        # int(x + 0.5) matches Math.round in the dashboard (round() is banker's rounding)
+        "stop_rate": int(stops / total * 100 + 0.5) if total else 0,
+        "breakdown_rate": int(breakdowns / total * 100 + 0.5) if total else 0,
+        "points_per_clip": points / total if total else 0,
+    }
+
+
+def _compute_game_stats(cur: sqlite3.Cursor, game_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    where, and_where, params = "", "", []
+    if game_key is not None:
+        where = f"WHERE {GAME_KEY_SQL} = ?"
+        and_where = f"AND {GAME_KEY_SQL} = ?"
+        params = [game_key]
+
+    latest = {}
+    for column in ("game_score", "location"):
+        cur.execute(GAME_LATEST_SQL.format(column=column, and_where=and_where), params)
+        latest[column] = {row["game_key"]: row["value"] for row in cur.fetchall()}
+
+    cur.execute(GAME_STATS_SQL.format(where=where), params)
+    return [
+        _finish_game_stats(
+            row,
+            latest["game_score"].get(row["game_key"]),
+            latest["location"].get(row["game_key"]),
+        )
+        for row in cur.fetchall()
     ]
 
-    placeholders = ", ".join("?" for _ in columns)
-    assignments = ", ".join(f"{col}=excluded.{col}" for col in columns if col not in {"id", "created_at"})
 
-    values = [normalized.get(col) for col in columns]
+def _cached_game_stats(key: Any, compute) -> Any:
+    with db_cursor() as cur:
+        _game_stats_cache.sync(_read_clips_version(cur))
+        cached = _game_stats_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = _game_stats_cache.generation()
+        value = compute(cur)
+    _game_stats_cache.put(key, value, generation)
+    return value
+
+
+def game_summary() -> List[Dict[str, Any]]:
+    """Per-game clip count, stop/breakdown rates, points and score for every game."""
+    return _cached_game_stats(_SUMMARY_KEY, _compute_game_stats)
+
+
+def game_stats(game_key: str) -> Optional[Dict[str, Any]]:
+    """Aggregate stats for one game (see GAME_KEY_SQL for how games are keyed)."""
+    rows = _cached_game_stats(game_key, lambda cur: _compute_game_stats(cur, game_key) or [None])
+    return rows[0]
 
+
+# clip_stats dimensions -> the clips expression each one groups by. Clips with
+# an empty value for a dimension are left out of that dimension's rows.
+STAT_DIMENSIONS = {
+    "game": GAME_KEY_SQL,
+    "opponent": "opponent",
+    "coverage": "coverage",
+    "ball_screen": "ball_screen",
+    "shooter": "shooter",
+}
+
+CLIP_STAT_DELTA_SQL = f"""
+    SELECT {", ".join(f"{expr} AS {name}" for name, expr in STAT_DIMENSIONS.items())},
+        {POINTS_SQL} AS points, {STOP_SQL} AS stop, {BREAKDOWN_SQL} AS breakdown
+    FROM clips
+    WHERE id IN ({{placeholders}})
+"""
+
+APPLY_CLIP_STAT_SQL = """
+    INSERT INTO clip_stats (dimension, value, possessions, points_allowed, stops, breakdowns)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(dimension, value) DO UPDATE SET
+        possessions = clip_stats.possessions + excluded.possessions,
+        points_allowed = clip_stats.points_allowed + excluded.points_allowed,
+        stops = clip_stats.stops + excluded.stops,
+        breakdowns = clip_stats.breakdowns + excluded.breakdowns
+"""
+
+
+StatDeltas = Dict[Tuple[str, Any], List[int]]
+
+
+def _clip_stat_deltas(
+    cur: sqlite3.Cursor,
+    clip_ids: Iterable[Any],
+    sign: int,
+    deltas: Optional[StatDeltas] = None,
+) -> StatDeltas:
+    """
+    Add (sign=1) or subtract (sign=-1) what the current rows of ``clip_ids``
+    contribute to clip_stats into ``deltas``. Callers read -1 before a write
+    and +1 after it, then _apply_clip_stats() the net change.
+    """
+    ids = [clip_id for clip_id in clip_ids if clip_id is not None]
+    deltas = {} if deltas is None else deltas
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        cur.execute(CLIP_STAT_DELTA_SQL.format(placeholders=", ".join("?" for _ in batch)), batch)
+        for row in cur.fetchall():
+            for dimension in STAT_DIMENSIONS:
+                value = row[dimension]
+                if value is None or str(value).strip() == "":
+                    continue
+                total = deltas.setdefault((dimension, value), [0, 0, 0, 0])
+                total[0] += sign
+                total[1] += sign * (row["points"] or 0)
+                total[2] += sign * (row["stop"] or 0)
+                total[3] += sign * (row["breakdown"] or 0)
+    return deltas
+
+
+def _apply_clip_stats(cur: sqlite3.Cursor, deltas: StatDeltas) -> None:
+    """
+    Write net ``deltas`` to clip_stats in (dimension, value) order, so
+    concurrent Postgres writers lock the rows they share in the same order.
+    """
+    rows = sorted(
+        ((dim, value, *totals) for (dim, value), totals in deltas.items() if any(totals)),
+        key=lambda row: (row[0], str(row[1])),
+    )
+    if not rows:
+        return
+    cur.executemany(APPLY_CLIP_STAT_SQL, rows)
+    if any(row[2] < 0 for row in rows):
+        cur.execute("DELETE FROM clip_stats WHERE possessions <= 0")
+
+
+def _rebuild_clip_stats(cur: sqlite3.Cursor) -> None:
+    cur.execute("DELETE FROM clip_stats")
+    for dimension, expr in STAT_DIMENSIONS.items():
+        cur.execute(
+            f"""
+            INSERT INTO clip_stats (dimension, value, possessions, points_allowed, stops, breakdowns)
+            SELECT ?, {expr}, COUNT(*), SUM({POINTS_SQL}), SUM({STOP_SQL}), SUM({BREAKDOWN_SQL})
+            FROM clips
+            WHERE TRIM(COALESCE({expr}, '')) <> ''
+            GROUP BY {expr}
+            """,
+            (dimension,),
+        )
+
+
+def rebuild_clip_stats() -> Dict[str, int]:
+    """Recompute clip_stats from scratch (drift recovery). Returns row counts per dimension."""
+    with db_cursor() as cur:
+        _rebuild_clip_stats(cur)
+        cur.execute("SELECT dimension, COUNT(*) AS n FROM clip_stats GROUP BY dimension")
+        return {row["dimension"]: row["n"] for row in cur.fetchall()}
+
+
+def fetch_clip_stats(dimension: str, value: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Read materialized stats for one dimension (optionally a single value),
+    with stop/breakdown rates and points per possession derived on the way out.
+    """
+    if dimension not in STAT_DIMENSIONS:
+        raise ValueError(f"Unknown stats dimension: {dimension}")
+    sql = "SELECT * FROM clip_stats WHERE dimension = ?"
+    params: List[Any] = [dimension]
+    if value is not None:
+        sql += " AND value = ?"
+        params.append(value)
+    sql += " ORDER BY possessions DESC, value"
+    with db_cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    for row in rows:
+        total = row["possessions"]
+        row["stop_rate"] = row["stops"] / total if total else 0
+        row["breakdown_rate"] = row["breakdowns"] / total if total else 0
+        row["points_per_possession"] = row["points_allowed"] / total if total else 0
+    return rows
+
+
+# Tag columns indexed into clip_tags. Values are comma/semicolon/pipe or
+# arrow delimited ("PnR → DHO → Skip"); each part becomes one posting.
+TAG_FIELDS = (
+    "formation",
+    "action_types",
+    "action_sequence",
+    "coverage",
+    "ball_screen",
+    "off_ball_screen",
+    "help_rotation",
+    "breakdown",
+    "result",
+)
+
+_TAG_SPLIT_RE = re.compile(r"\s*(?:,|;|\||→|->|=>|>)\s*")
+
+
+def normalize_tag(value: Any) -> str:
+    return " ".join(str(value).lower().split())
+
+
+def split_tags(text: Any) -> List[Tuple[str, str]]:
+    """(normalized value, label) for each part of a tag cell."""
+    if text is None:
+        return []
+    parts = []
+    for part in _TAG_SPLIT_RE.split(str(text)):
+        label = " ".join(part.split())
+        if label:
+            parts.append((label.lower(), label))
+    return parts
+
+
+def _insert_rows(cur: sqlite3.Cursor, table: str, columns: Tuple[str, ...], rows: List[Tuple[Any, ...]]) -> None:
+    """Plain INSERT of many rows: one prepared statement on SQLite, COPY on Postgres."""
+    if not rows:
+        return
+    if USE_POSTGRES:
+        cur.copy_rows(table, columns, rows)
+    else:
+        cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})", rows)
+
+
+def _tag_postings(rows: Iterable[Dict[str, Any]]) -> List[Tuple[str, str, Any, str]]:
+    """Unique (field, value, clip_id, label) postings; a value repeated in one cell keeps its first label."""
+    postings: Dict[Tuple[str, str, Any], str] = {}
+    for row in rows:
+        for field in TAG_FIELDS:
+            for value, label in split_tags(row[field]):
+                postings.setdefault((field, value, row["id"]), label)
+    return [(*key, label) for key, label in postings.items()]
+
+
+TAG_COLUMNS = ("field", "value", "clip_id", "label")
+
+
+def _index_clip_tags(cur: sqlite3.Cursor, clip_ids: Iterable[Any]) -> None:
+    """Replace the postings of ``clip_ids`` with their current tag values (deleted clips just lose theirs)."""
+    ids = list({clip_id for clip_id in clip_ids if clip_id is not None})
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        placeholders = ", ".join("?" for _ in batch)
+        cur.execute(f"DELETE FROM clip_tags WHERE clip_id IN ({placeholders})", batch)
+        cur.execute(f"SELECT id, {', '.join(TAG_FIELDS)} FROM clips WHERE id IN ({placeholders})", batch)
+        _insert_rows(cur, "clip_tags", TAG_COLUMNS, _tag_postings(cur.fetchall()))
+
+
+def _rebuild_clip_tags(cur: sqlite3.Cursor) -> None:
+    cur.execute("DELETE FROM clip_tags")
+    cur.execute(f"SELECT id, {', '.join(TAG_FIELDS)} FROM clips")
+    writer = cur.connection.cursor()  # cur is still being read
+    while True:
+        rows = cur.fetchmany(1000)
+        if not rows:
+            break
+        _insert_rows(writer, "clip_tags", TAG_COLUMNS, _tag_postings(rows))
+
+
+ACTION_COLUMNS = ("clip_id", "position", "action", "label")
+
+
+def _action_rows(rows: Iterable[Dict[str, Any]]) -> List[Tuple[Any, int, str, str]]:
+    return [
+        (row["id"], position, value, label)
+        for row in rows
+        for position, (value, label) in enumerate(split_tags(row["action_types"]))
+    ]
+
+
+def _index_clip_actions(cur: sqlite3.Cursor, clip_ids: Iterable[Any]) -> None:
+    """Replace the clip_actions rows of ``clip_ids`` (deleted clips cascade)."""
+    ids = list({clip_id for clip_id in clip_ids if clip_id is not None})
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        placeholders = ", ".join("?" for _ in batch)
+        cur.execute(f"DELETE FROM clip_actions WHERE clip_id IN ({placeholders})", batch)
+        cur.execute(f"SELECT id, action_types FROM clips WHERE id IN ({placeholders})", batch)
+        _insert_rows(cur, "clip_actions", ACTION_COLUMNS, _action_rows(cur.fetchall()))
+
+
+def rebuild_clip_tags() -> int:
+    """Recompute clip_tags from scratch. Returns the number of postings."""
     with db_cursor() as cur:
+        _rebuild_clip_tags(cur)
+        cur.execute("SELECT COUNT(*) AS n FROM clip_tags")
+        return cur.fetchone()["n"]
+
+
+CLIP_COLUMNS = [
+    "id",
+    "filename",
+    "path",
+    "game_id",
+    "canonical_game_id",
+    "canonical_clip_id",
+    "opponent",
+    "opponent_slug",
+    "location",
+    "game_score",
+    "quarter",
+    "possession",
+    "situation",
+    "formation",
+    "play_name",
+    "scout_coverage",
+    "action_trigger",
+    "action_types",
+    "action_sequence",
+    "coverage",
+    "ball_screen",
+    "off_ball_screen",
+    "help_rotation",
+    "disruption",
+    "breakdown",
+    "result",
+    "paint_touch",
+    "shooter",
+    "shot_location",
+    "contest",
+    "rebound",
+    "points",
+    "has_shot",
+    "shot_x",
+    "shot_y",
+    "shot_result",
+    "notes",
+    "start_time",
+    "end_time",
+    "created_at",
+    "updated_at",
+]
+
+
+def parse_clock_seconds(value: Any) -> Optional[float]:
+    """"HH:MM:SS", "MM:SS(.f)" or plain seconds -> seconds; None if unparseable."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        parts = str(value).strip().split(":")
+        if not parts[0] or len(parts) > 3:
+            return None
+        try:
+            seconds = 0.0
+            for part in parts:
+                seconds = seconds * 60 + float(part)
+        except ValueError:
+            return None
+    return seconds if math.isfinite(seconds) and seconds >= 0 else None
+
+
+def parse_coordinate(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool) or str(value).strip() == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_flag(value: Any) -> int:
+    return int(str(value).strip().lower() in _TRUTHY) if value is not None else 0
+
+
+# Typed shadows of text columns the UI reads as-is ("MM:SS", "Yes"/"No",
+# coordinates as strings). They are derived from the text on every write so
+# range and membership filters hit an index instead of parsing in Python.
+TYPED_CLIP_COLUMNS: Dict[str, Tuple[str, Callable[[Any], Any]]] = {
+    "start_seconds": ("start_time", parse_clock_seconds),
+    "end_seconds": ("end_time", parse_clock_seconds),
+    "shot_x_pos": ("shot_x", parse_coordinate),
+    "shot_y_pos": ("shot_y", parse_coordinate),
+    "has_shot_flag": ("has_shot", parse_flag),
+}
+TYPED_CLIP_COLUMN_TYPES = {
+    "start_seconds": REAL_TYPE,
+    "end_seconds": REAL_TYPE,
+    "shot_x_pos": REAL_TYPE,
+    "shot_y_pos": REAL_TYPE,
+    "has_shot_flag": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+def typed_clip_values(clip: Dict[str, Any]) -> List[Any]:
+    return [parse(clip.get(source)) for source, parse in TYPED_CLIP_COLUMNS.values()]
+
+
+_UPSERT_COLUMNS = [*CLIP_COLUMNS, *TYPED_CLIP_COLUMNS]
+_UPSERT_ASSIGNMENTS = ", ".join(f"{col}=excluded.{col}" for col in _UPSERT_COLUMNS if col not in {"id", "created_at"})
+
+UPSERT_CLIP_SQL = """
+    INSERT INTO clips ({columns})
+    VALUES ({placeholders})
+    ON CONFLICT(id) DO UPDATE SET {assignments}
+""".format(
+    columns=", ".join(_UPSERT_COLUMNS),
+    placeholders=", ".join("?" for _ in _UPSERT_COLUMNS),
+    assignments=_UPSERT_ASSIGNMENTS,
+)
+
+# Postgres bulk path: rows are COPY'd into clips_stage, then upserted in one
+# statement. DISTINCT ON keeps the last copy of an id repeated within a chunk,
+# as executemany would, since one INSERT can't update the same row twice.
+CLIPS_STAGE_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS clips_stage AS
+    SELECT CAST(0 AS BIGINT) AS stage_seq, {columns} FROM clips WITH NO DATA
+""".format(columns=", ".join(_UPSERT_COLUMNS))
+
+UPSERT_STAGED_CLIPS_SQL = """
+    INSERT INTO clips ({columns})
+    SELECT DISTINCT ON (id) {columns} FROM clips_stage ORDER BY id, stage_seq DESC
+    ON CONFLICT(id) DO UPDATE SET {assignments}
+""".format(columns=", ".join(_UPSERT_COLUMNS), assignments=_UPSERT_ASSIGNMENTS)
+
+# camelCase keys written by clip_extractor into clips_metadata.json
+METADATA_FIELD_MAP = {
+    "gameId": "game_id",
+    "canonicalGameId": "canonical_game_id",
+    "canonicalClipId": "canonical_clip_id",
+    "playName": "play_name",
+    "scoutCoverage": "scout_coverage",
+    "actionTrigger": "action_trigger",
+    "actionTypes": "action_types",
+    "actionSequence": "action_sequence",
+    "ballScreen": "ball_screen",
+    "offBallScreen": "off_ball_screen",
+    "helpRotation": "help_rotation",
+    "paintTouch": "paint_touch",
+    "shotLocation": "shot_location",
+    "hasShot": "has_shot",
+    "shotX": "shot_x",
+    "shotY": "shot_y",
+    "shotResult": "shot_result",
+    "startTime": "start_time",
+    "endTime": "end_time",
+    "createdAt": "created_at",
+}
+
+DEFAULT_IMPORT_CHUNK_SIZE = 500
+
+
+def _clip_values(clip: Dict[str, Any], now: str) -> List[Any]:
+    values = [clip.get(col) for col in CLIP_COLUMNS]
+    values[-2] = values[-2] or now  # created_at
+    values[-1] = now  # updated_at
+    return values + typed_clip_values(clip)
+
+
+def _backfill_typed_columns(cur: sqlite3.Cursor, rows: List[Dict[str, Any]]) -> None:
+    assignments = ", ".join(f"{name} = ?" for name in TYPED_CLIP_COLUMNS)
+    cur.executemany(
+        f"UPDATE clips SET {assignments} WHERE id = ?",
+        [[*typed_clip_values(row), row["id"]] for row in rows],
+    )
+
+
+def _backfill_clip_actions(cur: sqlite3.Cursor, rows: List[Dict[str, Any]]) -> None:
+    ids = [row["id"] for row in rows]
+    cur.execute(f"DELETE FROM clip_actions WHERE clip_id IN ({', '.join('?' for _ in ids)})", ids)
+    _insert_rows(cur, "clip_actions", ACTION_COLUMNS, _action_rows(rows))
+
+
+# name -> (clips columns read, apply(cur, rows)); queued by the migration that needs it
+BACKFILLS: Dict[str, Tuple[Tuple[str, ...], Callable[[sqlite3.Cursor, List[Dict[str, Any]]], None]]] = {
+    "typed_clip_columns": (tuple(source for source, _ in TYPED_CLIP_COLUMNS.values()), _backfill_typed_columns),
+    "clip_actions": (("action_types",), _backfill_clip_actions),
+}
+DEFAULT_BACKFILL_BATCH = 1000
+
+_backfills_done: set = set()
+
+
+def backfill_batch(name: str, batch_size: int = DEFAULT_BACKFILL_BATCH) -> bool:
+    """
+    Run the next batch of backfill ``name`` in its own short write
+    transaction, walking clips in rowid order (row_id on Postgres). Returns
+    True while rows remain. Rows written concurrently are kept current by
+    the write path, so re-deriving them here is harmless.
+    """
+    columns, apply = BACKFILLS[name]
+    with db_cursor() as cur:
+        _write_lock(cur, f"backfill:{name}")  # before reading progress
+        cur.execute("SELECT last_rowid, done FROM schema_backfills WHERE name = ?", (name,))
+        state = cur.fetchone()
+        if state is None or state["done"]:
+            return False
         cur.execute(
             f"""
-            INSERT INTO clips ({", ".join(columns)})
-            VALUES ({placeholders})
-            ON CONFLICT(id) DO UPDATE SET {assignments}
+            SELECT {ROWID_SQL} AS row_id, id, {', '.join(columns)} FROM clips
+            WHERE {ROWID_SQL} > ? ORDER BY {ROWID_SQL} LIMIT ?
             """,
-            values,
+            (state["last_rowid"], batch_size),
         )
+        rows = cur.fetchall()
+        if rows:
+            apply(cur, rows)
+        more = len(rows) == batch_size
+        cur.execute(
+            f"""
+            UPDATE schema_backfills
+            SET last_rowid = ?, rows_done = rows_done + ?, done = ?, updated_at = {NOW_SQL}
+            WHERE name = ?
+            """,
+            (rows[-1]["row_id"] if rows else state["last_rowid"], len(rows), int(not more), name),
+        )
+    return more
+
+
+def run_backfills(batch_size: int = DEFAULT_BACKFILL_BATCH, pause: float = 0.0) -> Dict[str, int]:
+    """
+    Drive every pending backfill to completion, ``pause`` seconds between
+    batches to leave the write lock to request handlers. Returns batches run.
+    """
+    batches: Dict[str, int] = {}
+    for name in BACKFILLS:
+        if backfill_done(name):
+            continue
+        while True:
+            more = backfill_batch(name, batch_size)
+            batches[name] = batches.get(name, 0) + 1
+            if not more:
+                break
+            if pause:
+                time.sleep(pause)
+    return batches
+
+
+def backfill_status() -> List[Dict[str, Any]]:
+    with db_cursor() as cur:
+        cur.execute("SELECT name, last_rowid, rows_done, done, updated_at FROM schema_backfills ORDER BY name")
+        return cur.fetchall()
+
+
+def backfill_done(name: str) -> bool:
+    """True once backfill ``name`` finished (or was never needed), cached per process."""
+    if name in _backfills_done:
+        return True
+    with db_cursor() as cur:
+        cur.execute("SELECT done FROM schema_backfills WHERE name = ?", (name,))
+        row = cur.fetchone()
+    if row is None or row["done"]:
+        _backfills_done.add(name)
+        return True
+    return False
 
 
-def upsert_comm_segments(clip_id: str, segments: Iterable[Dict[str, Any]]) -> None:
+_backfill_thread: Optional[threading.Thread] = None
+
+
+def start_backfills(batch_size: int = DEFAULT_BACKFILL_BATCH, pause: float = 0.05) -> bool:
+    """Run pending backfills on a daemon thread so the server can start serving right away."""
+    global _backfill_thread
+    if all(backfill_done(name) for name in BACKFILLS):
+        return False
+    if _backfill_thread is not None and _backfill_thread.is_alive():
+        return True
+
+    def run() -> None:
+        started = time.monotonic()
+        try:
+            batches = run_backfills(batch_size, pause)
+        except Exception as exc:
+            print(f"⚠️  Backfill stopped (resumes on next start): {exc}")
+            return
+        print(f"✅ Backfills finished in {time.monotonic() - started:.1f}s: {batches}")
+
+    _backfill_thread = threading.Thread(target=run, name="db-backfill", daemon=True)
+    _backfill_thread.start()
+    return True
+
+
+def _upsert_clip_rows(cur: sqlite3.Cursor, rows: List[List[Any]]) -> None:
+    """Run UPSERT_CLIP_SQL for ``rows`` (_clip_values lists), via COPY on Postgres."""
+    if not USE_POSTGRES:
+        cur.executemany(UPSERT_CLIP_SQL, rows)
+        return
+    cur.execute(CLIPS_STAGE_SQL)
+    cur.copy_rows("clips_stage", ["stage_seq", *_UPSERT_COLUMNS], ([seq, *row] for seq, row in enumerate(rows)))
+    cur.execute(UPSERT_STAGED_CLIPS_SQL)
+    cur.execute("TRUNCATE clips_stage")
+
+
+def upsert_clip(clip: Dict[str, Any]) -> None:
+    """
+    Insert or update a clip record. The dict should contain all normalized fields.
+    """
+    now = datetime.utcnow().isoformat()
+    with db_cursor() as cur:
+        start = _begin_clip_write(cur, [clip.get("id")])
+        touched = _game_keys_for(cur, [clip.get("id")])
+        deltas = _clip_stat_deltas(cur, [clip.get("id")], -1)
+        cur.execute(UPSERT_CLIP_SQL, _clip_values(clip, now))
+        _apply_clip_stats(cur, _clip_stat_deltas(cur, [clip.get("id")], 1, deltas))
+        _index_clip_tags(cur, [clip.get("id")])
+        _index_clip_actions(cur, [clip.get("id")])
+        touched |= _game_keys_for(cur, [clip.get("id")])
+        versions = _clip_write_versions(cur, start)
+    _game_stats_cache.invalidate(touched, versions)
+
+
+def normalize_metadata_clip(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a clips_metadata.json entry onto clips table column names."""
+    record = {METADATA_FIELD_MAP.get(key, key): value for key, value in entry.items()}
+    record["id"] = entry.get("canonicalClipId") or entry.get("__clipId") or entry.get("id")
+    record.setdefault("canonical_game_id", entry.get("__gameId"))
+    return record
+
+
+def bulk_upsert_clips(
+    records: Iterable[Dict[str, Any]],
+    chunk_size: int = DEFAULT_IMPORT_CHUNK_SIZE,
+) -> Dict[str, int]:
+    """
+    Upsert many clips with one prepared statement (a COPY on Postgres),
+    committing every ``chunk_size`` rows. ``records`` may be any iterable (including a
+    generator), so it is never materialized in full. Returns counts of
+    inserted and updated rows.
+    """
+    chunk_size = max(1, int(chunk_size))
+    counts = {"inserted": 0, "updated": 0}
+    now = datetime.utcnow().isoformat()
+
+    def flush(chunk: List[List[Any]]) -> None:
+        ids = list({row[0] for row in chunk})
+        with db_cursor() as cur:
+            start = _begin_clip_write(cur, ids)
+            existing = set()
+            for offset in range(0, len(ids), 500):
+                batch = ids[offset:offset + 500]
+                cur.execute(
+                    f"SELECT id FROM clips WHERE id IN ({', '.join('?' for _ in batch)})",
+                    batch,
+                )
+                existing.update(row["id"] for row in cur.fetchall())
+            previously_stored = set(existing)
+            for row in chunk:
+                if row[0] in existing:
+                    counts["updated"] += 1
+                else:
+                    counts["inserted"] += 1
+                    existing.add(row[0])
+            touched = _game_keys_for(cur, list(previously_stored))
+            deltas = _clip_stat_deltas(cur, previously_stored, -1)
+            _upsert_clip_rows(cur, chunk)
+            _apply_clip_stats(cur, _clip_stat_deltas(cur, ids, 1, deltas))
+            _index_clip_tags(cur, ids)
+            _index_clip_actions(cur, ids)
+            touched |= _game_keys_for(cur, ids)
+            versions = _clip_write_versions(cur, start)
+        # Per chunk, so games stay fresh during a long import and after one that fails partway
+        _game_stats_cache.invalidate(touched, versions)
+
+    chunk: List[List[Any]] = []
+    for record in records:
+        chunk.append(_clip_values(record, now))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return counts
+
+
+COMM_SEGMENT_COLUMNS = ("clip_id", "start", '"end"', "duration", "peak_dbfs", "rms", "rms_dbfs")
+
+
+def upsert_comm_segments(
+    clip_id: str,
+    segments: Iterable[Dict[str, Any]],
+    analysis: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Replace a clip's segments. ``analysis`` (source_mtime_ns, source_size,
+    audio_duration) marks the clip as analyzed in the same transaction.
+    """
     rows = [
         (
             clip_id,
@@ -188,13 +1456,99 @@ def upsert_comm_segments(clip_id: str, segments: Iterable[Dict[str, Any]]) -> No
     ]
     with db_cursor() as cur:
         cur.execute("DELETE FROM comm_segments WHERE clip_id = ?", (clip_id,))
-        cur.executemany(
-            """
-            INSERT INTO comm_segments (clip_id, start, "end", duration, peak_dbfs, rms, rms_dbfs)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            rows,
+        _insert_rows(cur, "comm_segments", COMM_SEGMENT_COLUMNS, rows)
+        if analysis is not None:
+            cur.execute(
+                f"""
+                INSERT INTO comm_analysis
+                    (clip_id, source_mtime_ns, source_size, audio_duration, segment_count, analyzed_at)
+                VALUES (?, ?, ?, ?, ?, {NOW_SQL})
+                ON CONFLICT(clip_id) DO UPDATE SET
+                    source_mtime_ns = excluded.source_mtime_ns,
+                    source_size = excluded.source_size,
+                    audio_duration = excluded.audio_duration,
+                    segment_count = excluded.segment_count,
+                    analyzed_at = excluded.analyzed_at
+                """,
+                (
+                    clip_id,
+                    analysis.get("source_mtime_ns"),
+                    analysis.get("source_size"),
+                    analysis.get("audio_duration"),
+                    len(rows),
+                ),
+            )
+        _refresh_comm_summary(cur, [clip_id])
+
+
+def _refresh_comm_summary(cur: sqlite3.Cursor, clip_ids: Optional[List[str]] = None) -> None:
+    """
+    Recompute the comm_analysis summary columns of ``clip_ids`` (default: all)
+    from comm_segments. Silence counts the lead-in before the first segment
+    and the tail after the last one, so a clip with no talk is all silence.
+    """
+    where, params = "", []
+    if clip_ids is not None:
+        where = f"WHERE clip_id IN ({', '.join('?' for _ in clip_ids)})"
+        params = list(clip_ids)
+    cur.execute(
+        f"""
+        UPDATE comm_analysis SET
+            talk_seconds = 0.0,
+            talk_ratio = CASE WHEN audio_duration > 0 THEN 0.0 END,
+            longest_silence = COALESCE(audio_duration, 0.0),
+            peak_dbfs = NULL
+        {where}
+        """,
+        params,
+    )
+    cur.execute(
+        f"""
+        WITH gaps AS (
+            SELECT clip_id, duration, "end", peak_dbfs,
+                start - LAG("end", 1, 0.0) OVER (PARTITION BY clip_id ORDER BY start) AS gap
+            FROM comm_segments
+            {where}
+        ),
+        per_clip AS (
+            SELECT clip_id, SUM(duration) AS talk, MAX(gap) AS max_gap,
+                MAX("end") AS last_end, MAX(peak_dbfs) AS peak
+            FROM gaps
+            GROUP BY clip_id
         )
+        UPDATE comm_analysis SET
+            talk_seconds = per_clip.talk,
+            talk_ratio = CASE WHEN audio_duration > 0 THEN {LEAST_SQL}(1.0, per_clip.talk / audio_duration) END,
+            longest_silence = {GREATEST_SQL}(per_clip.max_gap, COALESCE(audio_duration, 0.0) - per_clip.last_end, 0.0),
+            peak_dbfs = per_clip.peak
+        FROM per_clip
+        WHERE per_clip.clip_id = comm_analysis.clip_id
+        """,
+        params,
+    )
+
+
+def comm_analysis_targets(clip_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Clips with their file location and the source version they were last
+    analyzed at (NULL if never), oldest first. Limited to ``clip_ids`` if given.
+    """
+    sql = """
+        SELECT c.id, c.filename, c.path, a.source_mtime_ns, a.source_size
+        FROM clips c
+        LEFT JOIN comm_analysis a ON a.clip_id = c.id
+    """
+    with db_cursor() as cur:
+        if clip_ids is None:
+            cur.execute(sql + " ORDER BY c.created_at, c.id")
+            return cur.fetchall()
+        ids = list(dict.fromkeys(clip_ids))
+        rows: List[Dict[str, Any]] = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cur.execute(sql + f" WHERE c.id IN ({', '.join('?' for _ in chunk)})", chunk)
+            rows.extend(cur.fetchall())
+        return rows
 
 
 def fetch_clips() -> List[Dict[str, Any]]:
@@ -203,6 +1557,437 @@ def fetch_clips() -> List[Dict[str, Any]]:
         return cur.fetchall()
 
 
+# Filterable columns for query_clips(); has_shot is matched as a boolean and
+# action matches clips whose action_types include any of the values.
+CLIP_FILTER_COLUMNS = (
+    "opponent",
+    "game_id",
+    "canonical_game_id",
+    "quarter",
+    "coverage",
+    "result",
+    "has_shot",
+    "shooter",
+    "action",
+)
+
+_TRUTHY = ("yes", "y", "true", "1")
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    return encode_cursor_values(row.get("created_at"), row.get("id"))
+
+
+def encode_cursor_values(created_at: Any, clip_id: Any) -> str:
+    raw = json.dumps([created_at, clip_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, clip_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+    return [created_at, clip_id]
+
+
+TagClause = Tuple[str, List[Any], bool]
+
+
+def build_tag_match(tags: Iterable[TagClause]) -> Tuple[str, List[Any]]:
+    """
+    SQL selecting the ids of clips matching every tag clause. A clause is
+    ``(field, values, negate)``: the clip has any of ``values`` in ``field``
+    (or, negated, none of them). Clauses are AND'd, via INTERSECT/EXCEPT over
+    clip_tags, so no clips row is read.
+    """
+    positive: List[str] = []
+    negative: List[str] = []
+    params: List[Any] = []
+    neg_params: List[Any] = []
+    for field, values, negate in tags:
+        if field not in TAG_FIELDS:
+            raise ValueError(f"Unsupported tag field: {field}")
+        values = sorted({normalize_tag(v) for v in values if v not in (None, "")})
+        if not values:
+            continue
+        select = f"SELECT clip_id FROM clip_tags WHERE field = ? AND value IN ({', '.join('?' for _ in values)})"
+        (negative if negate else positive).append(select)
+        (neg_params if negate else params).extend([field, *values])
+    if not positive:
+        positive = ["SELECT id FROM clips"]
+    sql = " INTERSECT ".join(positive)
+    if negative:
+        sql += " EXCEPT " + " EXCEPT ".join(negative)
+    return sql, params + neg_params
+
+
+def _clip_where(
+    filters: Optional[Dict[str, Iterable[Any]]] = None,
+    tags: Optional[Iterable[TagClause]] = None,
+) -> Tuple[List[str], List[Any]]:
+    where: List[str] = []
+    params: List[Any] = []
+
+    for name, values in (filters or {}).items():
+        if name not in CLIP_FILTER_COLUMNS:
+            raise ValueError(f"Unsupported filter: {name}")
+        values = [v for v in values if v not in (None, "")]
+        if not values:
+            continue
+        if name == "has_shot" and backfill_done("typed_clip_columns"):
+            wanted = {parse_flag(v) for v in values}
+            if len(wanted) == 1:
+                where.append("has_shot_flag = ?")
+                params.append(wanted.pop())
+            continue
+        if name == "has_shot":
+            wanted = {str(v).strip().lower() in _TRUTHY for v in values}
+            if wanted == {True}:
+                where.append(f"LOWER(has_shot) IN ({', '.join('?' for _ in _TRUTHY)})")
+                params.extend(_TRUTHY)
+            elif wanted == {False}:
+                where.append(f"(has_shot IS NULL OR LOWER(has_shot) NOT IN ({', '.join('?' for _ in _TRUTHY)}))")
+                params.extend(_TRUTHY)
+            continue
+        if name == "action":
+            values = [normalize_tag(v) for v in values]
+            if backfill_done("clip_actions"):
+                where.append(f"id IN (SELECT clip_id FROM clip_actions WHERE action IN ({', '.join('?' for _ in values)}))")
+                params.extend(values)
+            else:
+                match_sql, match_params = build_tag_match([("action_types", values, False)])
+                where.append(f"id IN ({match_sql})")
+                params.extend(match_params)
+            continue
+        where.append(f"{name} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+
+    tags = list(tags or [])
+    if tags:
+        match_sql, match_params = build_tag_match(tags)
+        where.append(f"id IN ({match_sql})")
+        params.extend(match_params)
+    return where, params
+
+
+def build_clip_query(
+    filters: Optional[Dict[str, Iterable[Any]]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    columns: Optional[Iterable[str]] = None,
+    tags: Optional[Iterable[TagClause]] = None,
+) -> Tuple[str, List[Any]]:
+    """
+    SQL for a filtered, keyset-paginated read of clips ordered by
+    created_at DESC, id DESC. ``filters`` maps a CLIP_FILTER_COLUMNS name to
+    the accepted values (OR'd within a column, AND'd across columns);
+    ``tags`` adds build_tag_match() clauses.
+    ``columns`` restricts the SELECT list; id and created_at are always
+    included so the next cursor can be built. With a ``limit`` one extra row
+    is selected to tell whether another page exists.
+    """
+    where, params = _clip_where(filters, tags)
+
+    if cursor:
+        created_at, clip_id = decode_cursor(cursor)
+        # A row-value comparison lets the (..., created_at, id) indexes seek to the cursor
+        where.append("(created_at, id) < (?, ?)")
+        params.extend([created_at, clip_id])
+
+    if columns is None:
+        select = "*"
+    else:
+        wanted_cols = [c for c in CLIP_COLUMNS if c in set(columns) | {"id", "created_at"}]
+        select = ", ".join(wanted_cols)
+
+    sql = f"SELECT {select} FROM clips"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit) + 1)
+    return sql, params
+
+
+class _TagBitmapCache:
+    """
+    clip_tags held as posting bitmaps: one Python int per (field, value) with
+    bit i set for the clip at position i. Facet counts are then an AND plus a
+    popcount per value instead of a join over the postings.
+
+    The bitmaps follow clips_version(), which any process writing clips bumps.
+    On a change only clips whose updated_at moved past the last refresh
+    (minus REFRESH_MARGIN for writes that committed late) are re-read. If
+    clips were deleted, or too many changed, everything is rebuilt.
+    """
+
+    REFRESH_MARGIN = timedelta(seconds=5)
+    MAX_INCREMENTAL = 5000
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._seen_until: Optional[str] = None
+        self._positions: Dict[Any, int] = {}
+        self._all = 0
+        self._postings: Dict[Tuple[str, str], int] = {}
+        self._labels: Dict[Tuple[str, str], str] = {}
+
+    def _add_postings(self, rows: Iterable[Tuple[str, str, Any, str]], bitsets: Dict[Tuple[str, str], bytearray]) -> None:
+        size = len(self._positions) // 8 + 1
+        for field, value, clip_id, label in rows:
+            pos = self._positions.get(clip_id)
+            if pos is None:
+                continue  # clip written after the id snapshot; picked up on the next version
+            key = (field, value)
+            bits = bitsets.get(key)
+            if bits is None:
+                bits = bitsets[key] = bytearray(size)
+                self._labels.setdefault(key, label)
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def _build(self) -> None:
+        with db_cursor(stream=True) as cur:
+            cur.row_factory = None
+            cur.execute("SELECT MAX(updated_at) FROM clips")
+            seen_until = cur.fetchone()[0]
+            cur.execute("SELECT id FROM clips")
+            self._positions = {row[0]: i for i, row in enumerate(cur.fetchall())}
+            self._labels = {}
+            bitsets: Dict[Tuple[str, str], bytearray] = {}
+            cur.execute("SELECT field, value, clip_id, label FROM clip_tags")
+            self._add_postings(_iter_rows(cur), bitsets)
+        self._all = (1 << len(self._positions)) - 1
+        self._postings = {key: int.from_bytes(bits, "little") for key, bits in bitsets.items()}
+        self._seen_until = seen_until
+
+    def _refresh(self) -> bool:
+        """Apply clips changed since the last refresh; False if a full rebuild is needed."""
+        if self._seen_until is None:
+            return False
+        try:
+            since = (datetime.fromisoformat(self._seen_until) - self.REFRESH_MARGIN).isoformat()
+        except ValueError:
+            return False
+        with db_cursor() as cur:
+            cur.row_factory = None
+            cur.execute("SELECT COUNT(*) FROM clips")
+            total = cur.fetchone()[0]
+            cur.execute("SELECT id, updated_at FROM clips WHERE updated_at >= ?", (since,))
+            changed = cur.fetchall()
+            if len(changed) > self.MAX_INCREMENTAL:
+                return False
+            for clip_id, _ in changed:
+                if clip_id not in self._positions:
+                    self._positions[clip_id] = len(self._positions)
+            if len(self._positions) != total:
+                return False  # some clip was deleted
+            ids = [clip_id for clip_id, _ in changed]
+            rows: List[Tuple[str, str, Any, str]] = []
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                cur.execute(
+                    f"SELECT field, value, clip_id, label FROM clip_tags WHERE clip_id IN ({', '.join('?' for _ in batch)})",
+                    batch,
+                )
+                rows.extend(cur.fetchall())
+
+        self._all = (1 << len(self._positions)) - 1
+        stale = self._bitmap_for_ids(ids)
+        for key in self._postings:
+            self._postings[key] &= ~stale
+        fresh: Dict[Tuple[str, str], bytearray] = {}
+        self._add_postings(rows, fresh)
+        for key, bits in fresh.items():
+            self._postings[key] = self._postings.get(key, 0) | int.from_bytes(bits, "little")
+        if changed:
+            self._seen_until = max(self._seen_until, max(updated_at or "" for _, updated_at in changed))
+        return True
+
+    def _ensure_current(self) -> None:
+        version = clips_version()
+        if version == self._version:
+            return
+        if not self._refresh():
+            self._build()
+        self._version = version
+
+    def _bitmap_for_ids(self, ids: Iterable[Any]) -> int:
+        bits = bytearray(len(self._positions) // 8 + 1)
+        for clip_id in ids:
+            pos = self._positions.get(clip_id)
+            if pos is not None:
+                bits[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(bits, "little")
+
+    def facets(
+        self,
+        tags: List[TagClause],
+        fields: List[str],
+        filter_sql: Optional[Tuple[str, List[Any]]] = None,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_current()
+            matched = self._all
+            for field, values, negate in tags:
+                union = 0
+                for value in {normalize_tag(v) for v in values if v not in (None, "")}:
+                    union |= self._postings.get((field, value), 0)
+                matched = matched & ~union if negate else matched & union
+            if filter_sql is not None:
+                with db_cursor() as cur:
+                    cur.row_factory = None
+                    cur.execute(*filter_sql)
+                    matched &= self._bitmap_for_ids(row[0] for row in cur.fetchall())
+
+            wanted = set(fields)
+            facets: Dict[str, List[Dict[str, Any]]] = {field: [] for field in fields}
+            for key, bitmap in self._postings.items():
+                if key[0] not in wanted:
+                    continue
+                count = (bitmap & matched).bit_count()
+                if count:
+                    facets[key[0]].append({"value": self._labels[key], "count": count})
+            total = matched.bit_count()
+        for values in facets.values():
+            values.sort(key=lambda v: (-v["count"], v["value"].lower()))
+        return {"total": total, "facets": facets}
+
+
+def _iter_rows(cur: sqlite3.Cursor, batch_size: int = 5000):
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+_tag_bitmaps = _TagBitmapCache()
+
+
+def tag_facets(
+    filters: Optional[Dict[str, Iterable[Any]]] = None,
+    tags: Optional[Iterable[TagClause]] = None,
+    fields: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """
+    ``{"total": n, "facets": {field: [{"value", "count"}, ...]}}`` for the clips
+    matching ``filters``/``tags`` (same semantics as build_clip_query), most
+    common value first.
+    """
+    fields = list(fields) if fields else list(TAG_FIELDS)
+    tags = list(tags or [])
+    for field in [*fields, *(clause[0] for clause in tags)]:
+        if field not in TAG_FIELDS:
+            raise ValueError(f"Unsupported tag field: {field}")
+    where, params = _clip_where(filters)
+    filter_sql = (f"SELECT id FROM clips WHERE {' AND '.join(where)}", params) if where else None
+    return _tag_bitmaps.facets(tags, fields, filter_sql)
+
+
+def query_clips(
+    filters: Optional[Dict[str, Iterable[Any]]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    columns: Optional[Iterable[str]] = None,
+    tags: Optional[Iterable[TagClause]] = None,
+) -> Dict[str, Any]:
+    """
+    Run build_clip_query() and return ``{"items": [...], "next_cursor": str | None}``
+    with rows as dicts.
+    """
+    sql, params = build_clip_query(filters, limit, cursor, columns, tags)
+    with db_cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+class RowStream:
+    """
+    Rows of one query as plain tuples, fetched lazily in batches so callers
+    can stream a response without materializing the result. ``columns`` is
+    known before iteration. The thread's connection stays in use until the
+    stream is exhausted or close() is called.
+    """
+
+    def __init__(self, sql: str, params: Iterable[Any] = (), batch_size: int = 500):
+        self._stack = ExitStack()
+        try:
+            cur = self._stack.enter_context(db_cursor(stream=True))
+            cur.row_factory = None
+            cur.execute(sql, list(params))
+        except BaseException:
+            self._stack.close()
+            raise
+        self._cur = cur
+        self.batch_size = batch_size
+        self.columns = [col[0] for col in cur.description]
+
+    def __iter__(self):
+        try:
+            while True:
+                rows = self._cur.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._stack.close()
+
+
+def stream_clips(
+    filters: Optional[Dict[str, Iterable[Any]]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    columns: Optional[Iterable[str]] = None,
+    tags: Optional[Iterable[TagClause]] = None,
+) -> RowStream:
+    """Tuple-row stream over build_clip_query(); yields up to limit + 1 rows."""
+    sql, params = build_clip_query(filters, limit, cursor, columns, tags)
+    return RowStream(sql, params)
+
+
+# Same made/missed rule as the dashboard shot chart: shot_result, else the play result
+SHOT_MADE_SQL = "CAST(LOWER(COALESCE(NULLIF(TRIM(shot_result), ''), result, '')) LIKE '%made%' AS INTEGER)"
+
+
+def shot_rows(filters: Optional[Dict[str, Iterable[Any]]] = None) -> List[Tuple[float, float, int, float]]:
+    """
+    ``(x, y, made, points)`` per located shot among clips matching ``filters``
+    (CLIP_FILTER_COLUMNS). Reads the indexed typed columns once their
+    backfill has finished, else casts the text ones.
+    """
+    where, params = _clip_where(filters)
+    typed = backfill_done("typed_clip_columns")
+    if typed:
+        x, y = "shot_x_pos", "shot_y_pos"
+        where[:0] = ["has_shot_flag = 1", "shot_x_pos IS NOT NULL", "shot_y_pos IS NOT NULL"]
+    else:
+        x, y = "shot_x", "shot_y"
+        where.insert(0, f"LOWER(has_shot) IN ({', '.join('?' for _ in _TRUTHY)})")
+        params[:0] = list(_TRUTHY)
+    sql = f"SELECT {x}, {y}, {SHOT_MADE_SQL}, {POINTS_SQL} FROM clips WHERE {' AND '.join(where)}"
+    with db_cursor() as cur:
+        cur.row_factory = None
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    if typed:
+        return rows
+    parsed = ((parse_coordinate(sx), parse_coordinate(sy), made, points) for sx, sy, made, points in rows)
+    return [row for row in parsed if row[0] is not None and row[1] is not None]
+
+
 def fetch_clip(clip_id: str) -> Optional[Dict[str, Any]]:
     with db_cursor() as cur:
         cur.execute("SELECT * FROM clips WHERE id = ?", (clip_id,))
@@ -223,14 +2008,289 @@ def fetch_comm_segments(clip_id: str) -> List[Dict[str, Any]]:
         return cur.fetchall()
 
 
+COMM_CLIP_COLUMNS = (
+    "id",
+    "filename",
+    "path",
+    "game_id",
+    "canonical_game_id",
+    "opponent",
+    "quarter",
+    "possession",
+    "coverage",
+    "breakdown",
+    "result",
+    "created_at",
+)
+
+COMM_SUMMARY_SELECT = """
+    a.audio_duration, a.segment_count, a.talk_seconds, a.talk_ratio,
+    a.longest_silence, a.peak_dbfs, a.analyzed_at
+"""
+
+# Thresholds for query_comm_clips(); each is served by a comm_analysis index
+COMM_THRESHOLDS = {
+    "silence_over": "a.longest_silence > ?",
+    "talk_under": "a.talk_seconds < ?",
+    "talk_ratio_under": "a.talk_ratio < ?",
+    "peak_under": "COALESCE(a.peak_dbfs, -1e9) < ?",
+}
+
+
+def query_comm_clips(
+    thresholds: Optional[Dict[str, float]] = None,
+    filters: Optional[Dict[str, Iterable[Any]]] = None,
+    tags: Optional[Iterable[TagClause]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Analyzed clips whose comm summary passes every ``thresholds`` entry
+    (COMM_THRESHOLDS names, AND'd), narrowed by the usual clip ``filters``
+    and ``tags``. Same ordering, paging and return shape as query_clips().
+    """
+    where, params = _clip_where(filters, tags)
+    for name, value in (thresholds or {}).items():
+        if name not in COMM_THRESHOLDS:
+            raise ValueError(f"Unsupported threshold: {name}")
+        if value is not None:
+            where.append(COMM_THRESHOLDS[name])
+            params.append(float(value))
+    if cursor:
+        created_at, clip_id = decode_cursor(cursor)
+        where.append("(created_at, id) < (?, ?)")
+        params.extend([created_at, clip_id])
+
+    sql = f"""
+        SELECT {", ".join(COMM_CLIP_COLUMNS)}, {COMM_SUMMARY_SELECT}
+        FROM clips
+        JOIN comm_analysis a ON a.clip_id = clips.id
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit) + 1)
+
+    with db_cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def fetch_comm_silences(clip_ids: Iterable[str], min_gap: float = 0.0) -> Dict[str, List[Dict[str, float]]]:
+    """
+    Stretches without communication of at least ``min_gap`` seconds per clip,
+    including the lead-in and tail, read off the (clip_id, start) index.
+    """
+    ids = list(dict.fromkeys(clip_ids))
+    silences: Dict[str, List[Dict[str, float]]] = {clip_id: [] for clip_id in ids}
+    with db_cursor() as cur:
+        for i in range(0, len(ids), 400):
+            chunk = ids[i:i + 400]
+            marks = ", ".join("?" for _ in chunk)
+            cur.execute(
+                f"""
+                SELECT clip_id, gap_start AS start, gap_end AS "end", gap_end - gap_start AS duration
+                FROM (
+                    SELECT clip_id, LAG("end", 1, 0.0) OVER (PARTITION BY clip_id ORDER BY start) AS gap_start,
+                        start AS gap_end
+                    FROM comm_segments
+                    WHERE clip_id IN ({marks})
+                    UNION ALL
+                    SELECT a.clip_id, COALESCE(MAX(s."end"), 0.0), a.audio_duration
+                    FROM comm_analysis a
+                    LEFT JOIN comm_segments s ON s.clip_id = a.clip_id
+                    WHERE a.clip_id IN ({marks})
+                    GROUP BY a.clip_id
+                ) AS gaps
+                WHERE gap_end - gap_start >= ? AND gap_end > gap_start
+                ORDER BY clip_id, start
+                """,
+                [*chunk, *chunk, float(min_gap)],
+            )
+            for row in cur.fetchall():
+                silences[row.pop("clip_id")].append(row)
+    return silences
+
+
+COMM_ROLLUP_SQL = """
+    SELECT {expr} AS value,
+        COUNT(*) AS clips,
+        SUM(a.audio_duration) AS audio_seconds,
+        SUM(a.talk_seconds) AS talk_seconds,
+        AVG(a.longest_silence) AS avg_longest_silence,
+        MAX(a.longest_silence) AS max_longest_silence,
+        MAX(a.peak_dbfs) AS peak_dbfs,
+        SUM(CASE WHEN a.longest_silence > ? THEN 1 ELSE 0 END) AS silent_clips,
+        SUM({breakdown}) AS breakdowns,
+        SUM(CASE WHEN a.longest_silence > ? THEN {breakdown} ELSE 0 END) AS silent_breakdowns
+    FROM clips
+    JOIN comm_analysis a ON a.clip_id = clips.id
+    WHERE TRIM(COALESCE({expr}, '')) <> '' {and_where}
+    GROUP BY {expr}
+    ORDER BY clips DESC, value
+"""
+
+
+def comm_rollup(
+    dimension: str,
+    silence_over: float = 5.0,
+    filters: Optional[Dict[str, Iterable[Any]]] = None,
+    tags: Optional[Iterable[TagClause]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Talk coverage per STAT_DIMENSIONS value over analyzed clips, with the
+    breakdown rate of clips that had a silence longer than ``silence_over``
+    against the rest.
+    """
+    if dimension not in STAT_DIMENSIONS:
+        raise ValueError(f"Unknown stats dimension: {dimension}")
+    where, params = _clip_where(filters, tags)
+    sql = COMM_ROLLUP_SQL.format(
+        expr=STAT_DIMENSIONS[dimension],
+        breakdown=BREAKDOWN_SQL,
+        and_where="".join(f" AND {clause}" for clause in where),
+    )
+    with db_cursor() as cur:
+        cur.execute(sql, [float(silence_over), float(silence_over), *params])
+        rows = cur.fetchall()
+    for row in rows:
+        audio, talk = row["audio_seconds"] or 0, row["talk_seconds"] or 0
+        silent, clips = row["silent_clips"] or 0, row["clips"]
+        breakdowns, silent_breakdowns = row["breakdowns"] or 0, row["silent_breakdowns"] or 0
+        row["talk_coverage"] = talk / audio if audio else 0
+        row["breakdown_rate"] = breakdowns / clips if clips else 0
+        row["silent_breakdown_rate"] = silent_breakdowns / silent if silent else 0
+        talking = clips - silent
+        row["talking_breakdown_rate"] = (breakdowns - silent_breakdowns) / talking if talking else 0
+    return rows
+
+
 def remove_clip(clip_id: str) -> None:
     with db_cursor() as cur:
+        start = _begin_clip_write(cur, [clip_id])
+        touched = _game_keys_for(cur, [clip_id])
+        _apply_clip_stats(cur, _clip_stat_deltas(cur, [clip_id], -1))
         cur.execute("DELETE FROM clips WHERE id = ?", (clip_id,))
+        _index_clip_tags(cur, [clip_id])
+        versions = _clip_write_versions(cur, start)
+    _game_stats_cache.invalidate(touched, versions)
 
 
-def import_clips(records: Iterable[Dict[str, Any]]) -> None:
-    for record in records:
-        upsert_clip(record)
+def update_clip_shot(
+    clip_id: str,
+    has_shot: Any,
+    shot_x: Any,
+    shot_y: Any,
+    shot_result: Any,
+    shooter_designation: Any,
+) -> None:
+    with db_cursor() as cur:
+        start = _begin_clip_write(cur, [clip_id])
+        deltas = _clip_stat_deltas(cur, [clip_id], -1)
+        cur.execute(
+            """
+            UPDATE clips
+            SET has_shot = ?, shot_x = ?, shot_y = ?, shot_result = ?, shooter = ?, updated_at = ?,
+                has_shot_flag = ?, shot_x_pos = ?, shot_y_pos = ?
+            WHERE id = ?
+            """,
+            (
+                has_shot, shot_x, shot_y, shot_result, shooter_designation, datetime.utcnow().isoformat(),
+                parse_flag(has_shot), parse_coordinate(shot_x), parse_coordinate(shot_y),
+                clip_id,
+            ),
+        )
+        _apply_clip_stats(cur, _clip_stat_deltas(cur, [clip_id], 1, deltas))
+        versions = _clip_write_versions(cur, start)
+    # Shot fields don't feed the game aggregates
+    _game_stats_cache.note_write(versions)
+
+
+def clear_clip_shot(clip_id: str) -> None:
+    with db_cursor() as cur:
+        start = _begin_clip_write(cur, [clip_id])
+        deltas = _clip_stat_deltas(cur, [clip_id], -1)
+        cur.execute(
+            """
+            UPDATE clips
+            SET has_shot = 'No', shot_x = NULL, shot_y = NULL, shot_result = NULL, updated_at = ?,
+                has_shot_flag = 0, shot_x_pos = NULL, shot_y_pos = NULL
+            WHERE id = ?
+            """,
+            (datetime.utcnow().isoformat(), clip_id),
+        )
+        _apply_clip_stats(cur, _clip_stat_deltas(cur, [clip_id], 1, deltas))
+        versions = _clip_write_versions(cur, start)
+    _game_stats_cache.note_write(versions)
+
+
+def import_clips(
+    records: Iterable[Dict[str, Any]],
+    chunk_size: int = DEFAULT_IMPORT_CHUNK_SIZE,
+) -> Dict[str, int]:
+    return bulk_upsert_clips(records, chunk_size=chunk_size)
+
+
+def import_metadata_file(path: Path, chunk_size: int = DEFAULT_IMPORT_CHUNK_SIZE) -> Dict[str, int]:
+    """Backfill the clips table from clips_metadata.json or the clips_metadata.jsonl journal."""
+    if Path(path).suffix == ".jsonl":
+        from metadata_journal import MetadataJournal
+
+        entries = MetadataJournal(path).all()
+    else:
+        with open(path, "r") as f:
+            data = json.load(f)
+        entries = data.get("clips", []) if isinstance(data, dict) else data
+    return import_clips(
+        (normalize_metadata_clip(entry) for entry in entries if entry.get("filename")),
+        chunk_size=chunk_size,
+    )
+
+
+def import_sqlite_file(path: Path, chunk_size: int = DEFAULT_IMPORT_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Copy the clips of an analytics.sqlite file into the configured database,
+    e.g. when moving to Postgres. Derived tables are rebuilt on the way in;
+    comm segments are not copied (re-run audio_analysis.py).
+    """
+    source = sqlite3.connect(f"file:{Path(path).resolve()}?mode=ro", uri=True)
+    source.row_factory = _dict_factory
+    try:
+        return import_clips(source.execute("SELECT * FROM clips ORDER BY created_at, id"), chunk_size=chunk_size)
+    finally:
+        source.close()
+
+
+# Worker processes (audio_analysis spawns them) import this module too; the
+# parent that started them owns the schema, so only it migrates
+if multiprocessing.parent_process() is None:
+    init_db()
+
 
+if __name__ == "__main__":
+    import sys
 
-init_db()
+    if len(sys.argv) > 2 and sys.argv[1] == "import":
+        print(import_metadata_file(Path(sys.argv[2])))
+    elif len(sys.argv) > 2 and sys.argv[1] == "import-sqlite":
+        print(import_sqlite_file(Path(sys.argv[2])))
+    elif len(sys.argv) > 1 and sys.argv[1] == "rebuild-stats":
+        print(rebuild_clip_stats())
+    elif len(sys.argv) > 1 and sys.argv[1] == "rebuild-tags":
+        print(rebuild_clip_tags())
+    elif len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        print({"schema_version": schema_version(), "batches": run_backfills(), "backfills": backfill_status()})
+    else:
+        print("Usage:")
+        print("  python analytics_db.py import <clips_metadata.json|clips_metadata.jsonl>")
+        print("  python analytics_db.py import-sqlite <analytics.sqlite>")
+        print("  python analytics_db.py rebuild-stats")
+        print("  python analytics_db.py rebuild-tags")
+        print("  python analytics_db.py migrate")
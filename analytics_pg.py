@@ -0,0 +1,235 @@
+"""
+Postgres backend for analytics_db, used when ANALYTICS_DB_URL is a
+postgresql:// URL.
+
+analytics_db writes its SQL once, sqlite3-style: qmark placeholders, dict
+rows, ``cur.row_factory = None`` for plain tuples. The wrappers here give
+psycopg connections that same surface, so the fetch/upsert/remove functions
+run unchanged on either backend.
+
+PostgresPool has the interface of analytics_db.ConnectionPool, but a thread
+only holds a connection for its outermost db_cursor(): the connection is
+checked out of a pooled SQLAlchemy engine when the transaction starts and
+handed back at commit. Concurrent taggers then wait on row locks for the
+clips they touch instead of on SQLite's single write lock. Streaming reads
+get named (server-side) cursors and bulk loads go through COPY.
+"""
+
+import functools
+import itertools
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from psycopg import pq
+from psycopg.rows import dict_row, tuple_row
+from sqlalchemy import create_engine
+
+POOL_SIZE = int(os.environ.get("ANALYTICS_DB_POOL_SIZE", "8"))
+MAX_OVERFLOW = int(os.environ.get("ANALYTICS_DB_MAX_OVERFLOW", "8"))
+POOL_TIMEOUT = 10.0
+POOL_RECYCLE = 1800
+STREAM_ITERSIZE = 2000
+
+# String literals, quoted identifiers and $$ bodies are copied through; only
+# bare ? and % outside them are rewritten
+_SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|\$\$.*?\$\$|[?%]", re.S)
+_stream_names = itertools.count(1)
+
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql: str) -> str:
+    """qmark SQL -> psycopg format SQL (``?`` -> ``%s``, literal ``%`` -> ``%%``)."""
+
+    def replace(match: "re.Match[str]") -> str:
+        token = match.group(0)
+        if token == "?":
+            return "%s"
+        return token.replace("%", "%%")
+
+    return _SQL_TOKEN_RE.sub(replace, sql)
+
+
+def engine_url(url: str) -> str:
+    """Point a plain postgres(ql):// URL at the psycopg 3 driver."""
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("postgres", "postgresql"):
+        return f"postgresql+psycopg{sep}{rest}"
+    return url
+
+
+class PgCursor:
+    """sqlite3.Cursor look-alike over a psycopg cursor (dict rows by default)."""
+
+    def __init__(self, cursor: Any, connection: "PgConnection"):
+        self._cur = cursor
+        self.connection = connection
+
+    @property
+    def row_factory(self) -> Any:
+        return None if self._cur.row_factory is tuple_row else self._cur.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory: Any) -> None:
+        self._cur.row_factory = tuple_row if factory is None else dict_row
+
+    @property
+    def description(self) -> Any:
+        return self._cur.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cur.rowcount
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> "PgCursor":
+        self._cur.execute(translate(sql), list(params or ()))
+        return self
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence[Any]]) -> "PgCursor":
+        rows = [list(params) for params in seq_of_params]
+        if rows:
+            self._cur.executemany(translate(sql), rows)
+        return self
+
+    def copy_rows(self, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        """COPY ``rows`` into ``table`` (no conflict handling); returns the row count."""
+        count = 0
+        with self._cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+                count += 1
+        return count
+
+    def fetchone(self) -> Any:
+        return self._cur.fetchone()
+
+    def fetchmany(self, size: int = 1) -> list:
+        return self._cur.fetchmany(size)
+
+    def fetchall(self) -> list:
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def close(self) -> None:
+        self._cur.close()
+
+
+class PgConnection:
+    """One checked-out pool connection, with the sqlite3.Connection calls analytics_db uses."""
+
+    def __init__(self, pooled: Any):
+        self._pooled = pooled  # SQLAlchemy pool proxy; close() returns it to the pool
+        self._conn = pooled.driver_connection
+
+    def cursor(self, stream: bool = False) -> PgCursor:
+        """A client-side cursor, or with ``stream`` a named cursor that fetches in batches."""
+        if stream:
+            cur = self._conn.cursor(name=f"analytics_stream_{next(_stream_names)}", row_factory=dict_row)
+            cur.itersize = STREAM_ITERSIZE
+        else:
+            cur = self._conn.cursor(row_factory=dict_row)
+        return PgCursor(cur, self)
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> PgCursor:
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence[Any]]) -> PgCursor:
+        return self.cursor().executemany(sql, seq_of_params)
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._conn.info.transaction_status != pq.TransactionStatus.IDLE
+
+    def commit(self) -> None:
+        self._pooled.commit()
+
+    def rollback(self) -> None:
+        self._pooled.rollback()
+
+    def close(self) -> None:
+        self._pooled.close()
+
+
+class PostgresPool:
+    """
+    analytics_db.ConnectionPool's interface over a SQLAlchemy QueuePool.
+    Nested transaction() calls on a thread join the outermost one, which
+    alone commits or rolls back and then returns the connection to the pool.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = POOL_SIZE,
+        max_overflow: int = MAX_OVERFLOW,
+        pool_timeout: float = POOL_TIMEOUT,
+    ):
+        self._engine = create_engine(
+            engine_url(url),
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=True,  # drop connections the server closed while they sat idle
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._stats = {"checkouts": 0, "joined": 0}
+
+    def _check_fork(self) -> None:
+        if os.getpid() == self._pid:
+            return
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Keep the parent's sockets open for the parent; the child starts a fresh pool
+                self._engine.dispose(close=False)
+                self._pid = os.getpid()
+                self._local = threading.local()
+                self._stats = {"checkouts": 0, "joined": 0}
+
+    @contextmanager
+    def transaction(self):
+        self._check_fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            with self._lock:
+                self._stats["joined"] += 1
+            yield conn
+            return
+
+        conn = PgConnection(self._engine.raw_connection())
+        self._local.conn = conn
+        with self._lock:
+            self._stats["checkouts"] += 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._local.conn = None
+            conn.close()
+
+    def close_all(self) -> None:
+        self._engine.dispose()
+        self._local = threading.local()
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self._engine.pool
+        with self._lock:
+            return {
+                **self._stats,
+                "backend": "postgres",
+                "pid": self._pid,
+                "url": self._engine.url.render_as_string(hide_password=True),
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            }
@@ -0,0 +1,339 @@
+"""
+Audio analysis stage that fills comm_segments (defensive communication).
+
+Each clip's audio is decoded by ffmpeg straight to mono float32 PCM on a
+pipe and read in fixed-size blocks into one reused buffer, so memory per
+clip is constant no matter how long the clip is. Per block, framewise RMS
+and peak levels are computed with NumPy and a hysteresis gate marks frames
+as talk: a segment opens when a frame reaches ON_DBFS and only closes once
+the level drops below OFF_DBFS, so speech hovering around a single
+threshold is not chopped into pieces. Gate state and the open segment carry
+over block boundaries. Segments closer than MERGE_GAP_SECONDS are joined
+and ones shorter than MIN_SEGMENT_SECONDS dropped.
+
+analyze_library() fans clips out to a process pool (decoding and the
+NumPy work run on every core) while the parent process alone writes
+results through upsert_comm_segments, so SQLite sees a single writer.
+Each analyzed clip is recorded in comm_analysis with the file's mtime and
+size, and unchanged clips are skipped on later runs. clip_extractor calls
+schedule() after every successful cut.
+"""
+
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import analytics_db as db_module
+
+CLIPS_DIR = Path(__file__).resolve().parent / "Clips"
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.02
+FRAME_SAMPLES = int(SAMPLE_RATE * FRAME_SECONDS)
+# Frames decoded per read: ~10 s of audio, a 640 KB buffer
+BLOCK_FRAMES = 500
+
+# Hysteresis gate on the frame RMS level
+ON_DBFS = -30.0
+OFF_DBFS = -40.0
+MIN_SEGMENT_SECONDS = 0.2
+MERGE_GAP_SECONDS = 0.3
+
+DEFAULT_WORKERS = os.cpu_count() or 2
+# schedule() sees one clip per cut, so its standing pool stays small
+SCHEDULE_WORKERS = min(2, DEFAULT_WORKERS)
+
+_SILENCE = 1e-10
+
+
+def build_ffmpeg_pcm_cmd(video_path: str, sample_rate: int = SAMPLE_RATE) -> List[str]:
+    return [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-i", video_path,
+        "-vn", "-map", "0:a:0",
+        "-ac", "1", "-ar", str(sample_rate),
+        "-f", "f32le", "-",
+    ]
+
+
+def iter_pcm_blocks(stream: BinaryIO, block_samples: int) -> Iterator[np.ndarray]:
+    """
+    Yield float32 views of ``block_samples`` samples (the last may be
+    shorter). Every view shares one buffer, so consume it before the next.
+    """
+    buf = bytearray(block_samples * 4)
+    view = memoryview(buf)
+    while True:
+        filled = 0
+        while filled < len(buf):
+            n = stream.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        usable = filled - filled % 4
+        if usable:
+            yield np.frombuffer(buf, dtype=np.float32, count=usable // 4)
+        if filled < len(buf):
+            return
+
+
+def frame_levels(samples: np.ndarray, frame_samples: int = FRAME_SAMPLES) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean square and absolute peak per frame; a trailing partial frame is zero-padded."""
+    remainder = len(samples) % frame_samples
+    if remainder:
+        samples = np.concatenate([samples, np.zeros(frame_samples - remainder, dtype=np.float32)])
+    frames = samples.reshape(-1, frame_samples)
+    mean_square = np.einsum("ij,ij->i", frames, frames, dtype=np.float64) / frame_samples
+    peak = np.abs(frames).max(axis=1)
+    return mean_square, peak
+
+
+def to_dbfs(power: Any) -> Any:
+    """10*log10 of a mean square (power) value, floored at silence."""
+    return 10.0 * np.log10(np.maximum(power, _SILENCE))
+
+
+def hysteresis_gate(level_db: np.ndarray, on_db: float, off_db: float, active: bool) -> np.ndarray:
+    """
+    Vectorized two-threshold gate. Each frame takes the state set by the
+    latest frame that crossed a threshold (on -> open, below off -> closed);
+    frames before the first crossing keep ``active``.
+    """
+    events = np.zeros(len(level_db), dtype=np.int8)
+    events[level_db >= on_db] = 1
+    events[level_db < off_db] = -1
+    last = np.where(events != 0, np.arange(len(level_db)), -1)
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, events[np.maximum(last, 0)] > 0, active)
+
+
+class SegmentDetector:
+    """Feeds blocks of frame levels through the gate and collects talk runs."""
+
+    def __init__(
+        self,
+        on_dbfs: float = ON_DBFS,
+        off_dbfs: float = OFF_DBFS,
+        frame_seconds: float = FRAME_SECONDS,
+        min_segment_seconds: float = MIN_SEGMENT_SECONDS,
+        merge_gap_seconds: float = MERGE_GAP_SECONDS,
+    ):
+        if off_dbfs > on_dbfs:
+            raise ValueError("off_dbfs must not be above on_dbfs")
+        self.on_dbfs = on_dbfs
+        self.off_dbfs = off_dbfs
+        self.frame_seconds = frame_seconds
+        self.min_frames = max(1, int(round(min_segment_seconds / frame_seconds)))
+        self.merge_gap_frames = int(round(merge_gap_seconds / frame_seconds))
+        self.frames_seen = 0
+        self._active = False
+        # Runs as [start_frame, end_frame, sum_mean_square, peak]
+        self._runs: List[List[float]] = []
+
+    def _add_run(self, start: int, end: int, energy: float, peak: float) -> None:
+        if self._runs:
+            last = self._runs[-1]
+            if start - last[1] <= self.merge_gap_frames:
+                last[1] = end
+                last[2] += energy
+                last[3] = max(last[3], peak)
+                return
+        self._runs.append([start, end, energy, peak])
+
+    def feed(self, mean_square: np.ndarray, peak: np.ndarray) -> None:
+        n = len(mean_square)
+        if not n:
+            return
+        gate = hysteresis_gate(to_dbfs(mean_square), self.on_dbfs, self.off_dbfs, self._active)
+        # Runs are closed at the block edge; one still open continues in the
+        # next block at offset 0 and _add_run joins the halves
+        edges = np.diff(np.concatenate(([False], gate, [False])).astype(np.int8))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        if len(starts):
+            # reduceat over [s0, e0, s1, e1, ...]; a sentinel lets ends reach n
+            bounds = np.column_stack([starts, ends]).ravel()
+            energy = np.add.reduceat(np.append(mean_square, 0.0), bounds)[::2]
+            peaks = np.maximum.reduceat(np.append(peak, 0.0), bounds)[::2]
+            offset = self.frames_seen
+            for s, e, en, pk in zip(starts.tolist(), ends.tolist(), energy.tolist(), peaks.tolist()):
+                self._add_run(offset + s, offset + e, en, pk)
+        self._active = bool(gate[-1])
+        self.frames_seen += n
+
+    def segments(self) -> List[Dict[str, Any]]:
+        out = []
+        for start, end, energy, peak in self._runs:
+            frames = end - start
+            if frames < self.min_frames:
+                continue
+            rms = float(np.sqrt(energy / frames))
+            out.append({
+                "start": round(start * self.frame_seconds, 3),
+                "end": round(end * self.frame_seconds, 3),
+                "duration": round(frames * self.frame_seconds, 3),
+                "peak_dbfs": round(float(20.0 * np.log10(max(peak, np.sqrt(_SILENCE)))), 2),
+                "rms": rms,
+                "rms_dbfs": round(float(to_dbfs(rms * rms)), 2),
+            })
+        return out
+
+
+def analyze_stream(stream: BinaryIO, sample_rate: int = SAMPLE_RATE, **detector_args) -> Dict[str, Any]:
+    """Detect segments in a raw mono float32 PCM stream."""
+    frame_samples = int(sample_rate * FRAME_SECONDS)
+    detector = SegmentDetector(frame_seconds=frame_samples / sample_rate, **detector_args)
+    samples = 0
+    for block in iter_pcm_blocks(stream, frame_samples * BLOCK_FRAMES):
+        samples += len(block)
+        detector.feed(*frame_levels(block, frame_samples))
+    return {"segments": detector.segments(), "audio_duration": samples / sample_rate}
+
+
+def analyze_clip(video_path: str, **detector_args) -> Dict[str, Any]:
+    """Decode ``video_path`` through an ffmpeg pipe and detect its segments."""
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(build_ffmpeg_pcm_cmd(video_path), stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            result = analyze_stream(proc.stdout, **detector_args)
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", "replace").strip()
+            # A clip cut from a silent source has no audio stream at all
+            if "matches no streams" in message or "does not contain any stream" in message:
+                return {"segments": [], "audio_duration": 0.0}
+            raise RuntimeError(f"FFmpeg error: {message}")
+    return result
+
+
+def _analyze_worker(clip_id: str, video_path: str, detector_args: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    st = os.stat(video_path)
+    result = analyze_clip(video_path, **detector_args)
+    result["source_mtime_ns"] = st.st_mtime_ns
+    result["source_size"] = st.st_size
+    return clip_id, result
+
+
+def resolve_clip_path(row: Dict[str, Any]) -> Optional[str]:
+    for candidate in (row.get("path"), CLIPS_DIR / row["filename"] if row.get("filename") else None):
+        if candidate and os.path.isfile(candidate):
+            return str(candidate)
+    return None
+
+
+def store_result(clip_id: str, result: Dict[str, Any]) -> int:
+    db_module.upsert_comm_segments(clip_id, result["segments"], analysis=result)
+    return len(result["segments"])
+
+
+def _needs_analysis(row: Dict[str, Any], path: str) -> bool:
+    st = os.stat(path)
+    return (row.get("source_mtime_ns"), row.get("source_size")) != (st.st_mtime_ns, st.st_size)
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: the servers that own these pools are multi-threaded, forking them is unsafe.
+    # Spawned workers re-import the parent's __main__, so servers keep their
+    # start-up work (migrations, backfills) behind a main guard or create_app().
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+
+
+def analyze_library(
+    clip_ids: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+    **detector_args,
+) -> Dict[str, Any]:
+    """
+    Analyze every clip (or ``clip_ids``) whose file changed since its last
+    analysis, ``workers`` processes at a time. Returns run counts.
+    """
+    workers = max(1, int(workers or DEFAULT_WORKERS))
+    counts = {"analyzed": 0, "segments": 0, "skipped": 0, "missing": 0, "failed": 0, "errors": []}
+    todo = []
+    for row in db_module.comm_analysis_targets(clip_ids):
+        path = resolve_clip_path(row)
+        if path is None:
+            counts["missing"] += 1
+        elif force or _needs_analysis(row, path):
+            todo.append((row["id"], path))
+        else:
+            counts["skipped"] += 1
+    if not todo:
+        return counts
+
+    print(f"🎙️  Analyzing audio for {len(todo)} clip(s) on {workers} worker(s)")
+    pending = iter(todo)
+    with _new_pool(workers) as pool:
+        # Keep a bounded number of clips in flight so results stream into the DB
+        running = {}
+        for clip_id, path in pending:
+            running[pool.submit(_analyze_worker, clip_id, path, detector_args)] = clip_id
+            if len(running) >= workers * 2:
+                break
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                clip_id = running.pop(future)
+                try:
+                    counts["segments"] += store_result(*future.result())
+                    counts["analyzed"] += 1
+                except Exception as exc:
+                    counts["failed"] += 1
+                    counts["errors"].append({"clip_id": clip_id, "error": str(exc)})
+                    print(f"⚠️  Audio analysis failed for {clip_id}: {exc}")
+                next_item = next(pending, None)
+                if next_item is not None:
+                    running[pool.submit(_analyze_worker, *next_item, detector_args)] = next_item[0]
+    print(f"✅ Audio analysis: {counts['analyzed']} clip(s), {counts['segments']} segment(s)")
+    return counts
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def schedule(clip_id: str, video_path: str) -> None:
+    """Analyze one freshly cut clip in the background and store its segments."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _new_pool(SCHEDULE_WORKERS)
+        try:
+            future = _pool.submit(_analyze_worker, clip_id, str(video_path), {})
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool
+            _pool = _new_pool(SCHEDULE_WORKERS)
+            future = _pool.submit(_analyze_worker, clip_id, str(video_path), {})
+
+    def _store(done) -> None:
+        try:
+            store_result(*done.result())
+        except Exception as exc:
+            print(f"⚠️  Audio analysis failed for {clip_id}: {exc}")
+
+    future.add_done_callback(_store)
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    force = "--force" in args
+    args = [a for a in args if a != "--force"]
+    if args and args[0] == "analyze":
+        print(analyze_library(args[1:] or None, force=force))
+    else:
+        print("Usage:")
+        print("  python audio_analysis.py analyze [--force] [clip_id ...]")
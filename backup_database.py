@@ -6,7 +6,7 @@ Keeps last 30 days of backups
 """
 
 import os
-import shutil
+import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -14,8 +14,22 @@ DB_PATH = Path("data/analytics.sqlite")
 BACKUP_DIR = Path("data/backups")
 RETENTION_DAYS = 30
 
+def _sqlite_copy(src, dest):
+    """Consistent online copy of one SQLite database into another"""
+    source = sqlite3.connect(src)
+    target = sqlite3.connect(dest)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
 def backup_database():
     """Create timestamped backup of database"""
+    if os.environ.get("ANALYTICS_DB_URL", "").startswith(("postgresql:", "postgresql+", "postgres:")):
+        print("⚠️  ANALYTICS_DB_URL points at Postgres; back it up with pg_dump instead")
+        return False
+
     if not DB_PATH.exists():
         print(f"⚠️  Database not found: {DB_PATH}")
         return False
@@ -28,9 +42,10 @@ def backup_database():
     backup_name = f"analytics.backup.{timestamp}.sqlite"
     backup_path = BACKUP_DIR / backup_name
 
-    # Copy database
+    # Copy database through SQLite's backup API so pages still sitting in the
+    # WAL file are included (a plain file copy would miss them)
     try:
-        shutil.copy2(DB_PATH, backup_path)
+        _sqlite_copy(DB_PATH, backup_path)
         size_kb = backup_path.stat().st_size / 1024
         print(f"✅ Backup created: {backup_name} ({size_kb:.1f} KB)")
         return True
@@ -98,12 +113,12 @@ def restore_backup(backup_name):
     # Create backup of current database first
     if DB_PATH.exists():
         emergency_backup = DB_PATH.parent / f"{DB_PATH.name}.before-restore"
-        shutil.copy2(DB_PATH, emergency_backup)
+        _sqlite_copy(DB_PATH, emergency_backup)
         print(f"🛡️  Current database saved to: {emergency_backup.name}")
 
     # Restore
     try:
-        shutil.copy2(backup_path, DB_PATH)
+        _sqlite_copy(backup_path, DB_PATH)
         print(f"✅ Database restored from: {backup_name}")
         return True
     except Exception as e:
@@ -0,0 +1,145 @@
+"""
+Pooled HTTP client for the Excel bridge processes media_server proxies to.
+
+Each backend gets one keep-alive requests.Session (so /excel/* calls reuse a
+connection instead of reconnecting every time), its own connect/read
+timeouts, and a small circuit breaker: after FAILURE_THRESHOLD consecutive
+connection failures, timeouts or gateway errors (502/503/504) the backend is
+considered down and calls fail immediately for RESET_AFTER seconds. After that one probe
+call is let through; success closes the circuit, failure re-opens it. A dead
+bridge therefore costs a dashboard poll nothing instead of a full timeout.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 0.5
+FAILURE_THRESHOLD = 3
+RESET_AFTER = 10.0
+POOL_SIZE = 8
+# Answers that mean the bridge itself is unreachable or overloaded. Any other
+# status, 500 included, comes from a running bridge (e.g. a failed /flush).
+DOWN_STATUSES = frozenset({502, 503, 504})
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class BridgeUnavailable(RuntimeError):
+    """Raised without a network call while a backend's circuit is open."""
+
+
+class BridgeClient:
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        timeout: float,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_after: float = RESET_AFTER,
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._last_error: Optional[str] = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # ---- circuit breaker ----
+
+    def _before_call(self) -> None:
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            remaining = self._opened_at + self.reset_after - time.monotonic()
+            if remaining > 0 or self._probing:
+                wait = max(remaining, 0.0)
+                raise BridgeUnavailable(
+                    f"{self.name} bridge unavailable (circuit open, retry in {wait:.1f}s): {self._last_error}"
+                )
+            self._state = HALF_OPEN
+            self._probing = True
+
+    def _record(self, ok: bool, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._state, self._failures, self._last_error = CLOSED, 0, None
+                return
+            self._failures += 1
+            self._last_error = error
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"⚠️  {self.name} bridge circuit open after {self._failures} failure(s): {error}")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    # ---- requests ----
+
+    def request(self, method: str, endpoint: str, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Call the backend and return its JSON body; raises RuntimeError on any failure."""
+        self._before_call()
+        read_timeout = self.timeout if timeout is None else timeout
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{endpoint}", timeout=(self.connect_timeout, read_timeout), **kwargs
+            )
+        except requests.RequestException as exc:
+            self._record(False, str(exc))
+            raise RuntimeError(str(exc))
+        except Exception as exc:
+            self._record(False, str(exc))  # never leave a half-open probe outstanding
+            raise
+
+        # The bridges answer 500 for app-level errors (a failed save, a rejected
+        # row); only gateway errors count against the breaker
+        self._record(response.status_code not in DOWN_STATUSES, f"HTTP {response.status_code}")
+        try:
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as exc:
+            raise RuntimeError(str(exc))
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "failures": self._failures,
+                "last_error": self._last_error,
+            }
+
+
+_FANOUT = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bridge-fanout")
+
+
+def fan_out(calls: Dict[str, Tuple[BridgeClient, str, str]]) -> Dict[str, Any]:
+    """
+    Run ``{key: (client, method, endpoint)}`` concurrently. Each value is the
+    backend's JSON, or ``{"ok": False, "error": ...}`` if that call failed.
+    """
+    futures = {key: _FANOUT.submit(client.request, method, endpoint) for key, (client, method, endpoint) in calls.items()}
+    results: Dict[str, Any] = {}
+    for key, future in futures.items():
+        try:
+            results[key] = future.result()
+        except RuntimeError as exc:
+            results[key] = {"ok": False, "error": str(exc)}
+    return results
@@ -1,12 +1,17 @@
 from flask import Flask, request, jsonify
-import subprocess
 import os
 from pathlib import Path
-import json
 import datetime
 import re
+import shutil
+import tempfile
 
-from analytics_db import upsert_clip
+import audio_analysis
+from analytics_db import bulk_upsert_clips, upsert_clip
+from clips_index import ClipsDirIndex
+from extraction_jobs import CANCELLED, FAILED, JobCancelled, JobQueue, QueueFull
+from keyframe_index import KeyframeIndexStore, plan_cut
+from metadata_journal import MetadataJournal
 
 app = Flask(__name__)
 
@@ -22,14 +27,46 @@ def add_cors_headers(resp):
 PROJECT_ROOT = Path(__file__).resolve().parent
 BASE_DIR = PROJECT_ROOT
 CLIPS_DIR = BASE_DIR / "Clips"
-METADATA_FILE = CLIPS_DIR / "clips_metadata.json"
+METADATA_FILE = CLIPS_DIR / "clips_metadata.json"  # legacy snapshot, migrated into the journal
+METADATA_JOURNAL = MetadataJournal(CLIPS_DIR / "clips_metadata.jsonl", legacy_path=METADATA_FILE)
 
 # Ensure directories exist
 CLIPS_DIR.mkdir(exist_ok=True)
 
+# Clip files on disk; updated directly as this process writes or discards clips
+CLIPS_INDEX = ClipsDirIndex(CLIPS_DIR)
+
 # Store current video path
 current_video_path = None
 
+# Background FFmpeg workers (one per core) with a bounded backlog
+EXTRACTION_QUEUE = JobQueue()
+
+# Keyframe timestamps per source video, persisted under data/keyframes/
+KEYFRAMES = KeyframeIndexStore()
+
+# Re-encode settings for clips cut without any stream copy (kept close to typical game film)
+ENCODE_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-c:a", "aac"]
+
+# Encoders that can reproduce a source stream for a smart-cut head, and the
+# ffprobe profile names each one accepts (anything else falls back to a full re-encode)
+HEAD_VIDEO_ENCODERS = {
+    "h264": ("libx264", {
+        "Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main",
+        "High": "high", "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444",
+    }),
+    "hevc": ("libx265", {"Main": "main", "Main 10": "main10"}),
+}
+HEAD_AUDIO_ENCODERS = {
+    "aac": ("aac", {"LC": "aac_low"}),
+    "mp3": ("libmp3lame", None),
+    "ac3": ("ac3", None),
+    "alac": ("alac", None),
+}
+
+# Detect comm segments in every newly cut clip (set AUTO_ANALYZE_AUDIO=0 to skip)
+AUTO_ANALYZE_AUDIO = os.environ.get("AUTO_ANALYZE_AUDIO", "1") not in ("0", "false", "no")
+
 def time_to_seconds(time_str):
     """Convert HH:MM:SS or MM:SS to total seconds"""
     parts = time_str.strip().split(':')
@@ -47,15 +84,29 @@ def time_to_seconds(time_str):
 
 def load_metadata():
     """Load existing clips metadata"""
-    if METADATA_FILE.exists():
-        with open(METADATA_FILE, 'r') as f:
-            return json.load(f)
-    return {"clips": []}
+    return {"clips": METADATA_JOURNAL.all()}
 
-def save_metadata(data):
-    """Save clips metadata"""
-    with open(METADATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+def save_metadata_clip(clip_data):
+    """Append one clip to the metadata journal"""
+    METADATA_JOURNAL.put(clip_data)
+
+def index_keyframes(video_path):
+    """
+    Queue a keyframe index build for a newly loaded video. Returns the job id,
+    or None if the index is already cached or the queue is full (cuts then
+    fall back to plain stream copy until it exists).
+    """
+    if KEYFRAMES.get(video_path) is not None:
+        return None
+    try:
+        job = EXTRACTION_QUEUE.submit(
+            "keyframe_index",
+            lambda job: {"keyframes": len(KEYFRAMES.build(video_path, probe=lambda cmd: run_ffprobe(job, cmd)))},
+            {"video_path": video_path},
+        )
+    except QueueFull:
+        return None
+    return job.id
 
 def slugify(value, fallback='clip'):
     """Convert text to safe filename slug"""
@@ -99,7 +150,8 @@ def set_video():
         
         current_video_path = video_path
         print(f"📹 Video set: {current_video_path}")
-        return jsonify({"ok": True, "video_path": current_video_path})
+        keyframe_job = index_keyframes(current_video_path)
+        return jsonify({"ok": True, "video_path": current_video_path, "keyframe_job": keyframe_job})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
@@ -123,173 +175,618 @@ def set_video_manual():
         
         current_video_path = video_path
         print(f"📹 Video manually set: {current_video_path}")
-        return jsonify({"ok": True, "video_path": current_video_path})
+        keyframe_job = index_keyframes(current_video_path)
+        return jsonify({"ok": True, "video_path": current_video_path, "keyframe_job": keyframe_job})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+class ExtractionError(ValueError):
+    """Bad extraction request (reported to the client as a 400)"""
+
+
+def prepare_extraction(data, video_path):
+    """
+    Validate one tagged possession and work out everything needed to cut it:
+    seconds, output file, the metadata journal entry and the DB record.
+    """
+    # Get clip info
+    start_time = data.get("Start Time", "")
+    end_time = data.get("End Time", "")
+    game_num = data.get("Game #", "1")
+    quarter = data.get("Quarter", "1")
+    possession = data.get("Possession #", "1")
+    opponent_raw = data.get("Opponent", "Unknown")
+    opponent_slug = slugify(opponent_raw, fallback='opponent')
+
+    # Validate
+    if not start_time or not end_time:
+        raise ExtractionError("Start and End times required")
+
+    if not video_path or not os.path.exists(video_path):
+        raise ExtractionError("No video file loaded. Load a video first.")
+
+    # Convert times to seconds
+    start_sec = time_to_seconds(start_time)
+    end_sec = time_to_seconds(end_time)
+    duration = end_sec - start_sec
+
+    if duration <= 0:
+        raise ExtractionError("End time must be after start time")
+
+    # Create filename
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"G{game_num}_Q{quarter}_P{possession}_{opponent_slug}_{timestamp}.mp4"
+    output_path = CLIPS_DIR / filename
+
+    # Generate clip ID (prefer canonical from client if present)
+    canonical_from_client = data.get("__clipId")
+    clip_id = canonical_from_client or f"clip_{timestamp}_{game_num}_{quarter}_{possession}"
+
+    # Add clip data
+    clip_data = {
+        "id": clip_id,
+        "filename": filename,
+        "path": str(output_path),
+        "gameId": int(game_num),
+        "quarter": int(quarter),
+        "possession": int(possession),
+        "opponent": opponent_raw,
+        "situation": data.get("Situation", ""),
+        "formation": data.get("Offensive Formation", ""),
+        "playName": data.get("Play Name", ""),
+        "scoutCoverage": data.get("Covered in Scout?", ""),
+        "actionTrigger": data.get("Action Trigger", ""),
+        "actionTypes": data.get("Action Type(s)", ""),
+        "actionSequence": data.get("Action Sequence", ""),
+        "coverage": data.get("Defensive Coverage", ""),
+        "ballScreen": data.get("Ball Screen Coverage", ""),
+        "offBallScreen": data.get("Off-Ball Screen Coverage", ""),
+        "helpRotation": data.get("Help/Rotation", ""),
+        "disruption": data.get("Defensive Disruption", ""),
+        "breakdown": data.get("Defensive Breakdown", ""),
+        "result": data.get("Play Result", ""),
+        "paintTouch": data.get("Paint Touches", ""),
+        "shooter": data.get("Shooter Designation", ""),
+        "shotLocation": data.get("Shot Location", ""),
+        "contest": data.get("Shot Contest", ""),
+        "rebound": data.get("Rebound Outcome", ""),
+        "points": int(data.get("Points", 0)),
+        "hasShot": data.get("Has Shot", ""),
+        "shotX": data.get("Shot X", ""),
+        "shotY": data.get("Shot Y", ""),
+        "shotResult": data.get("Shot Result", ""),
+        "notes": data.get("Notes", ""),
+        "startTime": start_time,
+        "endTime": end_time,
+        "createdAt": datetime.datetime.now().isoformat()
+    }
+    
+    canonical_game_id = data.get("__gameId") or f"G{game_num}_{opponent_slug}"
+    canonical_clip_id = data.get("__clipId") or clip_id
+    opponent_norm = data.get("__opponent") or opponent_raw
+
+    clip_data["opponent"] = opponent_norm
+    clip_data["canonicalGameId"] = canonical_game_id
+    clip_data["canonicalClipId"] = canonical_clip_id
+    clip_data["__gameId"] = canonical_game_id
+    clip_data["__clipId"] = canonical_clip_id
+    clip_data["__opponent"] = opponent_norm
+
+    db_record = {
+        "id": canonical_clip_id,
+        "filename": filename,
+        "path": str(output_path),
+        "game_id": int(game_num),
+        "canonical_game_id": canonical_game_id,
+        "canonical_clip_id": canonical_clip_id,
+        "opponent": opponent_norm,
+        "opponent_slug": opponent_slug,
+        "quarter": int(quarter),
+        "possession": int(possession),
+        "situation": data.get("Situation", ""),
+        "formation": data.get("Offensive Formation", ""),
+        "play_name": data.get("Play Name", ""),
+        "scout_coverage": data.get("Covered in Scout?", ""),
+        "action_trigger": data.get("Action Trigger", ""),
+        "action_types": data.get("Action Type(s)", ""),
+        "action_sequence": data.get("Action Sequence", ""),
+        "coverage": data.get("Defensive Coverage", ""),
+        "ball_screen": data.get("Ball Screen Coverage", ""),
+        "off_ball_screen": data.get("Off-Ball Screen Coverage", ""),
+        "help_rotation": data.get("Help/Rotation", ""),
+        "disruption": data.get("Defensive Disruption", ""),
+        "breakdown": data.get("Defensive Breakdown", ""),
+        "result": data.get("Play Result", ""),
+        "paint_touch": data.get("Paint Touches", ""),
+        "shooter": data.get("Shooter Designation", ""),
+        "shot_location": data.get("Shot Location", ""),
+        "contest": data.get("Shot Contest", ""),
+        "rebound": data.get("Rebound Outcome", ""),
+        "points": int(data.get("Points", 0)),
+        "has_shot": data.get("Has Shot", ""),
+        "shot_x": data.get("Shot X", ""),
+        "shot_y": data.get("Shot Y", ""),
+        "shot_result": data.get("Shot Result", ""),
+        "notes": data.get("Notes", ""),
+        "start_time": start_time,
+        "end_time": end_time,
+        "created_at": clip_data["createdAt"],
+    }
+
+    return {
+        "clip_id": clip_id,
+        "filename": filename,
+        "output_path": output_path,
+        "video_path": video_path,
+        "start_sec": start_sec,
+        "duration": duration,
+        "clip_data": clip_data,
+        "db_record": db_record,
+    }
+
+
+def build_ffmpeg_cmd(spec):
+    """FFmpeg command to extract clip"""
+    return [
+        "ffmpeg",
+        "-ss", str(spec["start_sec"]),   # Start time
+        "-i", spec["video_path"],        # Input file
+        "-t", str(spec["duration"]),     # Duration
+        "-c", "copy",                    # Copy codec (fast, no re-encoding)
+        "-avoid_negative_ts", "1",       # Fix timestamp issues
+        str(spec["output_path"])
+    ]
+
+
+def _level_arg(codec, level):
+    """ffprobe's level number as the encoder's dotted level ("4.1"), or None if unknown."""
+    try:
+        level = int(level)
+    except (TypeError, ValueError):
+        return None
+    if level <= 0:
+        return None
+    if codec == "hevc":
+        level = level * 10 // 30  # general_level_idc is 30x the level
+    return f"{level // 10}.{level % 10}"
+
+
+def smart_cut_head_args(streams):
+    """
+    Encoder arguments that make a smart cut's re-encoded head match the
+    source streams (codec, profile, level, pixel format, time base, audio
+    format) so it joins the stream-copied tail cleanly. None if the source
+    can't be matched; the clip is then fully re-encoded instead.
+    """
+    video, audio = streams.get("video"), streams.get("audio")
+    if not video or video.get("codec_name") not in HEAD_VIDEO_ENCODERS:
+        return None
+    codec = video["codec_name"]
+    encoder, profiles = HEAD_VIDEO_ENCODERS[codec]
+    profile = profiles.get(video.get("profile"))
+    timescale = str(video.get("time_base", "")).partition("/")[2]
+    if profile is None or not video.get("pix_fmt") or not timescale.isdigit():
+        return None
+    args = ["-c:v", encoder, "-preset", "veryfast", "-crf", "18",
+            "-profile:v", profile, "-pix_fmt", video["pix_fmt"], "-video_track_timescale", timescale]
+    level = _level_arg(codec, video.get("level"))
+    if level:
+        args += ["-x265-params", f"level-idc={level}"] if codec == "hevc" else ["-level:v", level]
+    if video.get("codec_tag_string") in ("avc1", "hvc1", "hev1"):
+        args += ["-tag:v", video["codec_tag_string"]]
+
+    if not audio:
+        return args + ["-an"]
+    if audio.get("codec_name") not in HEAD_AUDIO_ENCODERS:
+        return None
+    encoder, profiles = HEAD_AUDIO_ENCODERS[audio["codec_name"]]
+    args += ["-c:a", encoder]
+    if profiles is not None:
+        if audio.get("profile") not in profiles:
+            return None  # e.g. HE-AAC, which the native encoder can't write
+        args += ["-profile:a", profiles[audio["profile"]]]
+    if audio.get("sample_rate"):
+        args += ["-ar", str(audio["sample_rate"])]
+    if audio.get("channels"):
+        args += ["-ac", str(audio["channels"])]
+    return args
+
+
+def smart_cut_parts(spec, keyframe, workdir, head_args):
+    """
+    The pieces of a smart cut: the command re-encoding [start, keyframe) with
+    ``head_args`` (see smart_cut_head_args), the stream-copied [keyframe, end)
+    as a copy cut (see build_batch_ffmpeg_cmd), and the concat-demuxer command
+    joining the two into the final output. Every part keeps the source's time base.
+    """
+    start = spec["start_sec"]
+    end = spec["start_sec"] + spec["duration"]
+    head = Path(workdir) / "head.mp4"
+    tail = Path(workdir) / "tail.mp4"
+    parts = Path(workdir) / "parts.txt"
+    parts.write_text(f"file '{head}'\nfile '{tail}'\n")
+    timescale = head_args[head_args.index("-video_track_timescale") + 1]
+    head_cmd = ["ffmpeg", "-y", "-ss", str(start), "-i", spec["video_path"], "-t", str(keyframe - start),
+                *head_args, "-avoid_negative_ts", "make_zero", str(head)]
+    tail_cut = {
+        "start": keyframe,
+        "duration": end - keyframe,
+        "output": tail,
+        "args": ["-video_track_timescale", timescale, "-avoid_negative_ts", "make_zero"],
+    }
+    concat_cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", str(parts),
+                  "-c", "copy", "-video_track_timescale", timescale, str(spec["output_path"])]
+    return head_cmd, tail_cut, concat_cmd
+
+
+def build_smart_cut_cmds(spec, keyframe, workdir, head_args):
+    """Head encode, tail stream copy and concat for a smart cut of one clip"""
+    head_cmd, tail, concat_cmd = smart_cut_parts(spec, keyframe, workdir, head_args)
+    tail_cmd = ["ffmpeg", "-y", "-ss", str(tail["start"]), "-i", spec["video_path"], "-t", str(tail["duration"]),
+                "-c", "copy", *tail["args"], str(tail["output"])]
+    return [head_cmd, tail_cmd, concat_cmd]
+
+
+def build_encode_cmd(spec):
+    """Frame-accurate re-encode, used when the clip holds no keyframe at all"""
+    return [
+        "ffmpeg", "-y",
+        "-ss", str(spec["start_sec"]),
+        "-i", spec["video_path"],
+        "-t", str(spec["duration"]),
+        *ENCODE_ARGS,
+        str(spec["output_path"]),
+    ]
+
+
+def cut_mode(spec):
+    keyframes = KEYFRAMES.get(spec["video_path"])
+    if not keyframes:
+        return "copy", None
+    return plan_cut(keyframes, spec["start_sec"], spec["start_sec"] + spec["duration"])
+
+
+def source_head_args(job, video_path):
+    """smart_cut_head_args for a source, or None if it can't be probed or matched"""
+    try:
+        streams = KEYFRAMES.streams(video_path, probe=lambda cmd: run_ffprobe(job, cmd))
+    except (OSError, RuntimeError, ValueError):
+        return None
+    return smart_cut_head_args(streams)
+
+
+def cut_clip(job, spec):
+    """Cut one clip with the cheapest accurate strategy the keyframe index allows"""
+    mode, keyframe = cut_mode(spec)
+    if mode == "smart":
+        head_args = source_head_args(job, spec["video_path"])
+        if head_args is None:
+            mode = "encode"
+    if mode == "copy":
+        return run_ffmpeg(job, build_ffmpeg_cmd(spec))
+    if mode == "encode":
+        return run_ffmpeg(job, build_encode_cmd(spec))
+
+    workdir = tempfile.mkdtemp(prefix="smartcut_", dir=CLIPS_DIR)
+    try:
+        for cmd in build_smart_cut_cmds(spec, keyframe, workdir, head_args):
+            result = run_ffmpeg(job, cmd)
+            if result.returncode != 0:
+                return result
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# Outputs per FFmpeg process in a batch cut (bounds argv length and open files)
+BATCH_OUTPUTS_PER_PASS = 32
+
+
+def build_batch_ffmpeg_cmd(video_path, cuts):
+    """
+    One FFmpeg process that demuxes the source once and stream-copies every
+    cut (``{"start", "duration", "output", "args"}``, starting on a keyframe)
+    as its own output. The input seeks to the earliest start; each output
+    then trims relative to that point.
+    """
+    base = max(0, int(min(cut["start"] for cut in cuts)))
+    cmd = ["ffmpeg", "-y", "-ss", str(base), "-i", video_path]
+    for cut in cuts:
+        cmd += [
+            "-map", "0",
+            "-ss", str(cut["start"] - base),
+            "-t", str(cut["duration"]),
+            "-c", "copy",
+            *cut["args"],
+            str(cut["output"]),
+        ]
+    return cmd
+
+
+def run_ffmpeg(job, cmd):
+    """Run FFmpeg for a job (replace this to stub FFmpeg out in tests)"""
+    return job.run_subprocess(cmd)
+
+
+def run_ffprobe(job, cmd):
+    """Run ffprobe for a job (replace this to stub it out in tests)"""
+    return job.run_subprocess(cmd)
+
+
+def schedule_audio_analysis(specs):
+    """Queue comm segment detection for cut clips; never fails the extraction"""
+    if not AUTO_ANALYZE_AUDIO:
+        return
+    for spec in specs:
+        try:
+            audio_analysis.schedule(spec["db_record"]["id"], spec["output_path"])
+        except Exception as e:
+            print(f"⚠️  Could not queue audio analysis for {spec['clip_id']}: {e}")
+
+
+def finalize_extraction(spec):
+    """Record a successfully cut clip in the metadata journal and the DB"""
+    CLIPS_INDEX.add(spec["filename"])
+    save_metadata_clip(spec["clip_data"])
+    upsert_clip(spec["db_record"])
+    print(f"✅ Clip extracted: {spec['filename']}")
+    schedule_audio_analysis([spec])
+    return {"clip_id": spec["clip_id"], "filename": spec["filename"], "path": str(spec["output_path"])}
+
+
+def _discard_output(path):
+    CLIPS_INDEX.discard(Path(path).name)
+    try:
+        Path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def extraction_job(spec):
+    def run(job):
+        try:
+            result = cut_clip(job, spec)
+        except JobCancelled:
+            _discard_output(spec["output_path"])
+            raise
+        if result.returncode != 0:
+            _discard_output(spec["output_path"])
+            raise RuntimeError(f"FFmpeg error: {result.stderr}")
+        return finalize_extraction(spec)
+    return run
+
+
+def finalize_batch(specs):
+    """Record a batch of cut clips: journal entries, then one DB transaction"""
+    for spec in specs:
+        CLIPS_INDEX.add(spec["filename"])
+        save_metadata_clip(spec["clip_data"])
+    bulk_upsert_clips((spec["db_record"] for spec in specs), chunk_size=max(1, len(specs)))
+    print(f"✅ Batch extracted: {len(specs)} clip(s)")
+    schedule_audio_analysis(specs)
+    return [
+        {"clip_id": spec["clip_id"], "filename": spec["filename"], "path": str(spec["output_path"])}
+        for spec in specs
+    ]
+
+
+def plan_batch(job, specs, workdir):
+    """
+    Decide how each clip of a batch is cut, in source order. Stream-copied
+    ranges go to the shared passes: whole clips that start on a keyframe
+    ("copy") and the tails of "smart" cuts, from their first keyframe on.
+    A smart cut then only re-encodes its head and concats. Clips with no
+    keyframe inside, smart cuts of a source whose streams can't be matched,
+    and every clip when the source can't be indexed are cut "alone".
+    """
+    video_path = specs[0]["video_path"]
+    try:
+        # Demux-only and cached per file version, so the plan below is exact
+        KEYFRAMES.build(video_path, probe=lambda cmd: run_ffprobe(job, cmd))
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"⚠️  Could not index keyframes of {video_path}, cutting clips one by one: {e}")
+    indexed = bool(KEYFRAMES.get(video_path))
+    head_args = None
+    plans = []
+    for i, spec in enumerate(sorted(specs, key=lambda spec: spec["start_sec"])):
+        mode, keyframe = cut_mode(spec) if indexed else ("alone", None)
+        if mode == "smart" and head_args is None:
+            head_args = source_head_args(job, video_path) or []
+        plan = {"spec": spec, "mode": mode}
+        if mode == "copy":
+            plan["cut"] = {
+                "start": spec["start_sec"],
+                "duration": spec["duration"],
+                "output": spec["output_path"],
+                "args": ["-avoid_negative_ts", "1"],
+            }
+        elif mode == "smart" and head_args:
+            parts = Path(workdir) / str(i)
+            parts.mkdir()
+            plan["head"], plan["cut"], plan["concat"] = smart_cut_parts(spec, keyframe, parts, head_args)
+        else:
+            plan["mode"] = "alone"  # cut_clip re-encodes it
+        plans.append(plan)
+    return plans
+
+
+def batch_extraction_job(specs):
+    def run(job):
+        done, failed = [], []
+
+        def collect(spec, result):
+            output = Path(spec["output_path"])
+            if result.returncode == 0 and output.exists() and output.stat().st_size > 0:
+                done.append(spec)
+            else:
+                _discard_output(output)
+                failed.append({
+                    "clip_id": spec["clip_id"],
+                    "error": f"FFmpeg error: {result.stderr}" if result.returncode else "No output written",
+                })
+
+        workdir = tempfile.mkdtemp(prefix="batch_", dir=CLIPS_DIR)
+        try:
+            plans = plan_batch(job, specs, workdir)
+            shared = [plan for plan in plans if "cut" in plan]
+            # Plans are in source order, so consecutive passes read consecutive stretches of it
+            for i in range(0, len(shared), BATCH_OUTPUTS_PER_PASS):
+                group = shared[i:i + BATCH_OUTPUTS_PER_PASS]
+                result = run_ffmpeg(job, build_batch_ffmpeg_cmd(group[0]["spec"]["video_path"],
+                                                                [plan["cut"] for plan in group]))
+                for plan in group:
+                    if result.returncode != 0:
+                        # A pass that died partway may have left truncated outputs: cut each again alone
+                        _discard_output(plan["spec"]["output_path"])
+                        plan["mode"] = "alone"
+                    plan["result"] = result
+            counts = {mode: sum(plan["mode"] == mode for plan in plans) for mode in ("copy", "smart", "alone")}
+
+            for plan in plans:
+                spec = plan["spec"]
+                if plan["mode"] == "copy":
+                    collect(spec, plan["result"])
+                elif plan["mode"] == "smart":
+                    result = run_ffmpeg(job, plan["head"])
+                    if result.returncode == 0:
+                        result = run_ffmpeg(job, plan["concat"])
+                    collect(spec, result)
+                else:
+                    collect(spec, cut_clip(job, spec))
+        except JobCancelled:
+            for spec in specs:
+                _discard_output(spec["output_path"])
+            raise
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        print(f"✂️  Batch cut: {counts['copy']} copied, {counts['smart']} smart, {counts['alone']} alone "
+              f"in {-(-len(shared) // BATCH_OUTPUTS_PER_PASS)} shared pass(es)")
+        clips = finalize_batch(done) if done else []
+        if not clips:
+            raise RuntimeError(failed[0]["error"] if failed else "Nothing to extract")
+        return {"clips": clips, "failed": failed, "cuts": counts}
+    return run
+
+
+def job_response(job, status_code=200):
+    payload = {"ok": job.status not in (FAILED, CANCELLED), **job.to_dict()}
+    if job.status == FAILED:
+        status_code = 500
+    return jsonify(payload), status_code
+
+
+def queue_full_response(exc):
+    resp = jsonify({"ok": False, "error": str(exc), "queue": EXTRACTION_QUEUE.stats()})
+    resp.headers["Retry-After"] = "2"
+    return resp, 429
+
+
 @app.route("/extract_clip", methods=["POST", "OPTIONS"])
 def extract_clip():
-    """Extract a video clip using FFmpeg"""
+    """
+    Queue a clip extraction and return its job id immediately.
+    Pass ?wait=1 to block until the clip is cut (the old synchronous behaviour).
+    """
     if request.method == "OPTIONS":
         return jsonify({"ok": True})
-    
+
     try:
         data = request.get_json(force=True)
-        
-        # Get clip info
-        start_time = data.get("Start Time", "")
-        end_time = data.get("End Time", "")
-        game_num = data.get("Game #", "1")
-        quarter = data.get("Quarter", "1")
-        possession = data.get("Possession #", "1")
-        opponent_raw = data.get("Opponent", "Unknown")
-        opponent_slug = slugify(opponent_raw, fallback='opponent')
-        
-        # Validate
-        if not start_time or not end_time:
-            return jsonify({"ok": False, "error": "Start and End times required"}), 400
-            
-        if not current_video_path or not os.path.exists(current_video_path):
-            return jsonify({"ok": False, "error": "No video file loaded. Load a video first."}), 400
-        
-        # Convert times to seconds
-        start_sec = time_to_seconds(start_time)
-        end_sec = time_to_seconds(end_time)
-        duration = end_sec - start_sec
-        
-        if duration <= 0:
-            return jsonify({"ok": False, "error": "End time must be after start time"}), 400
-        
-        # Create filename
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"G{game_num}_Q{quarter}_P{possession}_{opponent_slug}_{timestamp}.mp4"
-        output_path = CLIPS_DIR / filename
-        
-        # FFmpeg command to extract clip
-        cmd = [
-            "ffmpeg",
-            "-ss", str(start_sec),           # Start time
-            "-i", current_video_path,        # Input file
-            "-t", str(duration),             # Duration
-            "-c", "copy",                    # Copy codec (fast, no re-encoding)
-            "-avoid_negative_ts", "1",       # Fix timestamp issues
-            str(output_path)
-        ]
-        
-        # Run FFmpeg
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            return jsonify({"ok": False, "error": f"FFmpeg error: {result.stderr}"}), 500
-        
-        # Load existing metadata
-        metadata = load_metadata()
-        
-        # Generate clip ID (prefer canonical from client if present)
-        canonical_from_client = data.get("__clipId")
-        clip_id = canonical_from_client or f"clip_{timestamp}_{game_num}_{quarter}_{possession}"
-        
-        # Add clip data
-        clip_data = {
-            "id": clip_id,
-            "filename": filename,
-            "path": str(output_path),
-            "gameId": int(game_num),
-            "quarter": int(quarter),
-            "possession": int(possession),
-            "opponent": opponent_raw,
-            "situation": data.get("Situation", ""),
-            "formation": data.get("Offensive Formation", ""),
-            "playName": data.get("Play Name", ""),
-            "scoutCoverage": data.get("Covered in Scout?", ""),
-            "actionTrigger": data.get("Action Trigger", ""),
-            "actionTypes": data.get("Action Type(s)", ""),
-            "actionSequence": data.get("Action Sequence", ""),
-            "coverage": data.get("Defensive Coverage", ""),
-            "ballScreen": data.get("Ball Screen Coverage", ""),
-            "offBallScreen": data.get("Off-Ball Screen Coverage", ""),
-            "helpRotation": data.get("Help/Rotation", ""),
-            "disruption": data.get("Defensive Disruption", ""),
-            "breakdown": data.get("Defensive Breakdown", ""),
-            "result": data.get("Play Result", ""),
-            "paintTouch": data.get("Paint Touches", ""),
-            "shooter": data.get("Shooter Designation", ""),
-            "shotLocation": data.get("Shot Location", ""),
-            "contest": data.get("Shot Contest", ""),
-            "rebound": data.get("Rebound Outcome", ""),
-            "points": int(data.get("Points", 0)),
-            "hasShot": data.get("Has Shot", ""),
-            "shotX": data.get("Shot X", ""),
-            "shotY": data.get("Shot Y", ""),
-            "shotResult": data.get("Shot Result", ""),
-            "notes": data.get("Notes", ""),
-            "startTime": start_time,
-            "endTime": end_time,
-            "createdAt": datetime.datetime.now().isoformat()
-        }
-        
-        canonical_game_id = data.get("__gameId") or f"G{game_num}_{opponent_slug}"
-        canonical_clip_id = data.get("__clipId") or clip_id
-        opponent_norm = data.get("__opponent") or opponent_raw
-
-        clip_data["opponent"] = opponent_norm
-        clip_data["canonicalGameId"] = canonical_game_id
-        clip_data["canonicalClipId"] = canonical_clip_id
-        clip_data["__gameId"] = canonical_game_id
-        clip_data["__clipId"] = canonical_clip_id
-        clip_data["__opponent"] = opponent_norm
-        metadata["clips"].append(clip_data)
-        save_metadata(metadata)
-
-        db_record = {
-            "id": canonical_clip_id,
-            "filename": filename,
-            "path": str(output_path),
-            "game_id": int(game_num),
-            "canonical_game_id": canonical_game_id,
-            "canonical_clip_id": canonical_clip_id,
-            "opponent": opponent_norm,
-            "opponent_slug": opponent_slug,
-            "quarter": int(quarter),
-            "possession": int(possession),
-            "situation": data.get("Situation", ""),
-            "formation": data.get("Offensive Formation", ""),
-            "play_name": data.get("Play Name", ""),
-            "scout_coverage": data.get("Covered in Scout?", ""),
-            "action_trigger": data.get("Action Trigger", ""),
-            "action_types": data.get("Action Type(s)", ""),
-            "action_sequence": data.get("Action Sequence", ""),
-            "coverage": data.get("Defensive Coverage", ""),
-            "ball_screen": data.get("Ball Screen Coverage", ""),
-            "off_ball_screen": data.get("Off-Ball Screen Coverage", ""),
-            "help_rotation": data.get("Help/Rotation", ""),
-            "disruption": data.get("Defensive Disruption", ""),
-            "breakdown": data.get("Defensive Breakdown", ""),
-            "result": data.get("Play Result", ""),
-            "paint_touch": data.get("Paint Touches", ""),
-            "shooter": data.get("Shooter Designation", ""),
-            "shot_location": data.get("Shot Location", ""),
-            "contest": data.get("Shot Contest", ""),
-            "rebound": data.get("Rebound Outcome", ""),
-            "points": int(data.get("Points", 0)),
-            "has_shot": data.get("Has Shot", ""),
-            "shot_x": data.get("Shot X", ""),
-            "shot_y": data.get("Shot Y", ""),
-            "shot_result": data.get("Shot Result", ""),
-            "notes": data.get("Notes", ""),
-            "start_time": start_time,
-            "end_time": end_time,
-            "created_at": clip_data["createdAt"],
-        }
-        upsert_clip(db_record)
-        
-        print(f"✅ Clip extracted: {filename}")
-        return jsonify({"ok": True, "clip_id": clip_id, "filename": filename, "path": str(output_path)})
-        
+        spec = prepare_extraction(data, current_video_path)
+    except ExtractionError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         return jsonify({"ok": False, "error": str(e)}), 500
 
+    meta = {"clip_id": spec["clip_id"], "filename": spec["filename"], "path": str(spec["output_path"])}
+    try:
+        job = EXTRACTION_QUEUE.submit("extract_clip", extraction_job(spec), meta)
+    except QueueFull as exc:
+        return queue_full_response(exc)
+
+    if request.args.get("wait") in ("1", "true", "yes"):
+        job.wait()
+        return job_response(job)
+    return job_response(job, 202)
+
+
+@app.route("/extract_batch", methods=["POST", "OPTIONS"])
+def extract_batch():
+    """
+    Queue many tagged possessions from the loaded video as a single job.
+    Body: {"possessions": [{...same fields as /extract_clip...}, ...]} or a bare list.
+    Possessions that fail validation are reported in "rejected" and skipped.
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"ok": True})
+
+    try:
+        data = request.get_json(force=True)
+        items = data.get("possessions", []) if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({"ok": False, "error": "possessions must be a non-empty list"}), 400
+
+        specs, rejected, seen = [], [], set()
+        for index, item in enumerate(items):
+            try:
+                spec = prepare_extraction(item, current_video_path)
+            except (ExtractionError, TypeError, ValueError) as e:
+                rejected.append({"index": index, "error": str(e)})
+                continue
+            if spec["filename"] in seen:
+                # Same G/Q/P within one second: keep filenames unique
+                stem = Path(spec["filename"]).stem
+                spec["filename"] = f"{stem}_{index}.mp4"
+                spec["output_path"] = CLIPS_DIR / spec["filename"]
+                for record in (spec["clip_data"], spec["db_record"]):
+                    record["filename"] = spec["filename"]
+                    record["path"] = str(spec["output_path"])
+            seen.add(spec["filename"])
+            specs.append(spec)
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+    if not specs:
+        return jsonify({"ok": False, "error": "No valid possessions", "rejected": rejected}), 400
+
+    meta = {"count": len(specs), "rejected": rejected, "clip_ids": [spec["clip_id"] for spec in specs]}
+    try:
+        job = EXTRACTION_QUEUE.submit("extract_batch", batch_extraction_job(specs), meta)
+    except QueueFull as exc:
+        return queue_full_response(exc)
+
+    if request.args.get("wait") in ("1", "true", "yes"):
+        job.wait()
+        return job_response(job)
+    return job_response(job, 202)
+
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    jobs = [job.to_dict() for job in EXTRACTION_QUEUE.list()]
+    return jsonify({"ok": True, "jobs": jobs, "queue": EXTRACTION_QUEUE.stats()})
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = EXTRACTION_QUEUE.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+    return jsonify({"ok": True, **job.to_dict()})
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST", "OPTIONS"])
+def cancel_job(job_id):
+    if request.method == "OPTIONS":
+        return jsonify({"ok": True})
+    job = EXTRACTION_QUEUE.cancel(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+    return jsonify({"ok": True, **job.to_dict()})
+
 @app.route("/get_clips", methods=["GET"])
 def get_clips():
     """Get all clips metadata"""
@@ -304,7 +801,9 @@ def health():
     return jsonify({
         "ok": True,
         "clips_dir": str(CLIPS_DIR),
+        "clip_files": len(CLIPS_INDEX),
         "video_loaded": current_video_path is not None,
+        "queue": EXTRACTION_QUEUE.stats(),
         "current_video": current_video_path
     })
 
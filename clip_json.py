@@ -0,0 +1,169 @@
+"""
+Fast clip-row -> API JSON path for media_server.
+
+compile_clip_mapper() generates one function per (cursor columns, fields)
+combination that turns a raw SQLite tuple straight into the API dict that
+transform_db_clip() would produce, so no intermediate dict is built per row.
+stream_json_array()/stream_json_object() serialize rows in batches as a
+generator of bytes, using orjson when it is installed.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import orjson  # type: ignore[import]
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Keys of transform_db_clip() in order. Each maps to the clips column it reads,
+# or to a marker for the values derived from several columns.
+VIDEO_URL = object()
+LOCATION = object()
+DB_CLIP_API_FIELDS: Dict[str, Any] = {
+    'id': 'id',
+    'filename': 'filename',
+    'video_url': VIDEO_URL,
+    'game_id': 'game_id',
+    'opponent': 'opponent',
+    'game_score': 'game_score',
+    'quarter': 'quarter',
+    'possession': 'possession',
+    'situation': 'situation',
+    'formation': 'formation',
+    'play_name': 'play_name',
+    'scout_coverage': 'scout_coverage',
+    'action_trigger': 'action_trigger',
+    'action_types': 'action_types',
+    'action_sequence': 'action_sequence',
+    'coverage': 'coverage',
+    'ball_screen': 'ball_screen',
+    'off_ball_screen': 'off_ball_screen',
+    'help_rotation': 'help_rotation',
+    'disruption': 'disruption',
+    'breakdown': 'breakdown',
+    'result': 'result',
+    'paint_touch': 'paint_touch',
+    'shooter': 'shooter',
+    'shot_location': 'shot_location',
+    'contest': 'contest',
+    'rebound': 'rebound',
+    'points': 'points',
+    'has_shot': 'has_shot',
+    'shot_x': 'shot_x',
+    'shot_y': 'shot_y',
+    'shot_result': 'shot_result',
+    'notes': 'notes',
+    'start_time': 'start_time',
+    'end_time': 'end_time',
+    'location': LOCATION,
+    'location_display': LOCATION,
+    'location_code': LOCATION,
+    'game_location': LOCATION,
+    'locationLabel': LOCATION,
+}
+
+# Compiled mappers kept (LRU); keys are canonical, see _canonical_fields()
+MAPPER_CACHE_SIZE = 64
+_MAPPERS: "OrderedDict[Tuple[Any, ...], Callable[[Sequence[Any]], Dict[str, Any]]]" = OrderedDict()
+_MAPPERS_LOCK = threading.Lock()
+
+
+def _canonical_fields(fields: Sequence[str]) -> Tuple[str, ...]:
+    """``fields`` without duplicates, in transform_db_clip() order (other columns after, sorted)."""
+    wanted = frozenset(fields)
+    return tuple(f for f in DB_CLIP_API_FIELDS if f in wanted) + tuple(sorted(wanted.difference(DB_CLIP_API_FIELDS)))
+
+
+def compile_clip_mapper(
+    columns: Sequence[str],
+    derive_video_url: Callable[[Any, Any], Optional[str]],
+    fields: Optional[Sequence[str]] = None,
+) -> Callable[[Sequence[Any]], Dict[str, Any]]:
+    """
+    Build (and cache) ``map_row(row) -> dict`` for rows whose layout is
+    ``columns`` (i.e. cursor.description). ``fields`` limits the output keys,
+    which always come in transform_db_clip() order; it defaults to every key.
+    """
+    fields = _canonical_fields(fields) if fields else tuple(DB_CLIP_API_FIELDS)
+    key = (tuple(columns), fields, derive_video_url)
+    with _MAPPERS_LOCK:
+        mapper = _MAPPERS.get(key)
+        if mapper is not None:
+            _MAPPERS.move_to_end(key)
+            return mapper
+
+    index = {name: i for i, name in enumerate(columns)}
+
+    def col(name: str) -> str:
+        return f"r[{index[name]}]" if name in index else "None"
+
+    lines = ["def map_row(r):"]
+    if any(DB_CLIP_API_FIELDS.get(f) is LOCATION for f in fields):
+        lines.append(f"    loc = {col('location')} or ''")
+    items = []
+    for field in fields:
+        source = DB_CLIP_API_FIELDS.get(field, field)
+        if source is VIDEO_URL:
+            expr = f"derive_video_url({col('filename')}, {col('path')})"
+        elif source is LOCATION:
+            expr = "loc"
+        else:
+            expr = col(source)
+        items.append(f"{field!r}: {expr}")
+    lines.append("    return {" + ", ".join(items) + "}")
+
+    namespace: Dict[str, Any] = {"derive_video_url": derive_video_url}
+    exec("\n".join(lines), namespace)
+    mapper = namespace["map_row"]
+    with _MAPPERS_LOCK:
+        _MAPPERS[key] = mapper
+        while len(_MAPPERS) > MAPPER_CACHE_SIZE:
+            _MAPPERS.popitem(last=False)
+    return mapper
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _array_body(items: Iterable[Any], batch_size: int) -> Iterator[bytes]:
+    batch: List[Any] = []
+    first = True
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield (b"" if first else b",") + dumps(batch)[1:-1]
+            first = False
+            batch = []
+    if batch:
+        yield (b"" if first else b",") + dumps(batch)[1:-1]
+
+
+def stream_json_array(items: Iterable[Any], batch_size: int = 256) -> Iterator[bytes]:
+    """Serialize ``items`` as one JSON array, a batch at a time."""
+    yield b"["
+    yield from _array_body(items, batch_size)
+    yield b"]"
+
+
+def stream_json_object(
+    head: Dict[str, Any],
+    array_key: str,
+    items: Iterable[Any],
+    tail: Optional[Callable[[], Dict[str, Any]]] = None,
+    batch_size: int = 256,
+) -> Iterator[bytes]:
+    """
+    Serialize ``{**head, array_key: [...items], **tail()}``. ``tail`` is called
+    after the items are exhausted, so it can report counts or a next cursor.
+    """
+    prefix = dumps(head)[:-1]
+    yield prefix + (b"," if head else b"") + dumps(array_key) + b":["
+    yield from _array_body(items, batch_size)
+    suffix = dumps(tail()) if tail else b"{}"
+    yield b"]" + (b"," + suffix[1:] if len(suffix) > 2 else b"}")
@@ -0,0 +1,66 @@
+"""
+In-memory index of the files in the Clips directory.
+
+media_server resolves a video URL for every clip it returns; checking the
+disk for each one costs a stat() per row. The index keeps the set of file
+names instead and refreshes it only when the directory's mtime changes
+(adding, removing or renaming a file bumps it), polling at most once per
+REFRESH_INTERVAL. Processes that write clips themselves (clip_extractor)
+call add()/discard() so their own view is current immediately.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Set
+
+REFRESH_INTERVAL = 1.0
+
+
+class ClipsDirIndex:
+    def __init__(self, directory: Path, refresh_interval: float = REFRESH_INTERVAL):
+        self.directory = Path(directory)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._names: Set[str] = set()
+        self._mtime_ns: Optional[int] = None
+        self._checked_at = float("-inf")
+
+    def _scan(self) -> None:
+        try:
+            mtime_ns = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            self._names, self._mtime_ns = set(), None
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+        with os.scandir(self.directory) as entries:
+            names = {entry.name for entry in entries if entry.is_file()}
+        self._names, self._mtime_ns = names, mtime_ns
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if force:
+                self._mtime_ns = None
+            self._scan()
+            self._checked_at = now
+
+    def __contains__(self, name: str) -> bool:
+        self.refresh()
+        return name in self._names
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._names)
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            self._names = self._names | {name}
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            self._names = self._names - {name}
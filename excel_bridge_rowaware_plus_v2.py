@@ -1,8 +1,8 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from openpyxl import load_workbook, Workbook
 from openpyxl.utils import get_column_letter
 from pathlib import Path
-import datetime, threading
+import atexit, csv, datetime, io, json, os, signal, sys, threading, time
 
 # ==== CONFIG ====
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -15,6 +15,9 @@ elif FALLBACK_WORKBOOK.exists():
 else:
     WORKBOOK_PATH = PRIMARY_WORKBOOK
 SHEET_NAME = "Tagging"
+SAVE_DEBOUNCE_SECONDS = 1.0   # save once appends go quiet for this long...
+SAVE_MAX_DELAY_SECONDS = 5.0  # ...but never leave changes unsaved longer than this
+EXPORT_CHUNK_ROWS = 500       # rows copied out per lock hold while streaming /export
 # ================
 
 app = Flask(__name__)
@@ -28,8 +31,6 @@ def add_cors_headers(resp):
     resp.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS, GET"
     return resp
 
-_lock = threading.Lock()
-
 def ensure_workbook():
     if WORKBOOK_PATH.exists():
         wb = load_workbook(WORKBOOK_PATH)
@@ -39,64 +40,345 @@ def ensure_workbook():
         wb.create_sheet(SHEET_NAME)
     return wb
 
-def row_is_empty(ws, r):
-    for c in range(1, ws.max_column + 1):
-        if ws.cell(row=r, column=c).value not in (None, ""):
-            return False
-    return True
+def cell_has_value(v):
+    return v not in (None, "")
 
-def write_row_to_sheet(ws, row_dict, target_row: int, overwrite: bool = False):
-    # Ensure header
-    if ws.max_row == 1 and ws.max_column == 1 and (ws["A1"].value is None):
-        for j, h in enumerate(row_dict.keys(), start=1):
-            ws.cell(row=1, column=j, value=h)
-    else:
-        headers = [ws.cell(row=1, column=j).value for j in range(1, ws.max_column + 1)]
-        new = [k for k in row_dict.keys() if k not in headers]
-        if new:
-            start_col = ws.max_column + 1
-            for idx, k in enumerate(new, start=start_col):
-                ws.cell(row=1, column=idx, value=k)
-
-    headers = [ws.cell(row=1, column=j).value for j in range(1, ws.max_column + 1)]
-
-    if overwrite:
-        # Write directly to the specified row
-        r = max(2, int(target_row))
-    else:
-        # Find next empty row at or after target
-        r = max(2, int(target_row))
-        limit = max(ws.max_row + 200, r + 200)
-        while r <= limit and not row_is_empty(ws, r):
-            r += 1
+def display_len(v):
+    return len(str(v)) if v else 0
 
-    for col_index, key in enumerate(headers, start=1):
-        ws.cell(row=r, column=col_index, value=row_dict.get(key, ""))
+def column_width(max_len):
+    return min(max(10, max_len + 2), 40)
 
-    if r <= 200:
-        for j, _ in enumerate(headers, start=1):
-            col = get_column_letter(j)
+class SheetIndex:
+    """
+    In-memory view of the sheet layout so writes never rescan it: the header
+    row as a list plus a header -> column map, and the set of occupied rows.
+    Occupied rows double as a "next free row" forest: each maps to the row
+    after it, and lookups compress the chain, so finding the first free row
+    at/after a target is amortized O(1) however many rows are filled in.
+    Per-column max display lengths are kept the same way so autosizing never
+    rereads the sheet; widths are applied when the workbook is saved.
+    """
+
+    def __init__(self, ws):
+        self.headers = []
+        self.columns = {}
+        self._next = {}
+        self.max_len = {}
+        self._resize = set()
+        self.width = 0
+        self.last_row = 0
+        for r, values in enumerate(ws.iter_rows(values_only=True), start=1):
+            self.width = max(self.width, len(values))
+            for j, v in enumerate(values, start=1):
+                if v and display_len(v) > self.max_len.get(j, 0):
+                    self.max_len[j] = display_len(v)
+            if r == 1:
+                self.headers = list(values)
+                self.columns = {h: j for j, h in enumerate(self.headers, start=1) if h is not None}
+            if any(cell_has_value(v) for v in values):
+                self._next[r] = r + 1
+                self.last_row = r
+        if not self._next:
+            self.headers, self.columns = [], {}
+
+    def is_occupied(self, r):
+        return r in self._next
+
+    def next_free(self, r):
+        path = []
+        while r in self._next:
+            path.append(r)
+            r = self._next[r]
+        for p in path:
+            self._next[p] = r
+        return r
+
+    def mark(self, r, occupied):
+        if occupied:
+            self._next.setdefault(r, r + 1)
+            self.last_row = max(self.last_row, r)
+        elif r in self._next:
+            # Rare (overwrite with a blank row): compressed chains may jump over r
+            del self._next[r]
+            self._next = {o: o + 1 for o in self._next}
+            self.last_row = max(self._next, default=0)
+
+    def output_headers(self):
+        # Safe string headers covering every column that holds data
+        width = max(self.width, len(self.headers))
+        out = []
+        for idx in range(1, width + 1):
+            h = self.headers[idx - 1] if idx <= len(self.headers) else None
+            out.append(str(h) if h is not None else f"col{idx}")
+        return out
+
+    def add_headers(self, ws, keys):
+        for k in keys:
+            if k not in self.columns:
+                self.headers.append(k)
+                self.columns[k] = len(self.headers)
+                ws.cell(row=1, column=len(self.headers), value=k)
+                self.note_value(len(self.headers), k)
+        if self.headers:
+            self.mark(1, True)
+
+    def note_value(self, col, v):
+        n = display_len(v)
+        if n > self.max_len.get(col, 0):
+            self.max_len[col] = n
+
+    def request_autosize(self):
+        self._resize.update(range(1, len(self.headers) + 1))
+
+    def apply_widths(self, ws):
+        for j in self._resize:
             try:
-                max_len = 0
-                for rr in range(1, ws.max_row + 1):
-                    v = ws.cell(row=rr, column=j).value
-                    max_len = max(max_len, len(str(v)) if v else 0)
-                ws.column_dimensions[col].width = min(max(10, max_len + 2), 40)
+                ws.column_dimensions[get_column_letter(j)].width = column_width(self.max_len.get(j, 0))
             except Exception:
                 pass
+        self._resize.clear()
+
+def write_row_to_sheet(ws, index, row_dict, target_row: int, overwrite: bool = False):
+    # Ensure header
+    index.add_headers(ws, row_dict.keys())
+
+    r = max(2, int(target_row))
+    if not overwrite:
+        # Next empty row at or after target
+        r = index.next_free(r)
+
+    has_value = False
+    for col_index, key in enumerate(index.headers, start=1):
+        v = row_dict.get(key, "")
+        ws.cell(row=r, column=col_index, value=v)
+        has_value = has_value or cell_has_value(v)
+        index.note_value(col_index, v)
+    index.mark(r, has_value)
+
+    if r <= 200:
+        # Widths are written at save time from the tracked maxima
+        index.request_autosize()
 
     return r
 
+class DeferredCells:
+    """
+    Takes the sheet's place for writers while a save is serializing the
+    workbook: cell writes are recorded (last one wins) and applied to the
+    real sheet once the save is done.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def cell(self, row, column, value=None):
+        self.values[(row, column)] = value
+
+    def apply(self, ws):
+        for (row, column), value in self.values.items():
+            ws.cell(row=row, column=column, value=value)
+
+class ResidentWorkbook:
+    """
+    Keeps the workbook loaded between requests. Writes mark it dirty and a
+    background thread saves it once writes go quiet (debounced, capped at
+    SAVE_MAX_DELAY_SECONDS) via temp file + atomic rename. If the file's mtime
+    changes underneath us (someone saved it in Excel) it is reloaded and any
+    not-yet-saved writes are replayed on top.
+
+    The slow part of a save runs without holding the lock, so appends never
+    wait for it: they keep updating the index and their cell writes are
+    deferred until the save finishes.
+    """
+
+    def __init__(self, path, sheet_name):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.lock = threading.RLock()
+        self._wake = threading.Condition(self.lock)
+        self._wb = None
+        self.index = None
+        self._mtime = None
+        self._pending = []
+        self._dirty_since = None
+        self._last_change = None
+        self._last_saved_at = None
+        self._last_error = None
+        self._closing = False
+        self._writer = None
+        self._saving = False
+        self._deferred = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def sheet(self):
+        # Caller must hold self.lock. During a save this is the DeferredCells
+        # sink (the index stays current); use wait_for_save() to read cells.
+        if self._saving:
+            return self._deferred
+        mtime = self._file_mtime()
+        if self._wb is None or mtime != self._mtime:
+            external = self._wb is not None
+            self._wb = ensure_workbook()
+            self.index = SheetIndex(self._wb[self.sheet_name])
+            self._mtime = mtime
+            if external and self._pending:
+                print(f"↻ {self.path.name} changed on disk; replaying {len(self._pending)} unsaved row(s)")
+                ws = self._wb[self.sheet_name]
+                for row_dict, target_row, overwrite in self._pending:
+                    write_row_to_sheet(ws, self.index, row_dict, target_row, overwrite)
+        return self._wb[self.sheet_name]
+
+    def wait_for_save(self):
+        # Caller must hold self.lock
+        while self._saving:
+            self._wake.wait()
+
+    def write(self, row_dict, target_row, overwrite):
+        with self.lock:
+            ws = self.sheet()
+            used = write_row_to_sheet(ws, self.index, row_dict, target_row, overwrite)
+            self._pending.append((dict(row_dict), used, True))
+            self._mark_dirty()
+            return used
+
+    def write_many(self, rows):
+        """rows: [(row_dict, target_row, overwrite)]; returns the row used (or the exception) per entry"""
+        results = []
+        with self.lock:
+            ws = self.sheet()
+            for row_dict, target_row, overwrite in rows:
+                try:
+                    used = write_row_to_sheet(ws, self.index, row_dict, target_row, overwrite)
+                except Exception as e:
+                    results.append(e)
+                    continue
+                self._pending.append((dict(row_dict), used, True))
+                results.append(used)
+            if any(not isinstance(r, Exception) for r in results):
+                self._mark_dirty()
+        return results
+
+    def _mark_dirty(self):
+        now = time.monotonic()
+        self._last_change = now
+        if self._dirty_since is None:
+            self._dirty_since = now
+        self._ensure_writer()
+        self._wake.notify_all()
+
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._writer_loop, name="workbook-writer", daemon=True)
+            self._writer.start()
+
+    def _writer_loop(self):
+        with self.lock:
+            while not self._closing:
+                if self._dirty_since is None:
+                    self._wake.wait()
+                    continue
+                now = time.monotonic()
+                due = min(self._last_change + SAVE_DEBOUNCE_SECONDS, self._dirty_since + SAVE_MAX_DELAY_SECONDS)
+                if now < due:
+                    self._wake.wait(due - now)
+                    continue
+                self._save()
+
+    def _save(self):
+        # Caller must hold self.lock (once); it is released while the workbook is written out
+        self.wait_for_save()
+        if self._dirty_since is None or self._wb is None:
+            return
+        ws = self._wb[self.sheet_name]
+        self.index.apply_widths(ws)
+        saving_rows = len(self._pending)
+        self._saving, self._deferred = True, DeferredCells()
+        self._dirty_since = None  # writes from here on make it dirty again
+        tmp = self.path.with_name(f".~{self.path.stem}.{os.getpid()}.tmp{self.path.suffix}")
+        error = None
+        self.lock.release()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._wb.save(tmp)
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except Exception as e:
+            error = e
+        finally:
+            self.lock.acquire()
+            self._deferred.apply(ws)
+            self._saving, self._deferred = False, None
+            self._wake.notify_all()
+        if error is not None:
+            self._last_error = str(error)
+            self._dirty_since = self._dirty_since or time.monotonic()  # retry after the max delay
+            print(f"❌ Save failed ({self.path.name}): {error}")
+            try:
+                tmp.unlink()
+            except FileNotFoundError:
+                pass
+            return
+        self._mtime = self._file_mtime()
+        self._pending = self._pending[saving_rows:]
+        self._last_error = None
+        self._last_saved_at = datetime.datetime.now(datetime.UTC).isoformat()
+        print(f"💾 Saved → {self.path.name} / {self.sheet_name}")
+
+    def flush(self):
+        with self.lock:
+            self._save()
+            return self._last_error is None
+
+    def close(self):
+        with self.lock:
+            self._closing = True
+            self._wake.notify_all()
+            self._save()
+
+    def status(self):
+        with self.lock:
+            return {
+                "loaded": self._wb is not None,
+                "unsaved_rows": len(self._pending),
+                "last_saved_at": self._last_saved_at,
+                "last_error": self._last_error,
+            }
+
+
+WORKBOOK = ResidentWorkbook(WORKBOOK_PATH, SHEET_NAME)
+atexit.register(WORKBOOK.close)
+
+def wants_flush():
+    return request.args.get("flush") in ("1", "true", "yes")
+
+def parse_append_row(data):
+    data.setdefault("Bridge_Received_At", datetime.datetime.now(datetime.UTC).isoformat())
+
+    target_row = data.pop("Target_Row", None) or data.pop("target_row", None)
+    overwrite = data.pop("Overwrite", False) or data.pop("overwrite", False)
+
+    try:
+        target_row = int(target_row) if target_row is not None else 2
+    except Exception:
+        target_row = 2
+    return data, target_row, overwrite
+
 @app.route("/check_row", methods=["GET", "OPTIONS"])
 def check_row():
     if request.method == "OPTIONS":
         return jsonify({"ok": True})
     try:
         row_num = int(request.args.get("row", "2"))
-        with _lock:
-            wb = ensure_workbook()
-            ws = wb[SHEET_NAME]
-            has_data = not row_is_empty(ws, row_num)
+        with WORKBOOK.lock:
+            WORKBOOK.sheet()
+            has_data = WORKBOOK.index.is_occupied(row_num)
         return jsonify({"ok": True, "has_data": has_data, "row": row_num})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
@@ -109,52 +391,152 @@ def append():
         data = request.get_json(force=True)
         if not isinstance(data, dict):
             return jsonify({"ok": False, "error": "Payload must be a JSON object"}), 400
-        data.setdefault("Bridge_Received_At", datetime.datetime.now(datetime.UTC).isoformat())
+        data, target_row, overwrite = parse_append_row(data)
 
-        target_row = data.pop("Target_Row", None) or data.pop("target_row", None)
-        overwrite = data.pop("Overwrite", False) or data.pop("overwrite", False)
-        
-        try:
-            target_row = int(target_row) if target_row is not None else 2
-        except Exception:
-            target_row = 2
-
-        with _lock:
-            wb = ensure_workbook()
-            ws = wb[SHEET_NAME]
-            used = write_row_to_sheet(ws, data, target_row, overwrite)
-            wb.save(WORKBOOK_PATH)
-
-        print(f"✅ Saved to row {used} → {WORKBOOK_PATH.name} / {SHEET_NAME}")
-        return jsonify({"ok": True, "saved_to": str(WORKBOOK_PATH), "row": used})
+        used = WORKBOOK.write(data, target_row, overwrite)
+        saved = WORKBOOK.flush() if wants_flush() else None
+
+        print(f"✅ Wrote row {used} → {WORKBOOK_PATH.name} / {SHEET_NAME}")
+        return jsonify({"ok": True, "saved_to": str(WORKBOOK_PATH), "row": used, "saved": saved})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@app.route("/append_batch", methods=["POST", "OPTIONS"])
+def append_batch():
+    # Body: {"rows": [{...row, "Target_Row"?: n, "Overwrite"?: bool}, ...]} (or a bare list)
+    if request.method == "OPTIONS":
+        return jsonify({"ok": True})
+    try:
+        payload = request.get_json(force=True)
+        rows = payload.get("rows") if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            return jsonify({"ok": False, "error": "Payload must be a list of rows or {\"rows\": [...]}"}), 400
+
+        results = [None] * len(rows)
+        batch, positions = [], []
+        for i, data in enumerate(rows):
+            if not isinstance(data, dict):
+                results[i] = {"index": i, "ok": False, "error": "Row must be a JSON object"}
+                continue
+            batch.append(parse_append_row(data))
+            positions.append(i)
+
+        for i, outcome in zip(positions, WORKBOOK.write_many(batch)):
+            if isinstance(outcome, Exception):
+                results[i] = {"index": i, "ok": False, "error": str(outcome)}
+            else:
+                results[i] = {"index": i, "ok": True, "row": outcome}
+        saved = WORKBOOK.flush() if wants_flush() else None
+
+        written = sum(1 for r in results if r["ok"])
+        print(f"✅ Wrote {written}/{len(rows)} rows → {WORKBOOK_PATH.name} / {SHEET_NAME}")
+        return jsonify({
+            "ok": written == len(rows),
+            "saved_to": str(WORKBOOK_PATH),
+            "written": written,
+            "failed": len(rows) - written,
+            "results": results,
+            "saved": saved,
+        })
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+def read_window(first_row, last_row):
+    # Copy rows [first_row, last_row] out of the resident sheet; returns (headers, [(row, values)])
+    with WORKBOOK.lock:
+        WORKBOOK.wait_for_save()
+        ws = WORKBOOK.sheet()
+        index = WORKBOOK.index
+        headers = index.output_headers()
+        last_row = min(last_row, index.last_row)
+        if not headers or last_row < first_row:
+            return headers, []
+        rows = ws.iter_rows(min_row=first_row, max_row=last_row, max_col=len(headers), values_only=True)
+        return headers, [(r, values) for r, values in enumerate(rows, start=first_row) if index.is_occupied(r)]
+
 @app.route("/peek", methods=["GET"])
 def peek():
     # Return last N rows (default 3) with safe string headers
     try:
         n = int(request.args.get("rows", "3"))
-        with _lock:
-            wb = ensure_workbook()
-            ws = wb[SHEET_NAME]
-            rows = list(ws.values)
-            if not rows:
-                return jsonify({"ok": True, "rows": [], "count": 0, "sheet": SHEET_NAME, "workbook": str(WORKBOOK_PATH)})
-            raw_headers = list(rows[0])
-            headers = []
-            for idx, h in enumerate(raw_headers, start=1):
-                headers.append(str(h) if h is not None else f"col{idx}")
-            body = rows[1:]
-            last = body[-n:] if n>0 else []
-            out = [dict(zip(headers, r)) for r in last]
+        with WORKBOOK.lock:
+            WORKBOOK.sheet()
+            last_row = WORKBOOK.index.last_row
+        headers, window = read_window(max(2, last_row - n + 1), last_row) if n > 0 else ([], [])
+        out = [dict(zip(headers, values)) for _, values in window]
         return jsonify({"ok": True, "rows": out, "count": len(out), "sheet": SHEET_NAME, "workbook": str(WORKBOOK_PATH)})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+def export_lines(fmt, first_row, last_row):
+    wrote_header = False
+    r = first_row
+    while r <= last_row:
+        end = min(r + EXPORT_CHUNK_ROWS - 1, last_row)
+        headers, window = read_window(r, end)
+        buf = io.StringIO()
+        if fmt == "csv":
+            writer = csv.writer(buf)
+            if not wrote_header:
+                writer.writerow(headers)
+                wrote_header = True
+            writer.writerows(["" if v is None else v for v in values] for _, values in window)
+        else:
+            for _, values in window:
+                buf.write(json.dumps(dict(zip(headers, values)), default=str))
+                buf.write("\n")
+        chunk = buf.getvalue()
+        if chunk:
+            yield chunk
+        r = end + 1
+    if fmt == "csv" and not wrote_header:
+        buf = io.StringIO()
+        csv.writer(buf).writerow(read_window(first_row, first_row - 1)[0])
+        yield buf.getvalue()
+
+@app.route("/export", methods=["GET"])
+def export():
+    # Stream a window of data rows as CSV or JSON lines:
+    #   ?format=csv|jsonl&offset=<data rows to skip>&limit=<max rows, default all>
+    try:
+        fmt = request.args.get("format", "jsonl").lower()
+        if fmt not in ("csv", "jsonl"):
+            return jsonify({"ok": False, "error": "format must be csv or jsonl"}), 400
+        offset = max(0, int(request.args.get("offset", "0")))
+        limit = request.args.get("limit")
+        limit = int(limit) if limit not in (None, "") else None
+        if limit is not None and limit < 0:
+            return jsonify({"ok": False, "error": "limit must be >= 0"}), 400
+
+        with WORKBOOK.lock:
+            WORKBOOK.sheet()
+            sheet_last = WORKBOOK.index.last_row
+        first_row = 2 + offset
+        last_row = sheet_last if limit is None else min(sheet_last, first_row + limit - 1)
+
+        mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+        resp = Response(export_lines(fmt, first_row, last_row), mimetype=mimetype)
+        if last_row < sheet_last:
+            resp.headers["X-Next-Offset"] = str(last_row - 1)
+        resp.headers["Access-Control-Expose-Headers"] = "X-Next-Offset"
+        return resp
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@app.route("/flush", methods=["POST", "OPTIONS"])
+def flush():
+    if request.method == "OPTIONS":
+        return jsonify({"ok": True})
+    saved = WORKBOOK.flush()
+    return jsonify({"ok": saved, **WORKBOOK.status()}), (200 if saved else 500)
+
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"ok": True, "workbook": str(WORKBOOK_PATH), "sheet": SHEET_NAME})
+    return jsonify({"ok": True, "workbook": str(WORKBOOK_PATH), "sheet": SHEET_NAME, "state": WORKBOOK.status()})
 
 if __name__ == "__main__":
+    # Turn SIGTERM into a normal exit so atexit flushes unsaved rows
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     app.run(host="127.0.0.1", port=5001, debug=False)
@@ -0,0 +1,208 @@
+"""
+Bounded background job queue for clip_extractor.
+
+A fixed pool of worker threads (one per core by default) drains a queue of
+jobs. FFmpeg runs as a child process, so threads are enough to keep every
+core busy. submit() raises QueueFull instead of blocking when max_pending
+jobs are waiting so the HTTP layer can answer 429. A cancelled queued job
+stops counting toward that limit at once (workers skip it when they reach
+it); running jobs are cancelled by terminating their subprocess.
+"""
+
+import itertools
+import os
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_WORKERS = os.cpu_count() or 2
+DEFAULT_MAX_PENDING = DEFAULT_WORKERS * 8
+FINISHED_JOBS_KEPT = 500
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, func: Callable[["Job"], Any], meta: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.meta = meta or {}
+        self.status = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._func = func
+        self._proc: Optional[subprocess.Popen] = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run_subprocess(self, cmd: List[str]) -> subprocess.CompletedProcess:
+        """
+        Run ``cmd`` as this job's child process so cancel() can terminate it.
+        Raises JobCancelled if the job was cancelled before or during the run.
+        """
+        if self.cancelled:
+            raise JobCancelled()
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            stdout, stderr = self._proc.communicate()
+        finally:
+            returncode = self._proc.returncode
+            self._proc = None
+        if self.cancelled:
+            raise JobCancelled()
+        return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.meta,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_MAX_PENDING):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._pending = 0  # queued jobs not cancelled yet; bounded by max_pending
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # Guards _jobs, _pending and every job's QUEUED -> RUNNING/CANCELLED move
+        self._lock = threading.RLock()
+        self._threads: List[threading.Thread] = []
+        self._counter = itertools.count(1)
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        for _ in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"extract-worker-{next(self._counter)}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job) -> None:
+        with self._lock:
+            if job.status != QUEUED:
+                return  # cancelled while waiting; cancel() already finished it
+            self._pending -= 1
+            job.status = RUNNING
+            job.started_at = time.time()
+        try:
+            job.result = job._func(job)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as exc:
+            job.error = str(exc)
+            self._finish(job, FAILED)
+        else:
+            self._finish(job, CANCELLED if job.cancelled else DONE)
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        job._finished.set()
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.status in FINISHED_STATES]
+            for old in finished[: max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+                self._jobs.pop(old.id, None)
+
+    def submit(self, kind: str, func: Callable[[Job], Any], meta: Optional[Dict[str, Any]] = None) -> Job:
+        job = Job(kind, func, meta)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"Extraction queue is full ({self.max_pending} pending)")
+            self._ensure_started()
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._pending -= 1
+                self._finish(job, CANCELLED)
+                return job
+        proc = job._proc
+        if proc is not None:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            pending = self._pending
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "jobs": counts,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
+        self._threads = []
@@ -0,0 +1,163 @@
+"""
+Per-source keyframe index used by clip_extractor to make accurate cuts.
+
+Stream-copy cuts can only start on a keyframe, so a tagged Start Time that
+falls mid-GOP either drifts (plain `-ss ... -c copy`) or forces a full
+re-encode. With the keyframe timestamps of the source we can pick, per clip:
+
+- "copy":   start is on a keyframe, stream-copy the whole clip
+- "smart":  re-encode only [start, next keyframe) and stream-copy the rest
+- "encode": no keyframe inside the clip, re-encode it (it is shorter than a GOP)
+
+Indexes come from one demux-only ffprobe pass over the video packets and are
+cached as JSON under data/keyframes/, keyed by path + mtime + size so a
+re-exported file with the same name is re-indexed. The store also keeps the
+source's stream parameters (codec, profile, pixel format, time base, audio
+format), which a smart cut's re-encoded head has to match.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from analytics_db import DATA_DIR
+
+INDEX_DIR = DATA_DIR / "keyframes"
+
+# A start within this many seconds of a keyframe counts as aligned
+ALIGN_TOLERANCE = 0.05
+
+
+def source_key(video_path: str) -> str:
+    st = os.stat(video_path)
+    raw = f"{os.path.abspath(video_path)}|{st.st_mtime_ns}|{st.st_size}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def build_ffprobe_cmd(video_path: str) -> List[str]:
+    # Packet flags only need demuxing, no decoding, so this is close to disk speed
+    return [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        video_path,
+    ]
+
+
+def parse_keyframes(ffprobe_output: str) -> List[float]:
+    keyframes = set()
+    for line in ffprobe_output.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2 or "K" not in parts[1]:
+            continue
+        try:
+            keyframes.add(round(float(parts[0]), 6))
+        except ValueError:
+            continue  # pts_time can be N/A
+    return sorted(keyframes)
+
+
+def build_stream_probe_cmd(video_path: str) -> List[str]:
+    return [
+        "ffprobe", "-v", "error",
+        "-show_entries",
+        "stream=codec_type,codec_name,codec_tag_string,profile,level,pix_fmt,time_base,"
+        "sample_rate,channels",
+        "-of", "json",
+        video_path,
+    ]
+
+
+def parse_stream_info(ffprobe_output: str) -> Dict[str, Optional[Dict[str, Any]]]:
+    """First video and first audio stream of an ffprobe -of json listing (None if absent)."""
+    info: Dict[str, Optional[Dict[str, Any]]] = {"video": None, "audio": None}
+    for stream in json.loads(ffprobe_output or "{}").get("streams", []):
+        kind = stream.get("codec_type")
+        if kind in info and info[kind] is None:
+            info[kind] = stream
+    return info
+
+
+def _default_probe(cmd: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(cmd, capture_output=True, text=True)
+
+
+class KeyframeIndexStore:
+    def __init__(self, index_dir: Path = INDEX_DIR):
+        self.index_dir = Path(index_dir)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, List[float]] = {}
+        self._streams: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+
+    def _file(self, key: str) -> Path:
+        return self.index_dir / f"{key}.json"
+
+    def get(self, video_path: str) -> Optional[List[float]]:
+        """Cached keyframes for this exact file version, or None if not indexed yet."""
+        try:
+            key = source_key(video_path)
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        try:
+            with open(self._file(key), "r") as f:
+                keyframes = json.load(f)["keyframes"]
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self._cache[key] = keyframes
+        return keyframes
+
+    def build(self, video_path: str, probe: Callable[[List[str]], subprocess.CompletedProcess] = _default_probe) -> List[float]:
+        existing = self.get(video_path)
+        if existing is not None:
+            return existing
+        key = source_key(video_path)
+        result = probe(build_ffprobe_cmd(video_path))
+        if result.returncode != 0:
+            raise RuntimeError(f"ffprobe error: {result.stderr}")
+        keyframes = parse_keyframes(result.stdout)
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self._file(key).with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"path": os.path.abspath(video_path), "keyframes": keyframes}, f)
+        os.replace(tmp, self._file(key))
+        with self._lock:
+            self._cache[key] = keyframes
+        return keyframes
+
+    def streams(self, video_path: str, probe: Callable[[List[str]], subprocess.CompletedProcess] = _default_probe) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Video/audio stream parameters of this file version (probed once, kept in memory)."""
+        key = source_key(video_path)
+        with self._lock:
+            if key in self._streams:
+                return self._streams[key]
+        result = probe(build_stream_probe_cmd(video_path))
+        if result.returncode != 0:
+            raise RuntimeError(f"ffprobe error: {result.stderr}")
+        info = parse_stream_info(result.stdout)
+        with self._lock:
+            self._streams[key] = info
+        return info
+
+
+def plan_cut(keyframes: List[float], start: float, end: float) -> Tuple[str, Optional[float]]:
+    """
+    Decide how to cut [start, end). Returns (mode, keyframe) where keyframe is
+    the first keyframe at/after start for "smart" cuts, else None.
+    """
+    i = bisect.bisect_left(keyframes, start - ALIGN_TOLERANCE)
+    if i < len(keyframes) and abs(keyframes[i] - start) <= ALIGN_TOLERANCE:
+        return "copy", None
+    if i < len(keyframes) and keyframes[i] < end:
+        return "smart", keyframes[i]
+    return "encode", None
@@ -1,10 +1,12 @@
+import itertools
+import mimetypes
 import os
-import json
+import stat
 from pathlib import Path
 
-from flask import Flask, send_from_directory, jsonify, request
+from flask import Flask, Response, send_file, send_from_directory, jsonify, request
+from werkzeug.security import safe_join
 from flask_cors import CORS
-import requests
 
 try:
     from dotenv import load_dotenv  # type: ignore[import]
@@ -15,7 +17,12 @@ if load_dotenv:
     load_dotenv()
 
 import analytics_db as db_module
+from bridge_client import BridgeClient, fan_out
+from clip_json import compile_clip_mapper, stream_json_array, stream_json_object
+from clips_index import ClipsDirIndex
+from metadata_journal import MetadataJournal
 
+# analytics_db takes qmark SQL on either backend (SQLite or Postgres)
 fetch_clips = db_module.fetch_clips
 fetch_clip = db_module.fetch_clip
 upsert_clip = db_module.upsert_clip
@@ -23,21 +30,17 @@ upsert_clip = db_module.upsert_clip
 remove_clip = getattr(db_module, "remove_clip", None)
 if remove_clip is None:
     def remove_clip(clip_id):
-        placeholder = "%s" if getattr(db_module, "USE_POSTGRES", False) else "?"
-        query = f"DELETE FROM clips WHERE id = {placeholder}"
         with db_module.db_cursor() as cur:
-            cur.execute(query, (clip_id,))
+            cur.execute("DELETE FROM clips WHERE id = ?", (clip_id,))
 
 if hasattr(db_module, "update_clip_shot"):
     db_update_clip_shot = db_module.update_clip_shot
 else:
     def db_update_clip_shot(clip_id, has_shot, shot_x, shot_y, shot_result, shooter_designation):
-        placeholder = "%s" if getattr(db_module, "USE_POSTGRES", False) else "?"
-        query = f"""
+        query = """
             UPDATE clips
-            SET has_shot = {placeholder}, shot_x = {placeholder}, shot_y = {placeholder},
-                shot_result = {placeholder}, shooter = {placeholder}
-            WHERE id = {placeholder}
+            SET has_shot = ?, shot_x = ?, shot_y = ?, shot_result = ?, shooter = ?
+            WHERE id = ?
         """
         params = (has_shot, shot_x, shot_y, shot_result, shooter_designation, clip_id)
         with db_module.db_cursor() as cur:
@@ -47,11 +50,10 @@ if hasattr(db_module, "clear_clip_shot"):
     db_clear_clip_shot = db_module.clear_clip_shot
 else:
     def db_clear_clip_shot(clip_id):
-        placeholder = "%s" if getattr(db_module, "USE_POSTGRES", False) else "?"
-        query = f"""
+        query = """
             UPDATE clips
             SET has_shot = 'No', shot_x = NULL, shot_y = NULL, shot_result = NULL
-            WHERE id = {placeholder}
+            WHERE id = ?
         """
         with db_module.db_cursor() as cur:
             cur.execute(query, (clip_id,))
@@ -63,7 +65,13 @@ try:
 except ImportError:
     SEMANTIC_SEARCH_AVAILABLE = False
     OPENAI_AVAILABLE = False
-    print("⚠️  Semantic search not available. Install: pip install openai numpy")
+    print("⚠️  Semantic search not available. Install: pip install numpy (openai optional)")
+
+try:
+    from shot_charts import DEFAULT_BINS as SHOT_HEATMAP_BINS, shot_heatmap
+except ImportError:  # pragma: no cover - optional dependency
+    shot_heatmap = None
+    SHOT_HEATMAP_BINS = 25
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=False)
@@ -72,17 +80,24 @@ CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=False)
 PROJECT_ROOT = Path(__file__).resolve().parent
 BASE_DIR = PROJECT_ROOT
 CLIPS_DIR = PROJECT_ROOT / "Clips"
-METADATA_FILE = CLIPS_DIR / "clips_metadata.json"
+METADATA_FILE = CLIPS_DIR / "clips_metadata.json"  # legacy snapshot, migrated into the journal
+METADATA_JOURNAL = MetadataJournal(CLIPS_DIR / "clips_metadata.jsonl", legacy_path=METADATA_FILE)
 BRIDGE_CTRL_BASE = "http://127.0.0.1:5000"
 BRIDGE_APP_BASE = "http://127.0.0.1:5001"
+# Batch appends can write a whole game of rows (and save when ?flush=1)
+EXCEL_BATCH_TIMEOUT = 30
+BRIDGE_CTRL = BridgeClient("controller", BRIDGE_CTRL_BASE, timeout=2)
+BRIDGE_APP = BridgeClient("workbook", BRIDGE_APP_BASE, timeout=3)
+
+# File names present in CLIPS_DIR, refreshed when the directory changes
+CLIPS_INDEX = ClipsDirIndex(CLIPS_DIR)
 
 def derive_video_url(filename, fallback=None):
     for raw in (filename, fallback):
         if not raw:
             continue
-        name = Path(raw).name
-        clip_path = CLIPS_DIR / name
-        if clip_path.exists():
+        name = os.path.basename(raw)
+        if name in CLIPS_INDEX:
             return f"/legacy/Clips/{name}"
     return None
 
@@ -96,17 +111,113 @@ def clip_detail():
     """Serve the clip detail page"""
     return send_from_directory(BASE_DIR, 'clip_detail.html')
 
+# Extracted clips are never rewritten in place (the filename carries the
+# extraction timestamp), so browsers may cache them for good.
+CLIP_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CLIP_READ_CHUNK = 256 * 1024
+
+
+def _clip_etag(st):
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def _byte_ranges(range_header, size):
+    """Resolve a parsed Range header into [(start, stop)) pairs within the file."""
+    resolved = []
+    for start, stop in range_header.ranges:
+        if start < 0:
+            start, stop = max(0, size + start), size
+        stop = size if stop is None else min(stop, size)
+        if start < stop:
+            resolved.append((start, stop))
+    return resolved
+
+
+def _multirange_response(path, st, ranges, mimetype):
+    """206 multipart/byteranges body streamed straight from the file."""
+    boundary = f"clip-{_clip_etag(st)}"
+    parts = []
+    for start, stop in ranges:
+        head = (
+            f"--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Range: bytes {start}-{stop - 1}/{st.st_size}\r\n\r\n"
+        ).encode()
+        parts.append((head, start, stop))
+    closing = f"\r\n--{boundary}--\r\n".encode()
+    length = sum(len(head) + (stop - start) + 2 for head, start, stop in parts) - 2 + len(closing)
+
+    def generate():
+        with open(path, 'rb') as f:
+            for index, (head, start, stop) in enumerate(parts):
+                yield (b"\r\n" if index else b"") + head
+                f.seek(start)
+                remaining = stop - start
+                while remaining > 0:
+                    chunk = f.read(min(CLIP_READ_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+        yield closing
+
+    response = Response(generate(), status=206, mimetype=f'multipart/byteranges; boundary={boundary}')
+    response.content_length = length
+    return response
+
+
 @app.route('/clips/<path:filename>')
 @app.route('/legacy/Clips/<path:filename>')
 def serve_clip(filename):
-    """Serve video clip files with proper headers for streaming"""
-    full_path = CLIPS_DIR / filename
-    if not full_path.exists():
+    """
+    Serve video clip files for streaming: ETag/Last-Modified with 304s,
+    single and multi-range 206s, and immutable caching. Single ranges and
+    full bodies go through send_file, which hands the file to the server's
+    wsgi.file_wrapper (sendfile under gunicorn).
+    """
+    full_path = safe_join(str(CLIPS_DIR), filename)
+    try:
+        st = os.stat(full_path) if full_path else None
+    except OSError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
         return jsonify({'error': f'Clip not found: {filename}'}), 404
 
-    response = send_from_directory(CLIPS_DIR, filename, as_attachment=False)
+    etag = _clip_etag(st)
+    mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    range_header = request.range
+    if (
+        range_header is not None
+        and len(range_header.ranges) > 1
+        and range_header.units == 'bytes'
+        and etag not in request.if_none_match
+        and (not request.if_range or request.if_range.etag == etag)
+    ):
+        ranges = _byte_ranges(range_header, st.st_size)
+        if not ranges:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{st.st_size}'
+        elif len(ranges) == 1:
+            response = None  # degenerate multi-range: let send_file answer it
+        else:
+            response = _multirange_response(full_path, st, ranges, mimetype)
+        if response is not None:
+            response.set_etag(etag)
+            response.last_modified = st.st_mtime
+            response.headers['Accept-Ranges'] = 'bytes'
+            response.headers['Cache-Control'] = CLIP_CACHE_CONTROL
+            return response
+
+    response = send_file(
+        full_path,
+        mimetype=mimetype,
+        conditional=True,
+        etag=etag,
+        last_modified=st.st_mtime,
+        max_age=31536000,
+    )
     response.headers['Accept-Ranges'] = 'bytes'
-    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Cache-Control'] = CLIP_CACHE_CONTROL
     return response
 
 @app.route('/api/clips', methods=['GET', 'POST'])
@@ -127,55 +238,133 @@ def api_clips():
             except Exception as e:
                 print(f"⚠️  Failed to save to SQLite: {e}")
 
-            # Also save to metadata file as backup
-            if METADATA_FILE.exists():
-                with open(METADATA_FILE, 'r') as f:
-                    data = json.load(f)
-            else:
-                data = {"clips": []}
-
-            # Append the new clip
-            data.setdefault("clips", []).append(new_clip)
+            # Also append to the metadata journal as backup
+            METADATA_JOURNAL.put(new_clip)
 
-            # Save back to file
-            with open(METADATA_FILE, 'w') as f:
-                json.dump(data, f, indent=2)
-
-            print(f"✅ Added clip: {new_clip.get('id', 'unknown')} to metadata file")
+            print(f"✅ Added clip: {new_clip.get('id', 'unknown')} to metadata journal")
             return jsonify({"ok": True, "message": "Clip added", "clip": transform_db_clip(new_clip)}), 201
 
-        # ---- GET: Return all clips ----
-        db_clips = fetch_clips()
-        if db_clips:
-            transformed = [transform_db_clip(clip) for clip in db_clips]
-            return jsonify(transformed)
-
-        if METADATA_FILE.exists():
-            with open(METADATA_FILE, 'r') as f:
-                data = json.load(f)
-            clips = data.get('clips', [])
-            transformed = [transform_clip(clip) for clip in clips]
-            return jsonify(transformed)
+        # ---- GET: filtered / paginated / projected ----
+        if any(key in request.args for key in CLIP_QUERY_KEYS):
+            return query_clips_response(request.args)
 
-        return jsonify([])
+        # ---- GET: Return all clips ----
+        stream = db_module.stream_clips()
+        rows = iter(stream)
+        first = next(rows, None)
+        if first is not None:
+            map_row = compile_clip_mapper(stream.columns, derive_video_url)
+            items = map(map_row, itertools.chain([first], rows))
+            return json_stream_response(stream_json_array(items), stream.close)
+
+        clips = METADATA_JOURNAL.all()
+        transformed = [transform_clip(clip) for clip in clips]
+        return jsonify(transformed)
 
     except Exception as e:
         print("❌ Error in /api/clips:", e)
         return jsonify({"error": str(e)}), 500
 
-def update_metadata_clip(clip_id: str, updates: dict):
-    if not METADATA_FILE.exists():
-        return
+CLIP_FILTER_PARAMS = getattr(db_module, "CLIP_FILTER_COLUMNS", ())
+CLIP_QUERY_KEYS = (*CLIP_FILTER_PARAMS, 'limit', 'cursor', 'fields')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# API fields (transform_db_clip keys) that are derived from other columns
+DERIVED_FIELD_COLUMNS = {
+    'video_url': ('filename', 'path'),
+    'location': ('location',),
+    'location_display': ('location',),
+    'location_code': ('location',),
+    'game_location': ('location',),
+    'locationLabel': ('location',),
+}
+
+
+def _split_arg_values(args, name):
+    return [part.strip() for raw in args.getlist(name) for part in raw.split(',') if part.strip()]
+
+
+def _parse_fields(args):
+    """fields= -> (API field names, clips columns to select); both None when absent."""
+    fields = _split_arg_values(args, 'fields') or None
+    columns = None
+    if fields:
+        columns = set()
+        for field in fields:
+            if field in DERIVED_FIELD_COLUMNS:
+                columns.update(DERIVED_FIELD_COLUMNS[field])
+            elif field in db_module.CLIP_COLUMNS:
+                columns.add(field)
+            else:
+                raise ValueError(f"Unknown field: {field}")
+    return fields, columns
+
+
+def _page_limit(args, default=DEFAULT_PAGE_SIZE):
+    limit = args.get('limit', type=int) or default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def clip_page_response(stream, fields, limit, head=None):
+    """Stream ``{**head, items, count, next_cursor}`` from a LIMIT + 1 RowStream."""
+    map_row = compile_clip_mapper(stream.columns, derive_video_url, fields)
+    created_at_idx = stream.columns.index('created_at')
+    id_idx = stream.columns.index('id')
+    page = {'count': 0, 'last': None, 'more': False}
+
+    def page_items():
+        for row in stream:
+            if page['count'] >= limit:
+                page['more'] = True  # the extra LIMIT + 1 row
+                stream.close()
+                break
+            page['count'] += 1
+            page['last'] = row
+            yield map_row(row)
+
+    def page_tail():
+        next_cursor = None
+        if page['more']:
+            last = page['last']
+            next_cursor = db_module.encode_cursor_values(last[created_at_idx], last[id_idx])
+        return {"count": page['count'], "next_cursor": next_cursor}
+
+    return json_stream_response(stream_json_object(head or {}, 'items', page_items(), page_tail), stream.close)
+
+
+def query_clips_response(args):
+    """GET /api/clips with filter, cursor and fields= query parameters."""
+    filters = {name: _split_arg_values(args, name) for name in CLIP_FILTER_PARAMS if name in args}
 
     try:
-        with open(METADATA_FILE, 'r') as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, OSError):
-        return
+        fields, columns = _parse_fields(args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    paginated = 'limit' in args or 'cursor' in args
+    limit = _page_limit(args) if paginated else None
+
+    try:
+        stream = db_module.stream_clips(filters, limit=limit, cursor=args.get('cursor'), columns=columns)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    if not paginated:
+        map_row = compile_clip_mapper(stream.columns, derive_video_url, fields)
+        return json_stream_response(stream_json_array(map(map_row, stream)), stream.close)
+    return clip_page_response(stream, fields, limit)
+
+
+def json_stream_response(chunks, on_close=None):
+    """Stream pre-serialized JSON chunks; on_close releases the DB cursor."""
+    response = Response(chunks, mimetype='application/json')
+    if on_close is not None:
+        response.call_on_close(on_close)
+    return response
 
-    clips = data.get('clips', [])
-    updated = False
 
+def update_metadata_clip(clip_id: str, updates: dict):
     mapping = {
         'notes': 'Notes',
         'result': 'Play Result',
@@ -190,35 +379,20 @@ def update_metadata_clip(clip_id: str, updates: dict):
         'video_end': 'video_end',
     }
 
-    for entry in clips:
-        if entry.get('id') == clip_id:
-            for key, value in updates.items():
-                mapped = mapping.get(key)
-                if mapped:
-                    entry[mapped] = value
-            updated = True
-            break
-
-    if updated:
-        try:
-            with open(METADATA_FILE, 'w') as f:
-                json.dump(data, f, indent=2)
-        except OSError:
-            pass
+    fields = {mapping[key]: value for key, value in updates.items() if key in mapping}
+    if not fields:
+        return
+    try:
+        METADATA_JOURNAL.patch(clip_id, fields)
+    except OSError:
+        pass
 
 
 def load_metadata_clip(clip_id: str):
-    if not METADATA_FILE.exists():
-        return None
     try:
-        with open(METADATA_FILE, 'r') as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, OSError):
+        return METADATA_JOURNAL.get(clip_id)
+    except OSError:
         return None
-    for entry in data.get('clips', []):
-        if entry.get('id') == clip_id:
-            return entry
-    return None
 
 
 @app.route('/api/clip/<clip_id>', methods=['GET', 'PUT', 'DELETE'])
@@ -230,13 +404,9 @@ def api_clip_detail(clip_id):
             if db_record:
                 return jsonify(transform_db_clip(db_record))
 
-            if METADATA_FILE.exists():
-                with open(METADATA_FILE, 'r') as f:
-                    data = json.load(f)
-                clips = data.get('clips', [])
-                for clip in clips:
-                    if clip.get('id') == clip_id:
-                        return jsonify(transform_clip(clip))
+            meta_record = load_metadata_clip(clip_id)
+            if meta_record:
+                return jsonify(transform_clip(meta_record))
 
             return jsonify({"error": "Clip not found"}), 404
         except Exception as e:
@@ -253,18 +423,9 @@ def api_clip_detail(clip_id):
                 remove_clip(clip_id)
                 print(f"[DEBUG] Deleted from database")
 
-            # Delete from metadata file if exists
-            if METADATA_FILE.exists():
-                print(f"[DEBUG] Metadata file exists: {METADATA_FILE}")
-                with open(METADATA_FILE, 'r') as f:
-                    data = json.load(f)
-                clips = data.get('clips', [])
-                print(f"[DEBUG] Found {len(clips)} clips in metadata")
-                data['clips'] = [c for c in clips if c.get('id') != clip_id]
-                print(f"[DEBUG] After filter: {len(data['clips'])} clips remaining")
-                with open(METADATA_FILE, 'w') as f:
-                    json.dump(data, f, indent=2)
-                print(f"[DEBUG] Metadata file updated")
+            # Delete from metadata journal if present
+            if METADATA_JOURNAL.delete(clip_id):
+                print(f"[DEBUG] Metadata journal updated")
 
             print(f"[DEBUG] Delete successful")
             return jsonify({"ok": True, "message": "Clip deleted successfully"})
@@ -522,49 +683,81 @@ def update_clip_shot(clip_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/games/summary')
+def api_games_summary():
+    """Aggregated per-game stats (replaces downloading every clip to aggregate client-side)"""
+    try:
+        games = db_module.game_summary()
+        return jsonify({"ok": True, "count": len(games), "games": games})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/games/<game_id>/stats')
+def api_game_stats(game_id):
+    """Aggregated stats for a single game keyed by canonical_game_id"""
+    try:
+        stats = db_module.game_stats(game_id)
+        if stats is None:
+            return jsonify({"error": "Game not found"}), 404
+        return jsonify({"ok": True, "game": stats})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/stats/<dimension>')
+def api_clip_stats(dimension):
+    """Materialized breakdown by game, opponent, coverage, ball_screen or shooter"""
+    try:
+        rows = db_module.fetch_clip_stats(dimension, request.args.get('value'))
+        return jsonify({"ok": True, "dimension": dimension, "count": len(rows), "stats": rows})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/stats/rebuild', methods=['POST'])
+def api_rebuild_clip_stats():
+    """Recompute the materialized stats tables from the clips table"""
+    try:
+        return jsonify({"ok": True, "rows": db_module.rebuild_clip_stats()})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
     return jsonify({
         "status": "ok",
         "clips_dir": str(CLIPS_DIR),
-        "clips_exist": CLIPS_DIR.exists()
+        "clips_exist": CLIPS_DIR.exists(),
+        "clip_files": len(CLIPS_INDEX),
     })
 
 
 def bridge_ctrl_request(method: str, endpoint: str, **kwargs):
-    try:
-        response = requests.request(method, f"{BRIDGE_CTRL_BASE}{endpoint}", timeout=2, **kwargs)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as exc:
-        raise RuntimeError(str(exc))
+    return BRIDGE_CTRL.request(method, endpoint, **kwargs)
 
 
-def bridge_excel_request(method: str, endpoint: str, **kwargs):
-    try:
-        response = requests.request(method, f"{BRIDGE_APP_BASE}{endpoint}", timeout=3, **kwargs)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as exc:
-        raise RuntimeError(str(exc))
+def bridge_excel_request(method: str, endpoint: str, timeout: float = None, **kwargs):
+    return BRIDGE_APP.request(method, endpoint, timeout=timeout, **kwargs)
 
 
 @app.route('/excel/status')
 def excel_status():
-    controller = None
-    workbook = None
-    try:
-        controller = bridge_ctrl_request('GET', '/status')
-    except RuntimeError as exc:
-        controller = {'ok': False, 'error': str(exc)}
-
-    try:
-        workbook = bridge_excel_request('GET', '/health')
-    except RuntimeError as exc:
-        workbook = {'ok': False, 'error': str(exc)}
-
-    return jsonify({'ok': True, 'controller': controller, 'workbook': workbook})
+    # Both backends are polled concurrently; an open circuit answers immediately
+    results = fan_out({
+        'controller': (BRIDGE_CTRL, 'GET', '/status'),
+        'workbook': (BRIDGE_APP, 'GET', '/health'),
+    })
+    return jsonify({
+        'ok': True,
+        'controller': results['controller'],
+        'workbook': results['workbook'],
+        'circuits': {'controller': BRIDGE_CTRL.state(), 'workbook': BRIDGE_APP.state()},
+    })
 
 
 @app.route('/excel/start', methods=['POST'])
@@ -605,6 +798,70 @@ def excel_append():
         return jsonify({'ok': False, 'error': str(exc)}), 502
 
 
+@app.route('/excel/append-batch', methods=['POST'])
+def excel_append_batch():
+    """Forward many rows to the bridge; they are written under one lock and saved once."""
+    try:
+        payload = request.get_json(force=True) or {}
+        params = {'flush': request.args['flush']} if 'flush' in request.args else None
+        data = bridge_excel_request('POST', '/append_batch', timeout=EXCEL_BATCH_TIMEOUT, json=payload, params=params)
+        return jsonify({'ok': True, 'status': data})
+    except RuntimeError as exc:
+        return jsonify({'ok': False, 'error': str(exc)}), 502
+
+
+TAG_SEARCH_FIELDS = getattr(db_module, "TAG_FIELDS", ())
+DEFAULT_SEARCH_PAGE_SIZE = 50
+
+
+def _parse_tag_clauses(args):
+    """
+    Each tag param is one clause: comma-separated values are OR'd, repeating
+    the param ANDs clauses, and a leading ! excludes the values.
+    """
+    clauses = []
+    for field in TAG_SEARCH_FIELDS:
+        for raw in args.getlist(field):
+            raw = raw.strip()
+            negate = raw.startswith('!')
+            values = [part.strip() for part in raw[1 if negate else 0:].split(',') if part.strip()]
+            if values:
+                clauses.append((field, values, negate))
+    return clauses
+
+
+def _search_filters(args):
+    """Plain clip filters; tag fields are parsed as clauses instead."""
+    return {
+        name: _split_arg_values(args, name)
+        for name in CLIP_FILTER_PARAMS
+        if name in args and name not in TAG_SEARCH_FIELDS
+    }
+
+
+@app.route('/api/search')
+def api_search():
+    """
+    Faceted tag search over the clip_tags index, e.g.
+    /api/search?formation=Horns&coverage=Drop&result=Made 3&coverage=!Switch
+    Tag fields: see _parse_tag_clauses(). Other /api/clips filters
+    (opponent, game_id, quarter, has_shot, ...), limit/cursor/fields also apply;
+    facets=<fields> picks which facet counts to return (default: all tag fields).
+    """
+    tags = _parse_tag_clauses(request.args)
+    filters = _search_filters(request.args)
+    try:
+        fields, columns = _parse_fields(request.args)
+        facets = db_module.tag_facets(filters, tags, _split_arg_values(request.args, 'facets') or None)
+        limit = _page_limit(request.args, DEFAULT_SEARCH_PAGE_SIZE)
+        stream = db_module.stream_clips(
+            filters, limit=limit, cursor=request.args.get('cursor'), columns=columns, tags=tags
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return clip_page_response(stream, fields, limit, head={"ok": True, **facets})
+
+
 @app.route('/api/search/semantic', methods=['POST'])
 def api_semantic_search():
     """
@@ -613,16 +870,11 @@ def api_semantic_search():
     """
     if not SEMANTIC_SEARCH_AVAILABLE:
         return jsonify({
-            "error": "Semantic search not available. Install: pip install openai numpy",
-            "available": False
-        }), 501
-
-    if not OPENAI_AVAILABLE:
-        return jsonify({
-            "error": "OpenAI library not available",
+            "error": "Semantic search not available. Install: pip install numpy (openai optional)",
             "available": False
         }), 501
 
+    # Without OpenAI the local hashing embedder is used, so no gate here
     try:
         data = request.get_json(force=True) or {}
         query = data.get('query', '').strip()
@@ -634,14 +886,14 @@ def api_semantic_search():
         results = semantic_search(query, top_k=top_k)
 
         # Transform results to match frontend expectations
-        transformed = [transform_db_clip(clip) for clip in results]
-
-        return jsonify({
-            "ok": True,
-            "query": query,
-            "count": len(transformed),
-            "results": transformed
-        })
+        head = {"ok": True, "query": query, "count": len(results)}
+        return json_stream_response(
+            stream_json_object(
+                head,
+                "results",
+                ({**transform_db_clip(clip), "similarity": clip.get("similarity")} for clip in results),
+            )
+        )
 
     except ValueError as e:
         return jsonify({"error": str(e), "available": False}), 400
@@ -655,7 +907,8 @@ def api_semantic_search():
 @app.route('/api/search/rebuild-embeddings', methods=['POST'])
 def api_rebuild_embeddings():
     """
-    Rebuild all clip embeddings. Call this when clips are added/updated.
+    Bring clip embeddings up to date. Only new or edited clips are embedded;
+    POST {"force": true} re-embeds everything.
     """
     if not SEMANTIC_SEARCH_AVAILABLE:
         return jsonify({
@@ -664,7 +917,8 @@ def api_rebuild_embeddings():
         }), 501
 
     try:
-        result = rebuild_embeddings()
+        data = request.get_json(silent=True) or {}
+        result = rebuild_embeddings(force=bool(data.get('force')))
         if result['success']:
             return jsonify({"ok": True, **result})
         else:
@@ -683,6 +937,107 @@ def api_search_status():
     })
 
 
+COMM_THRESHOLD_PARAMS = tuple(getattr(db_module, "COMM_THRESHOLDS", ()))
+DEFAULT_ROLLUP_SILENCE = 5.0
+
+
+def _float_args(args, names):
+    values = {}
+    for name in names:
+        if args.get(name, '').strip():
+            try:
+                values[name] = float(args[name])
+            except ValueError:
+                raise ValueError(f"{name} must be a number")
+    return values
+
+
+@app.route('/api/comm/clips')
+def api_comm_clips():
+    """
+    Clips by defensive communication, e.g. /api/comm/clips?silence_over=6&coverage=Drop
+    Thresholds (AND'd): silence_over (longest stretch without talk, seconds),
+    talk_under (total talk seconds), talk_ratio_under (0-1), peak_under (dBFS).
+    Clip filters, tag clauses and limit/cursor work as in /api/search;
+    silences=1 adds each clip's silent stretches longer than silence_over.
+    """
+    try:
+        thresholds = _float_args(request.args, COMM_THRESHOLD_PARAMS)
+        page = db_module.query_comm_clips(
+            thresholds,
+            _search_filters(request.args),
+            _parse_tag_clauses(request.args),
+            limit=_page_limit(request.args, DEFAULT_SEARCH_PAGE_SIZE),
+            cursor=request.args.get('cursor'),
+        )
+        if request.args.get('silences') in ('1', 'true', 'yes'):
+            silences = db_module.fetch_comm_silences(
+                [clip['id'] for clip in page['items']], thresholds.get('silence_over', 0.0)
+            )
+            for clip in page['items']:
+                clip['silences'] = silences.get(clip['id'], [])
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    for clip in page['items']:
+        clip['video_url'] = derive_video_url(clip['filename'], clip.pop('path'))
+    return jsonify({"ok": True, "count": len(page['items']), **page})
+
+
+@app.route('/api/comm/rollup/<dimension>')
+def api_comm_rollup(dimension):
+    """
+    Talk coverage per game, opponent, coverage, ball_screen or shooter, with
+    breakdown rates for clips with and without a silence over silence_over
+    seconds (default 5). Accepts the same filters as /api/comm/clips.
+    """
+    try:
+        silence_over = _float_args(request.args, ('silence_over',)).get('silence_over', DEFAULT_ROLLUP_SILENCE)
+        rows = db_module.comm_rollup(
+            dimension, silence_over, _search_filters(request.args), _parse_tag_clauses(request.args)
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify({"ok": True, "dimension": dimension, "silence_over": silence_over, "count": len(rows), "rollup": rows})
+
+
+@app.route('/api/clip/<clip_id>/comm')
+def api_clip_comm(clip_id):
+    """Detected comm segments and the silences between them for one clip"""
+    try:
+        segments = db_module.fetch_comm_segments(clip_id)
+        silences = db_module.fetch_comm_silences([clip_id])[clip_id]
+        return jsonify({"ok": True, "clip_id": clip_id, "segments": segments, "silences": silences})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+
+@app.route('/api/shots/heatmap')
+def api_shot_heatmap():
+    """
+    Binned shot chart, e.g. /api/shots/heatmap?opponent=Texas&coverage=Drop&shooter=Blue&bins=20
+    Filters are the /api/clips ones (opponent, game_id, canonical_game_id,
+    coverage, shooter, ...). bins=N gives an N x N grid, bins=NxM N columns
+    by M rows. Returns per-cell attempts, makes, FG% and points per shot.
+    """
+    if shot_heatmap is None:
+        return jsonify({"ok": False, "error": "Shot heatmaps need numpy: pip install numpy"}), 501
+    filters = {name: _split_arg_values(request.args, name) for name in CLIP_FILTER_PARAMS if name in request.args}
+    try:
+        bins = request.args.get('bins', '').lower().split('x')
+        bins_x = int(bins[0]) if bins[0] else SHOT_HEATMAP_BINS
+        bins_y = int(bins[1]) if len(bins) > 1 else None
+        heatmap = shot_heatmap(filters, bins_x, bins_y)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify({"ok": True, **heatmap})
+
+
 @app.get("/")
 def root_status():
     return {"status": "OU Defensive Analytics API running"}, 200
@@ -693,6 +1048,18 @@ def api_health():
     return {"ok": True}, 200
 
 
+@app.get("/api/db/stats")
+def api_db_stats():
+    pool_stats = getattr(db_module, "pool_stats", None)
+    if pool_stats is None:
+        return jsonify({"ok": False, "error": "Connection pool not available"}), 501
+    payload = {"ok": True, "pool": pool_stats()}
+    if hasattr(db_module, "backfill_status"):
+        payload["schema_version"] = db_module.schema_version()
+        payload["backfills"] = db_module.backfill_status()
+    return jsonify(payload)
+
+
 @app.get("/api/__routes")
 def list_routes():
     from flask import jsonify
@@ -707,9 +1074,24 @@ def list_routes():
     return jsonify(sorted(routes, key=lambda r: r["rule"]))
 
 
-if __name__ == '__main__':
+def create_app():
+    """
+    Start-up work, then the app. Kept out of import time because worker
+    processes (audio analysis) re-import the main module. Under gunicorn:
+    gunicorn 'media_server:create_app()'
+    """
     # Create clips directory if it doesn't exist
     CLIPS_DIR.mkdir(parents=True, exist_ok=True)
+    CLIPS_INDEX.refresh(force=True)
+
+    # Fill typed columns / child tables added by recent migrations while serving
+    if hasattr(db_module, "start_backfills"):
+        db_module.start_backfills()
+    return app
+
+
+if __name__ == '__main__':
+    create_app()
 
     print(f"\n🎬 Media Server Starting...")
     print(f"📁 Serving clips from: {CLIPS_DIR}")
@@ -0,0 +1,221 @@
+"""
+Append-only JSON-lines journal for the clip metadata backup.
+
+Each mutation appends one line to Clips/clips_metadata.jsonl:
+
+    {"op": "put", "id": ..., "clip": {...}}
+    {"op": "patch", "id": ..., "fields": {...}}
+    {"op": "delete", "id": ...}
+
+An in-memory id -> clip index is rebuilt by replaying the file, so lookups
+never scan it and writes are a single append. When dead lines outnumber live
+clips the journal is compacted into a snapshot written to a temp file and
+atomically renamed over the original. media_server and clip_extractor both
+write the journal; appends and compaction are serialized with flock and each
+process replays whatever the other appended before reading or writing.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+COMPACT_MIN_RECORDS = 1000
+COMPACT_RATIO = 2.0
+
+
+def _dumps(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+class MetadataJournal:
+    def __init__(self, path: Path, legacy_path: Optional[Path] = None):
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self._lock = threading.RLock()
+        self._clips: Dict[Any, Dict[str, Any]] = {}
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._records = 0
+        self._loaded = False
+
+    # ---- file handling ----
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive flock on the current journal inode (retries if compaction swapped it)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            f = open(self.path, "ab")
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+        try:
+            yield f
+        finally:
+            f.close()
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op = record.get("op")
+        clip_id = record.get("id")
+        if op == "put":
+            self._clips[clip_id] = dict(record.get("clip") or {})
+        elif op == "patch":
+            entry = self._clips.get(clip_id)
+            if entry is not None:
+                entry.update(record.get("fields") or {})
+        elif op == "delete":
+            self._clips.pop(clip_id, None)
+        self._records += 1
+
+    def _replay(self, start: int) -> None:
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        # Only consume complete lines; a torn tail is left for the writer to finish
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(json.loads(line))
+            except ValueError:
+                continue  # partial line from a crash mid-append
+        self._offset = start + end
+
+    def _ensure_loaded(self) -> None:
+        """One-time import of the legacy clips_metadata.json into an empty journal."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not (self.legacy_path and self.legacy_path.exists()):
+            return
+        if self.path.exists() and self.path.stat().st_size:
+            return
+        with self._locked() as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self._migrate_legacy()
+
+    def _refresh(self) -> None:
+        """Pick up appends (or a compaction) made by another process."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._clips, self._inode, self._offset, self._records = {}, None, 0, 0
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._clips, self._offset, self._records = {}, 0, 0
+            self._inode = st.st_ino
+        if st.st_size > self._offset:
+            self._replay(self._offset)
+
+    def _migrate_legacy(self) -> None:
+        try:
+            with open(self.legacy_path, "r") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+        clips = data.get("clips", []) if isinstance(data, dict) else data
+        self._write_snapshot({clip.get("id"): clip for clip in clips})
+
+    def _write_snapshot(self, clips: Dict[Any, Dict[str, Any]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            for clip_id, clip in clips.items():
+                f.write(_dumps({"op": "put", "id": clip_id, "clip": clip}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        try:
+            dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        with self._locked() as f:
+            self._refresh()
+            payload = _dumps(record)
+            size = os.fstat(f.fileno()).st_size
+            if size > self._offset:
+                payload = b"\n" + payload  # terminate a torn line left by a crash
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            self._apply(record)
+            self._offset = size + len(payload)
+            if self._records > COMPACT_MIN_RECORDS and self._records > COMPACT_RATIO * len(self._clips):
+                self._compact_locked()
+
+    def _compact_locked(self) -> None:
+        self._write_snapshot(self._clips)
+        self._inode = os.stat(self.path).st_ino
+        self._offset = self.path.stat().st_size
+        self._records = len(self._clips)
+
+    # ---- public API ----
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_loaded()
+            self._refresh()
+            return [dict(clip) for clip in self._clips.values()]
+
+    def get(self, clip_id: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_loaded()
+            self._refresh()
+            clip = self._clips.get(clip_id)
+            return dict(clip) if clip is not None else None
+
+    def exists(self) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            self._refresh()
+            return bool(self._clips)
+
+    def put(self, clip: Dict[str, Any]) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            self._append({"op": "put", "id": clip.get("id"), "clip": clip})
+
+    def patch(self, clip_id: Any, fields: Dict[str, Any]) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            self._refresh()
+            if clip_id not in self._clips:
+                return False
+            self._append({"op": "patch", "id": clip_id, "fields": fields})
+            return True
+
+    def delete(self, clip_id: Any) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            self._refresh()
+            if clip_id not in self._clips:
+                return False
+            self._append({"op": "delete", "id": clip_id})
+            return True
+
+    def compact(self) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            with self._locked():
+                self._refresh()
+                self._compact_locked()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /api/clips serialization: the old dict path versus the
+compiled-mapper streaming path.
+
+Old: fetch_clips() (dict per row) -> transform_db_clip() (second dict per row)
+     -> json.dumps of the whole list.
+New: stream_clips() (tuples) -> compile_clip_mapper() -> stream_json_array().
+
+Runs against a throwaway database filled with synthetic clips, never the
+real data/analytics.sqlite.
+
+    python scripts/bench_clip_json.py [clip_count]
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Importing analytics_db (and media_server) already migrates the database and
+# starts backfills, so point it at the throwaway file before either import
+BENCH_DIR = tempfile.mkdtemp(prefix="bench_clip_json_")
+os.environ.pop("ANALYTICS_DB_URL", None)
+os.environ["ANALYTICS_DB_PATH"] = os.path.join(BENCH_DIR, "bench.sqlite")
+
+import analytics_db as db  # noqa: E402
+import clip_json  # noqa: E402
+from media_server import derive_video_url, transform_db_clip  # noqa: E402
+
+
+def seed(count):
+    def records():
+        for i in range(count):
+            yield {
+                "id": f"bench_{i:07d}",
+                "filename": f"G{i % 30}_Q{i % 4 + 1}_P{i}_bench.mp4",
+                "path": f"/tmp/G{i % 30}_Q{i % 4 + 1}_P{i}_bench.mp4",
+                "game_id": i % 30,
+                "canonical_game_id": f"G{i % 30}_bench",
+                "opponent": f"Opponent {i % 30}",
+                "quarter": i % 4 + 1,
+                "possession": i,
+                "formation": "Horns",
+                "action_types": "PnR, DHO",
+                "action_sequence": "Horns -> PnR -> Skip",
+                "coverage": "Man",
+                "ball_screen": "Drop",
+                "result": "Made 3" if i % 3 else "Turnover",
+                "points": 3 if i % 3 else 0,
+                "notes": "Late closeout on the skip pass" * (i % 2),
+                "start_time": "01:00",
+                "end_time": "01:20",
+                "created_at": f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.{i:07d}",
+            }
+
+    db.bulk_upsert_clips(records(), chunk_size=5000)
+
+
+def old_path():
+    clips = [transform_db_clip(clip) for clip in db.fetch_clips()]
+    body = json.dumps(clips).encode("utf-8")
+    return [body]
+
+
+def new_path():
+    stream = db.stream_clips()
+    map_row = clip_json.compile_clip_mapper(stream.columns, derive_video_url)
+    return clip_json.stream_json_array(map(map_row, stream))
+
+
+def measure(name, run):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = iter(run())
+    first = next(chunks)
+    ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<5} total {total * 1000:8.1f} ms   first byte {ttfb * 1000:8.1f} ms   "
+          f"peak {peak / 1e6:7.1f} MB   body {size / 1e6:6.1f} MB")
+    return total
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    try:
+        seed(count)
+
+        old_body = b"".join(old_path())
+        new_body = b"".join(new_path())
+        assert json.loads(old_body) == json.loads(new_body), "paths disagree"
+
+        print(f"{count} clips (orjson: {'yes' if clip_json.orjson else 'no'})")
+        old = min(measure("old", old_path) for _ in range(3))
+        new = min(measure("new", new_path) for _ in range(3))
+        print(f"speedup {old / new:.2f}x")
+    finally:
+        db.close_connections()
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+"""
+Semantic search over clip tags backed by a local, incrementally updated
+vector index.
+
+Each clip's tag fields are flattened into one text and hashed. Vectors live
+in a float32 matrix memory-mapped from data/embeddings/<model>.f32 (one row
+"slot" per clip); the clip_embeddings table in analytics.sqlite maps
+(model, clip_id) -> (slot, content_hash). sync() only reads clips whose
+updated_at moved since the last sync (all of them only when the clip count
+shows a deletion), embeds those whose text hash changed, writes their
+vectors into free or existing slots, and frees the slots of deleted clips,
+so edits never force a full rebuild. Every process serving search shares the
+matrix file, so sync() holds a file lock and reloads the slot table before
+handing out slots whenever another process synced since (a per-model
+data_versions row), and (model, slot) is UNIQUE in the table.
+
+Search is one vectorized dot product over the live slots plus an
+argpartition for top-k. Past IVF_MIN_VECTORS clips a coarse IVF index
+(spherical k-means centroids) narrows that to the IVF_NPROBE closest lists,
+so the scan touches a few percent of the matrix. The store re-syncs in the
+background whenever the clips data version (see analytics_db.clips_version)
+moves.
+
+The embedding function is pluggable (set_embedder). The default is OpenAI
+when the library and OPENAI_API_KEY are present, otherwise a local feature
+hashing embedder that needs no network, so search works offline and in tests.
+SEMANTIC_EMBEDDER=local|openai forces one or the other.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import analytics_db as db_module
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+try:
+    from openai import OpenAI  # type: ignore[import]
+    OPENAI_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    OpenAI = None
+    OPENAI_AVAILABLE = False
+
+EMBEDDINGS_DIR = db_module.DATA_DIR / "embeddings"
+
+# Clip columns that describe the possession, in the order they are embedded
+TEXT_FIELDS = (
+    "opponent",
+    "situation",
+    "formation",
+    "play_name",
+    "scout_coverage",
+    "action_trigger",
+    "action_types",
+    "action_sequence",
+    "coverage",
+    "ball_screen",
+    "off_ball_screen",
+    "help_rotation",
+    "disruption",
+    "breakdown",
+    "result",
+    "paint_touch",
+    "shooter",
+    "shot_location",
+    "contest",
+    "rebound",
+    "shot_result",
+    "notes",
+)
+
+LOCAL_DIM = 256
+OPENAI_MODEL = os.environ.get("SEMANTIC_EMBEDDING_MODEL", "text-embedding-3-small")
+OPENAI_DIM = 512
+EMBED_BATCH_SIZE = 256
+GROW_SLOTS = 4096
+# How often a search may check the clips data version for staleness
+VERSION_CHECK_INTERVAL = 2.0
+# Incremental syncs re-read clips updated this long before the last one seen,
+# for writes that committed late (same margin as analytics_db's tag bitmaps)
+SYNC_MARGIN = timedelta(seconds=5)
+# Below this many vectors a brute-force scan is already fast enough
+IVF_MIN_VECTORS = 20000
+IVF_NPROBE = 16
+IVF_TRAIN_ITERATIONS = 10
+
+
+def clip_text(clip: Dict[str, Any]) -> str:
+    parts = []
+    for field in TEXT_FIELDS:
+        value = clip.get(field)
+        if value not in (None, ""):
+            parts.append(f"{field.replace('_', ' ')}: {value}")
+    return " | ".join(parts)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# ---- embedders ----
+
+class Embedder:
+    """``embed(texts)`` must return a float32 array of shape (len(texts), dim)."""
+
+    def __init__(self, name: str, dim: int, embed: Callable[[Sequence[str]], np.ndarray]):
+        self.name = name
+        self.dim = dim
+        self.embed = embed
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def local_embed(texts: Sequence[str], dim: int = LOCAL_DIM) -> np.ndarray:
+    """
+    Signed feature hashing of word unigrams and bigrams (log-scaled counts),
+    L2-normalized. Deterministic across processes, no model download.
+    """
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        if not features:
+            continue
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(out[i], hashes % dim, signs)
+    np.copysign(np.log1p(np.abs(out)), out, out=out)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+
+def _openai_embed(texts: Sequence[str]) -> np.ndarray:
+    client = OpenAI()
+    out = np.zeros((len(texts), OPENAI_DIM), dtype=np.float32)
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = [t or " " for t in texts[start:start + EMBED_BATCH_SIZE]]
+        response = client.embeddings.create(model=OPENAI_MODEL, input=batch, dimensions=OPENAI_DIM)
+        for j, item in enumerate(response.data):
+            out[start + j] = item.embedding
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+
+LOCAL_EMBEDDER = Embedder(f"local-hash-{LOCAL_DIM}", LOCAL_DIM, local_embed)
+
+
+def default_embedder() -> Embedder:
+    choice = os.environ.get("SEMANTIC_EMBEDDER", "").lower()
+    use_openai = OPENAI_AVAILABLE and bool(os.environ.get("OPENAI_API_KEY"))
+    if choice == "openai" or (choice != "local" and use_openai):
+        if not OPENAI_AVAILABLE:
+            raise ValueError("SEMANTIC_EMBEDDER=openai but the openai library is not installed")
+        return Embedder(f"openai-{OPENAI_MODEL}-{OPENAI_DIM}", OPENAI_DIM, _openai_embed)
+    return LOCAL_EMBEDDER
+
+
+class IVFIndex:
+    """
+    Inverted-file coarse quantizer: every slot belongs to its nearest
+    centroid, and a query only scans the lists of its nprobe nearest
+    centroids. New or edited vectors are assigned incrementally; the
+    centroids are retrained once the collection has doubled.
+    """
+
+    def __init__(self, centroids: np.ndarray, capacity: int, trained_on: int):
+        self.centroids = centroids
+        self.trained_on = trained_on
+        self.assignments = np.full(capacity, -1, dtype=np.int32)
+        self._order: Optional[np.ndarray] = None
+        self._bounds: Optional[np.ndarray] = None
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, slots: np.ndarray, seed: int = 0) -> "IVFIndex":
+        nlist = max(1, int(np.sqrt(len(slots))))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(matrix[np.sort(rng.choice(slots, size=min(len(slots), nlist * 40), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            sums[empty] = centroids[empty]  # keep centroids that attracted nothing
+            norms[empty] = 1.0
+            centroids = sums / norms
+        index = cls(centroids.astype(np.float32), matrix.shape[0], len(slots))
+        index.assign(matrix, slots)
+        return index
+
+    def resize(self, capacity: int) -> None:
+        if capacity > len(self.assignments):
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+
+    def assign(self, matrix: np.ndarray, slots: Sequence[int]) -> None:
+        slots = np.asarray(slots, dtype=np.int64)
+        self.resize(matrix.shape[0])
+        for start in range(0, len(slots), 8192):
+            batch = slots[start:start + 8192]
+            self.assignments[batch] = np.argmax(np.asarray(matrix[batch]) @ self.centroids.T, axis=1)
+        self._order = None
+
+    def candidates(self, q: np.ndarray, nprobe: int = IVF_NPROBE) -> np.ndarray:
+        if self._order is None:
+            self._order = np.argsort(self.assignments, kind="stable")
+            self._bounds = np.searchsorted(self.assignments[self._order], np.arange(len(self.centroids) + 1))
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        return np.concatenate([self._order[self._bounds[l]:self._bounds[l + 1]] for l in lists])
+
+
+# ---- store ----
+
+class EmbeddingStore:
+    def __init__(self, embedder: Embedder, directory: Path = EMBEDDINGS_DIR):
+        self.embedder = embedder
+        self.path = Path(directory) / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', embedder.name)}.f32"
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._loaded = False
+        self._matrix: Optional[np.ndarray] = None
+        self._slot_ids: Optional[np.ndarray] = None  # object array, None for free slots
+        self._live: Optional[np.ndarray] = None
+        self._ivf: Optional[IVFIndex] = None
+        self._hashes: Dict[Any, Tuple[int, str]] = {}
+        self._version: Optional[int] = None
+        self._seen_until: Optional[str] = None  # MAX(clips.updated_at) at the last sync
+        # data_versions row bumped by every sync of this model, in any process
+        self._slots_key = f"embeddings:{embedder.name}"
+        self._slots_version: Optional[int] = None
+        self._checked_at = float("-inf")
+        self._syncing: Optional[threading.Thread] = None
+
+    # ---- persistence ----
+
+    def _capacity(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def _map(self, capacity: int) -> None:
+        dim = self.embedder.dim
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            if f.tell() < capacity * dim * 4:
+                f.truncate(capacity * dim * 4)
+        self._matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, dim)) if capacity else None
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive flock shared by every process that syncs this matrix file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(".lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield  # closing the file releases the lock
+
+    def _load(self, reload: bool = False) -> None:
+        if self._loaded and not reload:
+            return
+        with db_module.db_cursor() as cur:
+            cur.execute("SELECT clip_id, slot, content_hash FROM clip_embeddings WHERE model = ?", (self.embedder.name,))
+            rows = cur.fetchall()
+        size = self.path.stat().st_size if self.path.exists() else 0
+        capacity = max([size // (self.embedder.dim * 4)] + [row["slot"] + 1 for row in rows])
+        self._map(capacity)
+        self._slot_ids = np.full(capacity, None, dtype=object)
+        self._live = np.zeros(capacity, dtype=bool)
+        self._hashes = {}
+        for row in rows:
+            self._slot_ids[row["slot"]] = row["clip_id"]
+            self._live[row["slot"]] = True
+            self._hashes[row["clip_id"]] = (row["slot"], row["content_hash"])
+        self._loaded = True
+
+    def _allocate(self, count: int, free: List[int]) -> List[int]:
+        if len(free) < count:
+            old = self._capacity()
+            new = old + max(GROW_SLOTS, count - len(free), old // 2)
+            self._map(new)
+            slot_ids = np.full(new, None, dtype=object)
+            slot_ids[:old] = self._slot_ids
+            live = np.zeros(new, dtype=bool)
+            live[:old] = self._live
+            self._slot_ids, self._live = slot_ids, live
+            free.extend(range(old, new))
+        taken, free[:] = free[:count], free[count:]
+        return taken
+
+    # ---- maintenance ----
+
+    def _read_slots_version(self) -> Optional[int]:
+        with db_module.db_cursor() as cur:
+            cur.execute("SELECT version FROM data_versions WHERE name = ?", (self._slots_key,))
+            row = cur.fetchone()
+        return row["version"] if row else None
+
+    def _read_texts(self, where: str = "", params: Sequence[Any] = ()) -> Dict[Any, Tuple[str, str]]:
+        texts: Dict[Any, Tuple[str, str]] = {}
+        stream = db_module.RowStream(f"SELECT id, {', '.join(TEXT_FIELDS)} FROM clips {where}", params)
+        columns = stream.columns
+        for row in stream:
+            clip = dict(zip(columns, row))
+            text = clip_text(clip)
+            texts[clip["id"]] = (text, content_hash(text))
+        return texts
+
+    def _read_changes(
+        self, known: Dict[Any, Tuple[int, str]], force: bool
+    ) -> Tuple[Dict[Any, Tuple[str, str]], List[Any], int, Optional[str]]:
+        """
+        (texts, removed, total, seen_until): text and hash of every clip that
+        may have changed since the last sync, the known clips that were
+        deleted, the clip count and the new updated_at watermark. Only clips
+        whose updated_at moved past the last sync (minus SYNC_MARGIN) are
+        read, unless this is the first sync, ``force`` is set, or the count
+        shows a deletion; then every clip is.
+        """
+        with db_module.db_cursor() as cur:
+            cur.row_factory = None
+            cur.execute("SELECT MAX(updated_at), COUNT(*) FROM clips")
+            seen_until, total = cur.fetchone()
+        if self._seen_until is not None and not force:
+            try:
+                since = (datetime.fromisoformat(self._seen_until) - SYNC_MARGIN).isoformat()
+            except ValueError:
+                since = None
+            if since is not None:
+                texts = self._read_texts("WHERE updated_at >= ?", [since])
+                if len(known.keys() | texts.keys()) == total:
+                    return texts, [], total, seen_until
+        texts = self._read_texts()
+        return texts, [cid for cid in known if cid not in texts], total, seen_until
+
+    def sync(self, force: bool = False) -> Dict[str, Any]:
+        """Embed new/changed clips, drop deleted ones. ``force`` re-embeds everything."""
+        started = time.time()
+        with self._sync_lock, self._file_lock():
+            version = db_module.clips_version()
+            slots_version = self._read_slots_version()
+            with self._lock:
+                # Another process may have synced (and taken free slots) since we loaded
+                if slots_version is None or slots_version != self._slots_version or not self._loaded:
+                    before = self._hashes
+                    self._load(reload=True)
+                    if self._ivf is not None:
+                        moved = [slot for cid, (slot, h) in self._hashes.items() if before.get(cid) != (slot, h)]
+                        self._ivf.assign(self._matrix, moved)
+                known = dict(self._hashes)
+
+            current, removed, total, seen_until = self._read_changes(known, force)
+            changed = [cid for cid, (_, h) in current.items() if force or known.get(cid, (None, None))[1] != h]
+
+            with self._lock:
+                # Only reuse slots that were already free before this sync, so a crash
+                # mid-sync never leaves a committed row pointing at an overwritten vector
+                free = np.flatnonzero(~self._live).tolist() if self._live is not None else []
+                new_ids = [cid for cid in changed if cid not in known]
+                new_slots = dict(zip(new_ids, self._allocate(len(new_ids), free)))
+
+            for start in range(0, len(changed), EMBED_BATCH_SIZE):
+                batch = changed[start:start + EMBED_BATCH_SIZE]
+                vectors = np.asarray(self.embedder.embed([current[cid][0] for cid in batch]), dtype=np.float32)
+                slots = [known[cid][0] if cid in known else new_slots[cid] for cid in batch]
+                with self._lock:
+                    self._matrix[slots] = vectors
+            if self._matrix is not None:
+                self._matrix.flush()
+
+            with db_module.db_cursor() as cur:
+                cur.executemany(
+                    "DELETE FROM clip_embeddings WHERE model = ? AND clip_id = ?",
+                    [(self.embedder.name, cid) for cid in removed],
+                )
+                cur.executemany(
+                    """
+                    INSERT INTO clip_embeddings (model, clip_id, slot, content_hash) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(model, clip_id) DO UPDATE SET slot = excluded.slot, content_hash = excluded.content_hash
+                    """,
+                    [
+                        (self.embedder.name, cid, known[cid][0] if cid in known else new_slots[cid], current[cid][1])
+                        for cid in changed
+                    ],
+                )
+                cur.execute(
+                    """
+                    INSERT INTO data_versions (name, version) VALUES (?, 1)
+                    ON CONFLICT(name) DO UPDATE SET version = data_versions.version + 1
+                    """,
+                    (self._slots_key,),
+                )
+                cur.execute("SELECT version FROM data_versions WHERE name = ?", (self._slots_key,))
+                slots_version = cur.fetchone()["version"]
+
+            with self._lock:
+                for cid in removed:
+                    slot = known[cid][0]
+                    self._slot_ids[slot] = None
+                    self._live[slot] = False
+                    self._hashes.pop(cid, None)
+                for cid in changed:
+                    slot = known[cid][0] if cid in known else new_slots[cid]
+                    self._slot_ids[slot] = cid
+                    self._live[slot] = True
+                    self._hashes[cid] = (slot, current[cid][1])
+                self._version = version
+                self._seen_until = seen_until
+                self._slots_version = slots_version
+                if self._ivf is not None and changed:
+                    self._ivf.assign(self._matrix, [self._hashes[cid][0] for cid in changed])
+            self._maybe_train_ivf()
+
+        return {
+            "success": True,
+            "model": self.embedder.name,
+            "embedded": len(changed),
+            "removed": len(removed),
+            "total": total,
+            "seconds": round(time.time() - started, 3),
+        }
+
+    def _maybe_train_ivf(self) -> None:
+        with self._lock:
+            live = np.flatnonzero(self._live) if self._live is not None else np.array([], dtype=np.int64)
+            ivf, matrix = self._ivf, self._matrix
+        if len(live) < IVF_MIN_VECTORS:
+            with self._lock:
+                self._ivf = None
+            return
+        if ivf is not None and len(live) <= 2 * ivf.trained_on:
+            return
+        started = time.time()
+        ivf = IVFIndex.train(matrix, live)
+        with self._lock:
+            # Vectors written since `live` was taken are picked up by the next sync
+            self._ivf = ivf
+        print(f"🧭 IVF index: {len(ivf.centroids)} lists over {len(live)} clips ({time.time() - started:.2f}s)")
+
+    def _background_sync(self) -> None:
+        try:
+            self.sync()
+        except Exception as e:
+            print(f"❌ Embedding sync failed: {e}")
+
+    def ensure_fresh(self) -> None:
+        """Sync inline on first use, afterwards in the background when clips change."""
+        with self._lock:
+            self._load()
+            cold = not self._hashes
+            now = time.monotonic()
+            if not cold and now - self._checked_at < VERSION_CHECK_INTERVAL:
+                return
+            self._checked_at = now
+        version = db_module.clips_version()
+        if version == self._version:
+            return
+        if cold:
+            self.sync()
+            return
+        with self._lock:
+            if self._syncing is None or not self._syncing.is_alive():
+                self._syncing = threading.Thread(target=self._background_sync, name="embedding-sync", daemon=True)
+                self._syncing.start()
+
+    # ---- search ----
+
+    def search(self, query: str, top_k: int) -> List[Tuple[Any, float]]:
+        self.ensure_fresh()
+        q = np.asarray(self.embedder.embed([query]), dtype=np.float32)[0]
+        with self._lock:
+            if self._matrix is None or self._live is None:
+                return []
+            matrix, slot_ids = self._matrix, self._slot_ids
+            n = min(len(self._live), matrix.shape[0])
+            if self._ivf is not None:
+                candidates = self._ivf.candidates(q)
+                candidates = candidates[(candidates < n) & self._live[candidates]]
+            else:
+                candidates = None
+            live = self._live[:n].copy()
+
+        if candidates is not None and len(candidates) >= top_k:
+            scores = np.asarray(matrix[candidates]) @ q
+        else:
+            candidates = np.flatnonzero(live)
+            scores = matrix[:n] @ q
+            scores = scores[candidates]
+        k = min(top_k, len(candidates))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(slot_ids[candidates[i]], float(scores[i])) for i in top if slot_ids[candidates[i]] is not None]
+
+
+_store_lock = threading.Lock()
+_store: Optional[EmbeddingStore] = None
+
+
+def set_embedder(embedder: Embedder) -> None:
+    """Swap the embedding function (e.g. a local model); vectors are kept per embedder name."""
+    global _store
+    with _store_lock:
+        _store = EmbeddingStore(embedder)
+
+
+def get_store() -> EmbeddingStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore(default_embedder())
+        return _store
+
+
+def _fetch_clips(clip_ids: Iterable[Any]) -> Dict[Any, Dict[str, Any]]:
+    ids = list(clip_ids)
+    found: Dict[Any, Dict[str, Any]] = {}
+    with db_module.db_cursor() as cur:
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            cur.execute(f"SELECT * FROM clips WHERE id IN ({', '.join('?' for _ in batch)})", batch)
+            for row in cur.fetchall():
+                found[row["id"]] = row
+    return found
+
+
+def semantic_search(query: str, top_k: int = 20) -> List[Dict[str, Any]]:
+    """Clips most similar to ``query``, best first; each row carries a ``similarity`` score."""
+    try:
+        top_k = int(top_k)
+    except (TypeError, ValueError):
+        raise ValueError("top_k must be an integer")
+    if top_k <= 0:
+        raise ValueError("top_k must be positive")
+    hits = get_store().search(query, top_k)
+    rows = _fetch_clips(cid for cid, _ in hits)
+    results = []
+    for cid, score in hits:
+        row = rows.get(cid)
+        if row is not None:
+            results.append({**row, "similarity": round(score, 4)})
+    return results
+
+
+def rebuild_embeddings(force: bool = False) -> Dict[str, Any]:
+    """Bring the index up to date; only new or edited clips are embedded unless ``force``."""
+    try:
+        return get_store().sync(force=force)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
@@ -0,0 +1,121 @@
+"""
+Server-side shot chart grids for media_server's /api/shots/heatmap.
+
+Shots come from analytics_db.shot_rows() in the chart's own coordinate
+system (x and y in percent of the half court, 0-100, as written by the
+tagger). They are binned on a regular grid with np.bincount, once each for
+attempts, makes and points, and only the dense per-cell grids are returned,
+so the browser never receives individual shots.
+
+Grids are cached per (filters, bins) and tagged with analytics_db's
+clips_version(); any clip write bumps the version, so a cached grid is reused
+until the data it was built from changes.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import analytics_db as db_module
+
+EXTENT = (0.0, 100.0)
+DEFAULT_BINS = 25
+MAX_BINS = 100
+CACHE_ENTRIES = 128
+
+
+def _ratio_grid(numerator: np.ndarray, attempts: np.ndarray) -> List[List[Optional[float]]]:
+    """Per-cell ratio as nested lists, None where a cell has no attempts."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.round(numerator / attempts, 4)
+    return [
+        [value if count else None for value, count in zip(row, counts)]
+        for row, counts in zip(ratio.tolist(), attempts.tolist())
+    ]
+
+
+def bin_shots(shots: np.ndarray, bins_x: int, bins_y: int) -> Dict[str, Any]:
+    """
+    Bin an (n, 4) array of x, y, made, points. Grids are [bins_y][bins_x],
+    row 0 at y = 0; coordinates outside the court are clamped onto its edge.
+    """
+    lo, hi = EXTENT
+    cells = bins_x * bins_y
+    if len(shots):
+        ix = np.clip(((shots[:, 0] - lo) / (hi - lo) * bins_x).astype(np.int64), 0, bins_x - 1)
+        iy = np.clip(((shots[:, 1] - lo) / (hi - lo) * bins_y).astype(np.int64), 0, bins_y - 1)
+        cell = iy * bins_x + ix
+        attempts = np.bincount(cell, minlength=cells)
+        makes = np.bincount(cell, weights=shots[:, 2], minlength=cells)
+        points = np.bincount(cell, weights=shots[:, 3], minlength=cells)
+    else:
+        attempts, makes, points = np.zeros(cells, np.int64), np.zeros(cells), np.zeros(cells)
+    shape = (bins_y, bins_x)
+    attempts, makes, points = attempts.reshape(shape), makes.reshape(shape), points.reshape(shape)
+    total = int(attempts.sum())
+    return {
+        "bins": [bins_x, bins_y],
+        "extent": [lo, hi, lo, hi],
+        "shots": total,
+        "fg_pct": round(float(makes.sum()) / total, 4) if total else None,
+        "points_per_shot": round(float(points.sum()) / total, 4) if total else None,
+        "attempts": attempts.tolist(),
+        "makes": makes.astype(np.int64).tolist(),
+        "fg_pct_grid": _ratio_grid(makes, attempts),
+        "pps_grid": _ratio_grid(points, attempts),
+    }
+
+
+class HeatmapCache:
+    """LRU of built grids, each stored with the clips version it was built at."""
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Any, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: Any, version: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Any, version: int, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = HeatmapCache()
+
+
+def _filter_key(filters: Dict[str, Iterable[Any]]) -> Tuple[Any, ...]:
+    return tuple(sorted((name, tuple(sorted(str(v) for v in values))) for name, values in filters.items() if values))
+
+
+def shot_heatmap(filters: Optional[Dict[str, Iterable[Any]]] = None, bins_x: int = DEFAULT_BINS, bins_y: Optional[int] = None) -> Dict[str, Any]:
+    """Binned FG% and points-per-shot grids for the clips matching ``filters``."""
+    filters = {name: list(values) for name, values in (filters or {}).items()}
+    bins_y = bins_x if bins_y is None else bins_y
+    for count in (bins_x, bins_y):
+        if not 1 <= count <= MAX_BINS:
+            raise ValueError(f"bins must be between 1 and {MAX_BINS}")
+
+    # Read the version first: a write landing mid-build then just makes the entry stale
+    version = db_module.clips_version()
+    key = (_filter_key(filters), bins_x, bins_y)
+    cached = _cache.get(key, version)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    rows = db_module.shot_rows(filters)
+    shots = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    result = {**bin_shots(shots, bins_x, bins_y), "version": version}
+    _cache.put(key, version, result)
+    return {**result, "cached": False}
@@ -0,0 +1,30 @@
+"""
+Importing analytics_db migrates the database it points at, and clip_extractor
+/ media_server import it, so the whole run is pointed at a throwaway SQLite
+file before any test module imports them.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="ou_defense_tests_")
+os.environ.pop("ANALYTICS_DB_URL", None)
+os.environ["ANALYTICS_DB_PATH"] = os.path.join(TEST_DATA_DIR, "analytics.sqlite")
+
+# clip_extractor creates Clips/ on import; tests use their own directories
+_CLIPS_EXISTED = (PROJECT_ROOT / "Clips").exists()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DATA_DIR, ignore_errors=True)
+    if not _CLIPS_EXISTED:
+        try:
+            (PROJECT_ROOT / "Clips").rmdir()
+        except OSError:
+            pass
@@ -0,0 +1,212 @@
+"""
+analytics_db against both backends: a throwaway SQLite file, and a throwaway
+database on the Postgres server named by ANALYTICS_TEST_PG_URL (skipped when
+the server or psycopg/SQLAlchemy aren't available).
+
+    ANALYTICS_TEST_PG_URL=postgresql://postgres@localhost/postgres python -m pytest -q tests
+"""
+
+import importlib
+import os
+import sys
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PG_ADMIN_URL = os.environ.get("ANALYTICS_TEST_PG_URL", "postgresql://postgres@localhost/postgres")
+
+
+def _with_database(url, name):
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=f"/{name}"))
+
+
+@pytest.fixture
+def pg_url():
+    psycopg = pytest.importorskip("psycopg")
+    pytest.importorskip("sqlalchemy")
+    try:
+        admin = psycopg.connect(PG_ADMIN_URL, autocommit=True, connect_timeout=3)
+    except psycopg.Error as exc:
+        pytest.skip(f"no Postgres server at {PG_ADMIN_URL}: {exc}")
+    name = f"analytics_test_{uuid.uuid4().hex[:12]}"
+    with admin:
+        admin.execute(f'CREATE DATABASE "{name}"')
+        try:
+            yield _with_database(PG_ADMIN_URL, name)
+        finally:
+            admin.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def db(request, tmp_path, monkeypatch):
+    """analytics_db freshly imported (and migrated) against an empty database."""
+    if request.param == "postgres":
+        monkeypatch.setenv("ANALYTICS_DB_URL", request.getfixturevalue("pg_url"))
+    else:
+        monkeypatch.delenv("ANALYTICS_DB_URL", raising=False)
+        monkeypatch.setenv("ANALYTICS_DB_PATH", str(tmp_path / "analytics.sqlite"))
+
+    # The backend is picked (and the schema migrated) at import time
+    saved = {name: sys.modules.pop(name) for name in ("analytics_db", "analytics_pg") if name in sys.modules}
+    module = importlib.import_module("analytics_db")
+    try:
+        yield module
+    finally:
+        module.close_connections()
+        sys.modules.pop("analytics_db", None)
+        sys.modules.pop("analytics_pg", None)
+        sys.modules.update(saved)
+
+
+def make_clip(i, **fields):
+    clip = {
+        "id": f"clip_{i:04d}",
+        "filename": f"G{i % 3}_Q{i % 4 + 1}_P{i}.mp4",
+        "path": f"/clips/G{i % 3}_Q{i % 4 + 1}_P{i}.mp4",
+        "game_id": i % 3,
+        "canonical_game_id": f"game_{i % 3}",
+        "opponent": f"Opponent {i % 3}",
+        "quarter": i % 4 + 1,
+        "possession": i,
+        "action_types": "PnR, DHO",
+        "coverage": "Drop" if i % 2 else "Switch",
+        "result": "Made 3" if i % 3 else "Turnover",
+        "points": 3 if i % 3 else 0,
+        # Pairs share a timestamp so pagination has to break ties on id
+        "created_at": f"2025-01-01T00:00:{i // 2:02d}",
+    }
+    clip.update(fields)
+    return clip
+
+
+def stat_rows(db, dimension):
+    return {
+        row["value"]: (row["possessions"], row["points_allowed"], row["stops"], row["breakdowns"])
+        for row in db.fetch_clip_stats(dimension)
+    }
+
+
+def summary(db):
+    return {row["id"]: (row["clip_count"], row["stop_count"], row["points_total"]) for row in db.game_summary()}
+
+
+def test_upsert_inserts_then_updates(db):
+    db.upsert_clip(make_clip(1))
+    clip = db.fetch_clip("clip_0001")
+    assert clip["opponent"] == "Opponent 1"
+    assert clip["points"] == 3
+    assert stat_rows(db, "opponent") == {"Opponent 1": (1, 3, 0, 0)}
+
+    db.upsert_clip(make_clip(1, opponent="Opponent 9", result="Turnover", points=0))
+    clip = db.fetch_clip("clip_0001")
+    assert clip["opponent"] == "Opponent 9"
+    assert len(db.fetch_clips()) == 1
+    # The old row's stats are retracted before the new one's are added
+    assert stat_rows(db, "opponent") == {"Opponent 9": (1, 0, 1, 0)}
+
+
+def test_bulk_import_counts_and_stats(db):
+    clips = [make_clip(i) for i in range(25)]
+    # A small chunk size runs several COPY flushes on Postgres
+    assert db.import_clips(iter(clips), chunk_size=7) == {"inserted": 25, "updated": 0}
+    assert len(db.fetch_clips()) == 25
+
+    changed = [make_clip(i, points=0, result="Turnover") for i in range(20, 30)]
+    assert db.import_clips(changed, chunk_size=4) == {"inserted": 5, "updated": 5}
+    assert len(db.fetch_clips()) == 30
+    assert db.fetch_clip("clip_0021")["points"] == 0
+
+    incremental = {dim: stat_rows(db, dim) for dim in db.STAT_DIMENSIONS}
+    db.rebuild_clip_stats()
+    assert {dim: stat_rows(db, dim) for dim in db.STAT_DIMENSIONS} == incremental
+
+
+def test_keyset_pagination_visits_every_clip_once(db):
+    db.import_clips([make_clip(i) for i in range(23)])
+    expected = sorted((c["created_at"], c["id"]) for c in map(make_clip, range(23)))[::-1]
+
+    seen, cursor = [], None
+    while True:
+        page = db.query_clips(limit=5, cursor=cursor, columns=["opponent"])
+        seen.extend((row["created_at"], row["id"]) for row in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    # stream_clips reads the same pages (plus the look-ahead row) as tuples
+    cursor = db.encode_cursor_values(*expected[9])
+    stream = db.stream_clips(limit=5, cursor=cursor)
+    id_col = stream.columns.index("id")
+    assert [row[id_col] for row in stream] == [clip_id for _, clip_id in expected[10:16]]
+
+    filtered = db.query_clips(filters={"opponent": ["Opponent 1"]}, limit=100)
+    assert {row["id"] for row in filtered["items"]} == {f"clip_{i:04d}" for i in range(23) if i % 3 == 1}
+    assert filtered["next_cursor"] is None
+
+    # Filtered pages seek their (column, created_at, id) index from the cursor
+    pages, cursor = [], None
+    while True:
+        page = db.query_clips(filters={"quarter": ["2"]}, limit=2, cursor=cursor)
+        pages.extend(row["id"] for row in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [clip_id for _, clip_id in expected if int(clip_id[-4:]) % 4 == 1]
+
+
+def test_stats_and_game_summary(db):
+    db.import_clips([make_clip(i) for i in range(12)])
+
+    opponents = stat_rows(db, "opponent")
+    assert opponents["Opponent 0"] == (4, 0, 4, 0)
+    assert opponents["Opponent 1"] == (4, 12, 0, 0)
+    assert stat_rows(db, "coverage") == {"Drop": (6, 12, 2, 0), "Switch": (6, 12, 2, 0)}
+
+    games = summary(db)
+    assert games == {"game_0": (4, 4, 0), "game_1": (4, 0, 12), "game_2": (4, 0, 12)}
+    assert db.game_stats("game_1")["points_total"] == 12
+    assert db.game_stats("missing") is None
+
+    # A write through upsert_clip shows up in the (cached) summary
+    db.upsert_clip(make_clip(1, points=0, result="Turnover"))
+    assert summary(db)["game_1"] == (4, 1, 9)
+
+
+def test_remove_clip(db):
+    db.import_clips([make_clip(i) for i in range(6)])
+    assert summary(db)["game_1"] == (2, 0, 6)
+
+    db.remove_clip("clip_0004")
+    assert db.fetch_clip("clip_0004") is None
+    assert len(db.fetch_clips()) == 5
+    assert stat_rows(db, "opponent")["Opponent 1"] == (1, 3, 0, 0)
+    assert summary(db)["game_1"] == (1, 0, 3)
+    tagged = db.query_clips(tags=[("action_types", ["pnr"], False)])
+    assert "clip_0004" not in {row["id"] for row in tagged["items"]}
+
+    db.remove_clip("clip_0001")
+    assert "Opponent 1" not in stat_rows(db, "opponent")
+    assert "game_1" not in summary(db)
+
+    # Removing an unknown id is a no-op
+    db.remove_clip("clip_9999")
+    assert len(db.fetch_clips()) == 4
+
+
+def test_failed_import_keeps_committed_chunks_visible_in_stats(db):
+    db.import_clips([make_clip(1), make_clip(4)])
+    assert summary(db)["game_1"] == (2, 0, 6)
+
+    bad = make_clip(7)
+    del bad["path"]
+    with pytest.raises(Exception):
+        db.import_clips([make_clip(1, points=0, result="Turnover"), bad], chunk_size=1)
+    # The first chunk committed before the second failed
+    assert summary(db)["game_1"] == (2, 1, 3)
+    assert db.game_stats("game_1")["points_total"] == 3
@@ -0,0 +1,244 @@
+"""
+The extraction job queue behind /extract_clip and /extract_batch, with
+FFmpeg stubbed out through clip_extractor.run_ffmpeg.
+"""
+
+import json
+import subprocess
+import threading
+
+import pytest
+
+import clip_extractor
+from clips_index import ClipsDirIndex
+from extraction_jobs import JobCancelled, JobQueue
+from keyframe_index import KeyframeIndexStore
+from metadata_journal import MetadataJournal
+
+
+class FakeFFmpeg:
+    """
+    Stands in for run_ffmpeg: records each command and writes a small file
+    for every .mp4 output on it. ``returncode`` decides success; ``gate``
+    (an Event) holds the call until set, or until the job is cancelled.
+    """
+
+    def __init__(self, returncode=0, gate=None):
+        self.returncode = returncode
+        self.gate = gate
+        self.cmds = []
+        self.started = threading.Event()
+
+    def __call__(self, job, cmd):
+        self.cmds.append(cmd)
+        self.started.set()
+        if self.gate is not None:
+            while not self.gate.wait(0.01):
+                if job.cancelled:
+                    raise JobCancelled()
+        for output in self.outputs(cmd):
+            with open(output, "wb") as f:
+                f.write(b"\0" * 64)
+        stderr = "" if self.returncode == 0 else "stub failure"
+        return subprocess.CompletedProcess(cmd, self.returncode, "", stderr)
+
+    @staticmethod
+    def outputs(cmd):
+        return [arg for arg in cmd[cmd.index("-i") + 2:] if arg.endswith(".mp4")]
+
+
+@pytest.fixture
+def upserts():
+    """DB records the extractor hands to upsert_clip / bulk_upsert_clips"""
+    return []
+
+
+@pytest.fixture
+def extractor(tmp_path, monkeypatch, upserts):
+    clips_dir = tmp_path / "Clips"
+    clips_dir.mkdir()
+    source = tmp_path / "game.mp4"
+    source.write_bytes(b"\0" * 1024)
+
+    queue = JobQueue(workers=1, max_pending=2)
+    monkeypatch.setattr(clip_extractor, "CLIPS_DIR", clips_dir)
+    monkeypatch.setattr(clip_extractor, "CLIPS_INDEX", ClipsDirIndex(clips_dir))
+    monkeypatch.setattr(clip_extractor, "METADATA_JOURNAL", MetadataJournal(clips_dir / "clips_metadata.jsonl"))
+    monkeypatch.setattr(clip_extractor, "KEYFRAMES", KeyframeIndexStore(tmp_path / "keyframes"))
+    monkeypatch.setattr(clip_extractor, "EXTRACTION_QUEUE", queue)
+    monkeypatch.setattr(clip_extractor, "AUTO_ANALYZE_AUDIO", False)
+    monkeypatch.setattr(clip_extractor, "current_video_path", str(source))
+    monkeypatch.setattr(clip_extractor, "upsert_clip", upserts.append)
+    monkeypatch.setattr(
+        clip_extractor, "bulk_upsert_clips", lambda records, chunk_size: upserts.extend(records)
+    )
+    yield clip_extractor
+    queue.shutdown(wait=False)
+
+
+@pytest.fixture
+def client(extractor):
+    return extractor.app.test_client()
+
+
+def possession(n, start="0:02", end="0:05"):
+    return {
+        "Start Time": start,
+        "End Time": end,
+        "Game #": "1",
+        "Quarter": "2",
+        "Possession #": str(n),
+        "Opponent": "Team A",
+        "Play Result": "Turnover",
+    }
+
+
+def index_keyframes(extractor, *times):
+    listing = "\n".join(f"{t:.6f},K__" for t in times)
+    extractor.KEYFRAMES.build(
+        extractor.current_video_path,
+        probe=lambda cmd: subprocess.CompletedProcess(cmd, 0, listing, ""),
+    )
+
+
+def wait_for(job):
+    assert job.wait(5), "job did not finish"
+    return job
+
+
+def test_extract_clip_returns_job_and_cuts_in_background(extractor, client, monkeypatch, upserts):
+    ffmpeg = FakeFFmpeg()
+    monkeypatch.setattr(extractor, "run_ffmpeg", ffmpeg)
+
+    resp = client.post("/extract_clip", json=possession(7))
+    assert resp.status_code == 202
+    body = resp.get_json()
+    assert body["ok"] and body["status"] in ("queued", "running", "done")
+
+    job = wait_for(extractor.EXTRACTION_QUEUE.get(body["job_id"]))
+    status = client.get(f"/jobs/{job.id}").get_json()
+    assert status["status"] == "done"
+    assert len(ffmpeg.cmds) == 1
+    output = status["result"]["path"]
+    assert ffmpeg.outputs(ffmpeg.cmds[0]) == [output]
+    assert [record["possession"] for record in upserts] == [7]
+    assert status["result"]["filename"] in extractor.CLIPS_INDEX
+
+
+def test_failed_cut_discards_output(extractor, client, monkeypatch, upserts):
+    monkeypatch.setattr(extractor, "run_ffmpeg", FakeFFmpeg(returncode=1))
+
+    resp = client.post("/extract_clip?wait=1", json=possession(8))
+    assert resp.status_code == 500
+    body = resp.get_json()
+    assert body["status"] == "failed" and "stub failure" in body["error"]
+    assert not list(extractor.CLIPS_DIR.glob("*.mp4"))
+    assert upserts == []
+
+
+def test_bad_request_is_rejected_before_queueing(extractor, client):
+    resp = client.post("/extract_clip", json=possession(9, start="0:05", end="0:02"))
+    assert resp.status_code == 400
+    assert extractor.EXTRACTION_QUEUE.list() == []
+
+
+def test_full_queue_answers_429_and_jobs_cancel(extractor, client, monkeypatch, upserts):
+    gate = threading.Event()
+    ffmpeg = FakeFFmpeg(gate=gate)
+    monkeypatch.setattr(extractor, "run_ffmpeg", ffmpeg)
+
+    running = client.post("/extract_clip", json=possession(1)).get_json()["job_id"]
+    assert ffmpeg.started.wait(5)
+    queued = [client.post("/extract_clip", json=possession(n)).get_json()["job_id"] for n in (2, 3)]
+
+    resp = client.post("/extract_clip", json=possession(4))
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"]
+    assert resp.get_json()["queue"]["max_pending"] == 2
+
+    assert client.post(f"/jobs/{queued[0]}/cancel").get_json()["status"] == "cancelled"
+    client.post(f"/jobs/{running}/cancel")
+    wait_for(extractor.EXTRACTION_QUEUE.get(running))
+    assert client.get(f"/jobs/{running}").get_json()["status"] == "cancelled"
+
+    gate.set()
+    wait_for(extractor.EXTRACTION_QUEUE.get(queued[1]))
+    assert client.get(f"/jobs/{queued[1]}").get_json()["status"] == "done"
+    # Only the last job's clip survives; the cancelled running one left nothing behind
+    assert [record["possession"] for record in upserts] == [3]
+    assert len(list(extractor.CLIPS_DIR.glob("*.mp4"))) == 1
+
+
+def fake_ffprobe(keyframes, streams):
+    def run_ffprobe(job, cmd):
+        if "packet=pts_time,flags" in cmd[cmd.index("-show_entries") + 1]:
+            listing = "\n".join(f"{t:.6f},K__" for t in keyframes)
+            return subprocess.CompletedProcess(cmd, 0, listing, "")
+        return subprocess.CompletedProcess(cmd, 0, json.dumps({"streams": streams}), "")
+    return run_ffprobe
+
+
+H264_AAC = [
+    {"codec_type": "video", "codec_name": "h264", "profile": "High", "pix_fmt": "yuv420p",
+     "time_base": "1/90000", "level": 41, "codec_tag_string": "avc1"},
+    {"codec_type": "audio", "codec_name": "aac", "profile": "LC", "sample_rate": "48000", "channels": 2},
+]
+
+
+def test_batch_cuts_alone_when_source_cannot_be_indexed(extractor, client, monkeypatch):
+    ffmpeg = FakeFFmpeg()
+    monkeypatch.setattr(extractor, "run_ffmpeg", ffmpeg)
+    monkeypatch.setattr(extractor, "run_ffprobe", lambda job, cmd: subprocess.CompletedProcess(cmd, 1, "", "bad"))
+    batch = {"possessions": [possession(1, "0:02", "0:05"), possession(2, "0:06", "0:09")]}
+
+    body = client.post("/extract_batch?wait=1", json=batch).get_json()
+    assert body["result"]["cuts"] == {"copy": 0, "smart": 0, "alone": 2}
+    assert [len(ffmpeg.outputs(cmd)) for cmd in ffmpeg.cmds] == [1, 1]
+
+
+def test_batch_copies_every_keyframe_range_in_one_pass(extractor, client, monkeypatch, upserts):
+    ffmpeg = FakeFFmpeg()
+    monkeypatch.setattr(extractor, "run_ffmpeg", ffmpeg)
+    monkeypatch.setattr(extractor, "run_ffprobe", fake_ffprobe([0, 2, 4, 6, 8, 12], H264_AAC))
+    batch = {"possessions": [
+        possession(3, "0:09", "0:10"),  # no keyframe inside: encoded alone
+        possession(2, "0:07", "0:11"),  # smart: head [7, 8) encoded, tail [8, 11) copied
+        possession(1, "0:02", "0:05"),  # starts on a keyframe: copied whole
+    ]}
+
+    body = client.post("/extract_batch?wait=1", json=batch).get_json()
+    assert body["status"] == "done" and body["result"]["failed"] == []
+    assert body["result"]["cuts"] == {"copy": 1, "smart": 1, "alone": 1}
+    assert sorted(record["possession"] for record in upserts) == [1, 2, 3]
+
+    shared, head, concat, encode = ffmpeg.cmds
+    # One read from the earliest start: possession 1 whole, then possession 2 from its keyframe
+    seeks = [float(shared[i + 1]) for i, arg in enumerate(shared) if arg == "-ss"]
+    assert seeks == [2, 0, 6]
+    assert ffmpeg.outputs(shared)[1].endswith("tail.mp4")
+    assert float(head[head.index("-ss") + 1]) == 7 and float(head[head.index("-t") + 1]) == 1
+    assert "-profile:v" in head and "concat" in concat
+    assert float(encode[encode.index("-ss") + 1]) == 9 and "libx264" in encode
+    assert not [path for path in extractor.CLIPS_DIR.iterdir() if path.is_dir()]
+
+
+def test_failed_batch_pass_recuts_each_clip(extractor, client, monkeypatch, upserts):
+    index_keyframes(extractor, 0, 2, 4, 6, 8)
+    calls = []
+
+    def run_ffmpeg(job, cmd):
+        calls.append(cmd)
+        # The shared pass dies after writing its outputs; single cuts succeed
+        result = FakeFFmpeg()(job, cmd)
+        if len(FakeFFmpeg.outputs(cmd)) > 1:
+            result.returncode = 1
+        return result
+
+    monkeypatch.setattr(extractor, "run_ffmpeg", run_ffmpeg)
+    batch = {"possessions": [possession(1, "0:02", "0:05"), possession(2, "0:06", "0:09")]}
+    body = client.post("/extract_batch?wait=1", json=batch).get_json()
+
+    assert body["status"] == "done"
+    assert body["result"]["failed"] == []
+    assert [len(FakeFFmpeg.outputs(cmd)) for cmd in calls] == [2, 1, 1]
+    assert len(upserts) == 2
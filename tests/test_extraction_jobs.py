@@ -0,0 +1,62 @@
+"""JobQueue backpressure and cancellation, without FFmpeg."""
+
+import threading
+
+import pytest
+
+from extraction_jobs import CANCELLED, DONE, FINISHED_STATES, JobQueue, QueueFull
+
+
+@pytest.fixture
+def gate():
+    gate = threading.Event()
+    yield gate
+    gate.set()
+
+
+def blocking(gate, started=None):
+    def run(job):
+        if started is not None:
+            started.set()
+        gate.wait(5)
+        return "ok"
+    return run
+
+
+def test_cancelled_jobs_free_their_backlog_slot(gate):
+    jobs = JobQueue(workers=1, max_pending=2)
+    started = threading.Event()
+    running = jobs.submit("test", blocking(gate, started))
+    assert started.wait(5)
+    queued = [jobs.submit("test", blocking(gate)) for _ in range(2)]
+    with pytest.raises(QueueFull):
+        jobs.submit("test", blocking(gate))
+
+    for job in queued:
+        assert jobs.cancel(job.id).status == CANCELLED
+    assert jobs.stats()["pending"] == 0
+    # Both slots are free again although the worker hasn't popped the cancelled jobs
+    later = [jobs.submit("test", blocking(gate)) for _ in range(2)]
+
+    gate.set()
+    for job in [running, *later]:
+        assert job.wait(5) and job.status == DONE
+    assert all(job.status == CANCELLED and job.started_at is None for job in queued)
+    jobs.shutdown()
+
+
+def test_cancel_racing_workers_finishes_every_job_once():
+    jobs = JobQueue(workers=4, max_pending=1000)
+    runs = []
+    submitted = [jobs.submit("test", lambda job: runs.append(job.id)) for _ in range(500)]
+    for job in submitted[::2]:
+        jobs.cancel(job.id)
+
+    for job in submitted:
+        assert job.wait(5)
+        assert job.status in FINISHED_STATES
+    cancelled = {job.id for job in submitted if job.status == CANCELLED and job.started_at is None}
+    assert not cancelled & set(runs)
+    assert len(runs) == len(set(runs)) == len(submitted) - len(cancelled)
+    assert jobs.stats()["pending"] == 0
+    jobs.shutdown()
@@ -0,0 +1,145 @@
+"""
+The embedding store with the local (offline) embedder: incremental syncs,
+slot reuse across stores sharing one matrix file, and ranking.
+"""
+
+import numpy as np
+import pytest
+
+import semantic_search
+from semantic_search import EmbeddingStore, Embedder, clip_text, local_embed
+
+
+class CountingEmbedder(Embedder):
+    """The local embedder, remembering every text it was asked to embed."""
+
+    def __init__(self):
+        self.texts = []
+        super().__init__("test-local", semantic_search.LOCAL_DIM, self._embed)
+
+    def _embed(self, texts):
+        self.texts.extend(texts)
+        return local_embed(texts)
+
+
+@pytest.fixture
+def db():
+    db = semantic_search.db_module
+    with db.db_cursor() as cur:
+        cur.execute("DELETE FROM clip_embeddings")
+    for clip in db.fetch_clips():
+        db.remove_clip(clip["id"])
+    return db
+
+
+@pytest.fixture
+def embedder():
+    return CountingEmbedder()
+
+
+@pytest.fixture
+def store(tmp_path, embedder):
+    return EmbeddingStore(embedder, tmp_path)
+
+
+def make_clip(clip_id, **fields):
+    return {"id": clip_id, "filename": f"{clip_id}.mp4", "path": f"/clips/{clip_id}.mp4", **fields}
+
+
+PLAYS = {
+    "horns": make_clip("horns", formation="Horns", coverage="Drop", ball_screen="Drop", result="Made 3"),
+    "zone": make_clip("zone", formation="Spread", coverage="2-3 Zone", result="Turnover"),
+    "press": make_clip("press", situation="Full court press", coverage="Trap", result="Steal"),
+}
+
+
+def test_local_embed_is_deterministic_and_normalized():
+    vectors = local_embed(["horns drop coverage", "horns drop coverage", ""])
+    assert vectors.shape == (3, semantic_search.LOCAL_DIM) and vectors.dtype == np.float32
+    assert np.array_equal(vectors[0], vectors[1])
+    assert np.linalg.norm(vectors[0]) == pytest.approx(1.0, abs=1e-5)
+    assert not vectors[2].any()
+
+
+def test_sync_embeds_only_changed_clips(db, store, embedder):
+    for clip in PLAYS.values():
+        db.upsert_clip(clip)
+
+    assert store.sync()["embedded"] == 3
+    assert store.sync()["embedded"] == 0
+
+    db.upsert_clip({**PLAYS["zone"], "coverage": "1-3-1 Zone"})
+    embedder.texts.clear()
+    result = store.sync()
+    assert (result["embedded"], result["removed"], result["total"]) == (1, 0, 3)
+    assert embedder.texts == [clip_text({**PLAYS["zone"], "coverage": "1-3-1 Zone"})]
+
+    db.remove_clip("press")
+    result = store.sync()
+    assert (result["embedded"], result["removed"], result["total"]) == (0, 1, 2)
+    assert store.sync(force=True)["embedded"] == 2
+
+
+def test_search_ranks_the_matching_clip_first(db, store, monkeypatch):
+    for clip in PLAYS.values():
+        db.upsert_clip(clip)
+    monkeypatch.setattr(semantic_search, "_store", store)
+
+    hits = semantic_search.semantic_search("2-3 zone turnover", top_k=2)
+    assert [hit["id"] for hit in hits][0] == "zone"
+    assert len(hits) == 2 and hits[0]["similarity"] >= hits[1]["similarity"]
+
+    with pytest.raises(ValueError):
+        semantic_search.semantic_search("zone", top_k=0)
+
+
+def test_stores_sharing_a_matrix_never_share_slots(db, tmp_path, embedder):
+    first = EmbeddingStore(embedder, tmp_path)
+    second = EmbeddingStore(embedder, tmp_path)
+
+    db.upsert_clip(PLAYS["horns"])
+    first.sync()
+    db.remove_clip("horns")
+    second.sync()
+    # second hands the freed slot 0 to zone; first, which last saw horns
+    # there, has to reload the slot table before it allocates anything
+    db.upsert_clip(PLAYS["zone"])
+    db.upsert_clip(PLAYS["press"])
+    second.sync()
+    assert first.sync()["embedded"] == 0
+
+    with db.db_cursor() as cur:
+        cur.execute("SELECT clip_id, slot FROM clip_embeddings WHERE model = ?", (embedder.name,))
+        slots = {row["clip_id"]: row["slot"] for row in cur.fetchall()}
+    assert set(slots) == {"zone", "press"}
+    assert len(set(slots.values())) == 2
+
+    matrix = np.memmap(first.path, dtype=np.float32, mode="r").reshape(-1, embedder.dim)
+    for clip_id, slot in slots.items():
+        assert np.allclose(matrix[slot], local_embed([clip_text(PLAYS[clip_id])])[0])
+
+
+def test_sync_reads_only_clips_updated_since_the_last_one(db, store, monkeypatch):
+    for clip in PLAYS.values():
+        db.upsert_clip(clip)
+    with db.db_cursor() as cur:
+        cur.execute("UPDATE clips SET updated_at = '2025-01-01T00:00:00'")
+        cur.execute("UPDATE clips SET updated_at = '2025-06-01T00:00:00' WHERE id = 'horns'")
+    store.sync()
+
+    reads = []
+    read_texts = store._read_texts
+    monkeypatch.setattr(store, "_read_texts", lambda *args: reads.append(read_texts(*args)) or reads[-1])
+
+    db.upsert_clip({**PLAYS["zone"], "coverage": "Match-up Zone"})
+    result = store.sync()
+    assert result["embedded"] == 1 and result["total"] == 3
+    # press is untouched since long before the last sync; horns is within SYNC_MARGIN of it
+    assert [set(texts) for texts in reads] == [{"horns", "zone"}]
+
+    # A deletion doesn't show up in updated_at, so the count sends it to a full read
+    reads.clear()
+    db.remove_clip("press")
+    result = store.sync()
+    assert (result["removed"], result["total"]) == (1, 2)
+    assert [set(texts) for texts in reads] == [{"zone"}, {"horns", "zone"}]